@@ -0,0 +1,183 @@
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from fuzzywuzzy import fuzz, process, utils
+from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+
+NGRAM_SIZE = 3
+SHORTLIST_SIZE = 100
+BULK_BLOCK_SIZE = 256
+REDIS_KEY_PREFIX = "address-set:"
+
+def normalize_address(address: str) -> str:
+    # Same normalization process.extractOne applies before WRatio scoring
+    return utils.full_process(address, force_ascii=True)
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> set:
+    padded = f" {text} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+class CandidateSet:
+    """
+    A list of candidate addresses indexed once for repeated fuzzy matching.
+
+    Candidates are normalized up front and indexed by character n-grams. A
+    query only scores the shortlist of candidates sharing the most n-grams
+    with it, instead of running WRatio against every candidate, so very
+    generic queries may miss a candidate a full scan would rank higher.
+    """
+
+    def __init__(self, set_id: str, candidates: List[str], ngram_size: int = NGRAM_SIZE, version: Optional[str] = None):
+        self.set_id = set_id
+        self.version = version
+        self.candidates = list(candidates)
+        self.ngram_size = ngram_size
+        self.normalized = [normalize_address(candidate) for candidate in self.candidates]
+
+        postings = defaultdict(list)
+        for i, normalized in enumerate(self.normalized):
+            for gram in char_ngrams(normalized, ngram_size):
+                postings[gram].append(i)
+        self.index: Dict[str, np.ndarray] = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def shortlist(self, normalized_query: str, size: int = SHORTLIST_SIZE) -> np.ndarray:
+        """Candidate ids sharing the most n-grams with the query, in index order."""
+        counts = np.zeros(len(self.candidates), dtype=np.int32)
+        for gram in char_ngrams(normalized_query, self.ngram_size):
+            ids = self.index.get(gram)
+            if ids is not None:
+                counts[ids] += 1
+        matched = np.flatnonzero(counts)
+        if len(matched) > size:
+            top = np.argpartition(counts[matched], -size)[-size:]
+            matched = np.sort(matched[top])
+        return matched
+
+    def extract_one(self, query: str, shortlist_size: int = SHORTLIST_SIZE, score_cutoff: int = 0) -> Optional[Tuple[str, int]]:
+        """Best (candidate, score) for the query, like process.extractOne(query, candidates)."""
+        if not self.candidates:
+            return None
+        normalized_query = normalize_address(query)
+        ids = self.shortlist(normalized_query, shortlist_size)
+        if len(ids) == 0:
+            # Nothing shares an n-gram with the query; fall back to a full scan.
+            return process.extractOne(query, self.candidates, score_cutoff=score_cutoff)
+
+        best = None
+        for i in ids:
+            score = fuzz.WRatio(normalized_query, self.normalized[i], full_process=False)
+            if score >= score_cutoff and (best is None or score > best[1]):
+                best = (self.candidates[i], score)
+        return best
+
+def bulk_match_options(limit: Any = 1, score_cutoff: Any = 0) -> Tuple[int, float]:
+    """limit and score_cutoff of a bulk request as numbers; ValueError when they are not usable."""
+    try:
+        limit, score_cutoff = int(limit), float(score_cutoff)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("limit and score_cutoff must be numbers") from None
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    if not 0 <= score_cutoff <= 100:
+        raise ValueError("score_cutoff must be between 0 and 100")
+    return limit, score_cutoff
+
+def bulk_match(queries: List[str], candidates: Union[List[str], CandidateSet], limit: int = 1, score_cutoff: int = 0,
+               workers: int = -1, block_size: int = BULK_BLOCK_SIZE) -> Iterator[dict]:
+    """
+    Top `limit` candidates for every query, yielded one query at a time.
+
+    Queries are scored in blocks against all candidates with rapidfuzz's
+    multi-threaded cdist (WRatio on the same normalized strings extractOne
+    uses), so memory stays at block_size x len(candidates) scores.
+
+    Yields:
+        dict: {"index", "address", "matches": [{"match", "score", "index"}]}
+    """
+    if isinstance(candidates, CandidateSet):
+        choices, normalized_choices = candidates.candidates, candidates.normalized
+    else:
+        choices = list(candidates)
+        normalized_choices = [normalize_address(candidate) for candidate in choices]
+    limit = max(1, min(limit, len(choices))) if choices else 0
+
+    for start in range(0, len(queries), block_size):
+        block = queries[start:start + block_size]
+        if not choices:
+            for offset, query in enumerate(block):
+                yield {"index": start + offset, "address": query, "matches": []}
+            continue
+
+        scores = rf_process.cdist([normalize_address(query) for query in block], normalized_choices,
+                                  scorer=rf_fuzz.WRatio, dtype=np.uint8, workers=workers)
+        top = np.argpartition(-scores.astype(np.int16), limit - 1, axis=1)[:, :limit]
+        for offset, query in enumerate(block):
+            row = scores[offset]
+            # Highest score first, ties broken by candidate order like extractOne
+            ids = sorted(top[offset], key=lambda i: (-int(row[i]), i))
+            yield {
+                "index": start + offset,
+                "address": query,
+                "matches": [
+                    {"match": choices[i], "score": int(row[i]), "index": int(i)}
+                    for i in ids if row[i] >= score_cutoff
+                ],
+            }
+
+class CandidateSetStore:
+    """
+    Named candidate sets kept in Redis and indexed lazily in each process.
+
+    Registering a set writes the raw candidates to Redis so every worker
+    (and a restarted one) can rebuild the same index on first use. Each set
+    carries a content version so a re-registered set replaces stale indexes.
+    """
+
+    def __init__(self, redis_conn):
+        self.redis_conn = redis_conn
+        self._sets: Dict[str, CandidateSet] = {}
+        self._lock = threading.Lock()
+
+    def register(self, set_id: str, candidates: List[str]) -> CandidateSet:
+        payload = json.dumps(list(candidates))
+        version = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+        candidate_set = CandidateSet(set_id, candidates, version=version)
+        pipe = self.redis_conn.pipeline()
+        pipe.set(REDIS_KEY_PREFIX + set_id, payload)
+        pipe.set(REDIS_KEY_PREFIX + set_id + ":version", version)
+        pipe.execute()
+        with self._lock:
+            self._sets[set_id] = candidate_set
+        return candidate_set
+
+    def get(self, set_id: str) -> Optional[CandidateSet]:
+        version = self.redis_conn.get(REDIS_KEY_PREFIX + set_id + ":version")
+        if version is None:
+            return None
+        version = version.decode('utf-8') if isinstance(version, bytes) else version
+        with self._lock:
+            candidate_set = self._sets.get(set_id)
+        if candidate_set is not None and candidate_set.version == version:
+            return candidate_set
+
+        raw = self.redis_conn.get(REDIS_KEY_PREFIX + set_id)
+        if raw is None:
+            return None
+        candidate_set = CandidateSet(set_id, json.loads(raw), version=version)
+        with self._lock:
+            self._sets[set_id] = candidate_set
+        return candidate_set
+
+    def delete(self, set_id: str) -> bool:
+        with self._lock:
+            self._sets.pop(set_id, None)
+        return bool(self.redis_conn.delete(REDIS_KEY_PREFIX + set_id, REDIS_KEY_PREFIX + set_id + ":version"))
@@ -1,24 +1,67 @@
-import instructor
-from openai import OpenAI
 import os
 from typing import List, Dict, Tuple, Optional, Any
 from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
 from dotenv import load_dotenv
+from model_registry import registry
+from metrics import record_llm_usage, track_llm_call
 
 load_dotenv()
 
 ai_model = os.getenv("OPENAI_MODEL_70B")
-OpenAI.api_key = os.getenv("OPENAI_API_KEY")
-client = instructor.from_openai(OpenAI())
+OPENAI_CLIENT = "openai:instructor"
+
+def _load_client():
+    instructor = registry.import_module("instructor")
+    OpenAI = registry.import_module("openai").OpenAI
+    OpenAI.api_key = os.getenv("OPENAI_API_KEY")
+    return instructor.from_openai(OpenAI())
+
+OPENAI_ASYNC_CLIENT = "openai:instructor-async"
+
+def _load_async_client():
+    instructor = registry.import_module("instructor")
+    AsyncOpenAI = registry.import_module("openai").AsyncOpenAI
+    return instructor.from_openai(AsyncOpenAI())
+
+registry.register(OPENAI_CLIENT, _load_client)
+registry.register(OPENAI_ASYNC_CLIENT, _load_async_client)
+
+def get_client():
+    # The OpenAI client is created on first use, not at import
+    return registry.get(OPENAI_CLIENT)
+
+def get_async_client():
+    # Bound to the event loop of its first use; only use it from one long-lived loop
+    return registry.get(OPENAI_ASYNC_CLIENT)
 
 def Call(messages: List[Dict[str, str]], res_model: Any) -> Tuple[Optional[str], Optional[Any]]:
     try:
-        data = client.chat.completions.create(
-            model=ai_model,
-            response_model=res_model,
-            messages=messages,
-            temperature=0,
-         )
+        with track_llm_call(res_model):
+            data, completion = get_client().chat.completions.create_with_completion(
+                model=ai_model,
+                response_model=res_model,
+                messages=messages,
+                temperature=0,
+             )
+        record_llm_usage(res_model, completion)
+        return None, data
+    except ValidationError as e:
+        next_message = e.errors()[0]['msg']
+        return next_message, None
+    except Exception as ex:
+        print(ex)
+        return None, None
+
+async def CallAsync(messages: List[Dict[str, str]], res_model: Any) -> Tuple[Optional[str], Optional[Any]]:
+    try:
+        with track_llm_call(res_model):
+            data, completion = await get_async_client().chat.completions.create_with_completion(
+                model=ai_model,
+                response_model=res_model,
+                messages=messages,
+                temperature=0,
+            )
+        record_llm_usage(res_model, completion)
         return None, data
     except ValidationError as e:
         next_message = e.errors()[0]['msg']
@@ -47,8 +90,26 @@ class CoreferenceResolution(BaseModel):
             error, data = CoreferenceResolution.run("She said that she would help her.")
             # Returns: (None, {'clean_text': 'The woman said that the woman would help the other woman.'})
         """
+        # Call the AI model with the improved prompt
+        error, data = Call(cls.conversation(text_block), CoreferenceResolution)
+        if error:
+            return error, ""
+        return None, data.clean_text
+
+    @classmethod
+    async def run_async(cls, text_block: str):
+        """
+        Same as run, awaiting the non-blocking OpenAI client.
+        """
+        error, data = await CallAsync(cls.conversation(text_block), CoreferenceResolution)
+        if error:
+            return error, ""
+        return None, data.clean_text
+
+    @classmethod
+    def conversation(cls, text_block: str) -> List[Dict[str, str]]:
         # Constructing the conversation with improved instructions for the AI model
-        conv = [
+        return [
             {
                 "role": "system",
                 "content": (
@@ -70,12 +131,6 @@ class CoreferenceResolution(BaseModel):
                 )
             }
         ]
-        
-        # Call the AI model with the improved prompt
-        error, data = Call(conv, CoreferenceResolution)
-        if error:
-            return error, ""
-        return None, data.clean_text
 
 class ChunkComparisonWithOriginalText(BaseModel):
     similarity_score: int = Field(..., ge=0, le=100, description="Estimate the similarity between original text and the list of chunks. 100 means all content is preserved in the chunks, 0 means no content is preserved.")
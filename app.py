@@ -1,17 +1,31 @@
-from flask import Flask, request, jsonify, abort
+import time
+_import_started = time.perf_counter()
+
+import json
+import queue
+from flask import Flask, Response, request, jsonify, abort, stream_with_context
 from flask_cors import CORS
-from sentence import SentenceSimilarityScore
+from sentence import SentenceSimilarityScore, SentenceSimilarityMatrix, SentenceSimilarityPairs
 from fuzzywuzzy import fuzz, process
 from rq import Queue
 from redis import Redis
-from pre_text_normalization import text_normalization_with_boundaries, text_remove_stop_words_lemmatized
+from nlp_batching import text_normalization_with_boundaries_batched, text_remove_stop_words_lemmatized_batched
+from pre_text_normalization import NORMALIZATION_ENGINES
 from ai import CoreferenceResolution
 from chunking.ichunker import IChunker
 from chunking.chunker import get_chunker
-from text_processing import PreprocessTextForRAG
+from chunking_jobs import submit_chunking
+from embedding.embedding_cache import embedding_cache_stats
+from parse_cache import get_parse_cache
+from address_matching import CandidateSetStore, bulk_match, bulk_match_options
+from model_registry import registry
+from metrics import exposition, instrument_flask, update_queue_depth
+
+registry.record_import("app", time.perf_counter() - _import_started)
 
 app = Flask(__name__)
 CORS(app)  # This will enable CORS for all routes
+instrument_flask(app)
 
 def SentenceSimilarity(sentence1, sentence2):
     # Implement your sentence similarity function here.
@@ -30,6 +44,29 @@ def compare_sentences():
     score = SentenceSimilarityScore(sentence1, sentence2)
     return jsonify({'score': score})
 
+@app.route('/score-batch', methods=['POST'])
+def compare_sentences_batch():
+    # Either {"sentences1": [...], "sentences2": [...]} for an N x M matrix
+    # or {"pairs": [[sentence1, sentence2], ...]} for one score per pair.
+    data = request.get_json()
+    pairs = data.get('pairs')
+    sentences1 = data.get('sentences1')
+    sentences2 = data.get('sentences2')
+
+    if pairs is not None:
+        if not isinstance(pairs, list) or any(not isinstance(pair, (list, tuple)) or len(pair) != 2 for pair in pairs):
+            return jsonify({'error': 'Invalid input data'}), 400
+        scores = SentenceSimilarityPairs(pairs) if pairs else []
+        return jsonify({'scores': scores})
+
+    if not isinstance(sentences1, list) or not isinstance(sentences2, list):
+        return jsonify({'error': 'Invalid input data'}), 400
+    if not sentences1 or not sentences2:
+        return jsonify({'scores': [[] for _ in sentences1]})
+
+    scores = SentenceSimilarityMatrix(sentences1, sentences2)
+    return jsonify({'scores': scores})
+
 @app.route('/test', methods=['POST'])
 def test():
     sentence1 = "Hi there"
@@ -43,20 +80,81 @@ def address_match():
     data = request.get_json()
     sentence1 = data.get('address')
     available_addresses = data.get('available_addresses')
+    set_id = data.get('set_id')
 
-    if sentence1 is None or available_addresses is None:
+    if sentence1 is None or (available_addresses is None and set_id is None):
         return jsonify({'error': 'Invalid input data'}), 400
 
-    best_match = process.extractOne(sentence1, available_addresses)
+    if set_id is not None:
+        candidate_set = address_sets.get(set_id)
+        if candidate_set is None:
+            return jsonify({'error': f'Unknown address set: {set_id}'}), 404
+        best_match = candidate_set.extract_one(sentence1)
+    else:
+        best_match = process.extractOne(sentence1, available_addresses)
+    if best_match is None:
+        return jsonify({'best_match': None, 'score': 0})
     return jsonify({'best_match': best_match[0], 'score': best_match[1]})
 
+@app.route('/address-match-bulk', methods=['POST'])
+def address_match_bulk():
+    # Streams one JSON line per query: {"index", "address", "matches": [{"match", "score", "index"}]}
+    data = request.get_json()
+    addresses = data.get('addresses')
+    available_addresses = data.get('available_addresses')
+    set_id = data.get('set_id')
+
+    if not isinstance(addresses, list) or (available_addresses is None and set_id is None):
+        return jsonify({'error': 'Invalid input data'}), 400
+    try:
+        # Checked before the stream starts; a bad value would otherwise cut the response short
+        limit, score_cutoff = bulk_match_options(data.get('limit', 1), data.get('score_cutoff', 0))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    candidates = available_addresses
+    if set_id is not None:
+        candidates = address_sets.get(set_id)
+        if candidates is None:
+            return jsonify({'error': f'Unknown address set: {set_id}'}), 404
+
+    def generate():
+        for result in bulk_match(addresses, candidates, limit=limit, score_cutoff=score_cutoff):
+            yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/address-sets', methods=['POST'])
+def register_address_set():
+    data = request.get_json()
+    set_id = data.get('set_id')
+    addresses = data.get('addresses')
+
+    if not set_id or not isinstance(addresses, list):
+        return jsonify({'error': 'Invalid input data'}), 400
+
+    candidate_set = address_sets.register(set_id, addresses)
+    return jsonify({'set_id': set_id, 'size': len(candidate_set)})
+
+@app.route('/address-sets/<set_id>', methods=['DELETE'])
+def delete_address_set(set_id):
+    if not address_sets.delete(set_id):
+        return jsonify({'error': f'Unknown address set: {set_id}'}), 404
+    return jsonify({'set_id': set_id})
+
 @app.route('/text-clean', methods=['POST'])
 def text_clean():
     try:
         data = request.get_json()
         text = data.get('text_block')
-        text_block = text_normalization_with_boundaries(text)
+        engine = data.get('engine')
+        if engine is not None and engine not in NORMALIZATION_ENGINES:
+            return jsonify({'error': f'Unknown engine: {engine}; expected one of {", ".join(NORMALIZATION_ENGINES)}'}), 400
+        text_block = text_normalization_with_boundaries_batched(text, engine)
         return jsonify({'text': text_block})
+    except queue.Full:
+        # The NLP thread is saturated; the client should retry
+        return jsonify({'error': 'Text processing is overloaded, retry later'}), 503
     except Exception as e:
         print(f"Error text_clean: {e}")
         abort(str(e), 501)
@@ -66,8 +164,11 @@ def text_normalize():
     try:
         data = request.get_json()
         text = data.get('text_block')
-        text_block = text_remove_stop_words_lemmatized(text)
+        text_block = text_remove_stop_words_lemmatized_batched(text)
         return jsonify({'text': text_block})
+    except queue.Full:
+        # The NLP thread is saturated; the client should retry
+        return jsonify({'error': 'Text processing is overloaded, retry later'}), 503
     except Exception as e:
         print(f"Error text_normalize: {e}")
         abort(str(e), 501)    
@@ -88,6 +189,8 @@ def remove_pronouns():
 
 
 redis_conn = Redis(host='localhost', port=6379, db=0)
+# Named, pre-indexed candidate lists for /address-match
+address_sets = CandidateSetStore(redis_conn)
 # Create a queue instance
 q_chunking = Queue("chunking", connection=redis_conn)
 
@@ -100,16 +203,38 @@ def chunking():
         wp_action_id = incoming_json_body['wp_action_id']
         # chunker: IChunker = get_chunker(text)
         # chunks = chunker.chunk_text(text)
-        chunker = PreprocessTextForRAG()
-        job = q_chunking.enqueue(chunker.run, text, wp_action_id)
-        print(f"Task queued: {job.id}")
-        return jsonify({ "job_id" : job.id} ), 200
+        # Identical texts share one job or get the stored result re-delivered
+        submitted = submit_chunking(q_chunking, text, wp_action_id)
+        print(f"Task {submitted['status']}: {submitted['job_id']}")
+        return jsonify(submitted), 200
     except Exception as e:
         abort(str(e), 501)
 
+@app.route('/embedding-cache', methods=['GET'])
+def embedding_cache():
+    return jsonify({"caches": embedding_cache_stats()})
+
+@app.route('/parse-cache', methods=['GET'])
+def parse_cache():
+    return jsonify(get_parse_cache().stats())
+
+@app.route('/startup', methods=['GET'])
+def startup():
+    return jsonify(registry.report())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    update_queue_depth([q_chunking])
+    body, content_type = exposition()
+    return Response(body, content_type=content_type)
+
 @app.route("/ping", methods=["GET"])
 def ping():
     return jsonify({"message": "pong"})
 
+# Load the models listed in MODEL_WARMUP (if any) before serving
+registry.warmup()
+print(f"Startup timing: {registry.report()}")
+
 if __name__ == '__main__':
     app.run(port=3011)
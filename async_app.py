@@ -0,0 +1,264 @@
+import asyncio
+import functools
+import json
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from fuzzywuzzy import process
+from redis import Redis
+from rq import Queue
+
+from sentence import SentenceSimilarityScore, SentenceSimilarityMatrix, SentenceSimilarityPairs
+from nlp_batching import text_normalization_with_boundaries_async, text_remove_stop_words_lemmatized_async
+from pre_text_normalization import NORMALIZATION_ENGINES
+from ai import CoreferenceResolution
+from chunking_jobs import submit_chunking
+from embedding.embedding_cache import embedding_cache_stats
+from parse_cache import get_parse_cache
+from address_matching import CandidateSetStore, bulk_match, bulk_match_options
+from model_registry import registry
+from metrics import aiohttp_middleware, exposition, update_queue_depth
+
+# asyncio serving mode with the same routes as app.py. LLM calls await the
+# async OpenAI client; spaCy parses are queued to the shared NLP threads of
+# nlp_batching, and the remaining CPU-bound embedding / fuzzy matching work
+# runs on a bounded thread pool so the event loop keeps accepting requests.
+#
+#   python async_app.py
+#   gunicorn async_app:app --worker-class aiohttp.GunicornWebWorker --bind 0.0.0.0:3011
+
+cpu_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CPU_EXECUTOR_WORKERS", "4")), thread_name_prefix="cpu")
+
+redis_conn = Redis(host='localhost', port=6379, db=0)
+# Named, pre-indexed candidate lists for /address-match
+address_sets = CandidateSetStore(redis_conn)
+q_chunking = Queue("chunking", connection=redis_conn)
+
+routes = web.RouteTableDef()
+
+async def run_cpu(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, functools.partial(func, *args, **kwargs))
+
+def error_response(message, status):
+    return web.json_response({'error': message}, status=status)
+
+@routes.post('/score')
+async def compare_sentences(request):
+    data = await request.json()
+    sentence1 = data.get('sentence1')
+    sentence2 = data.get('sentence2')
+
+    if sentence1 is None or sentence2 is None:
+        return error_response('Invalid input data', 400)
+
+    score = await run_cpu(SentenceSimilarityScore, sentence1, sentence2)
+    return web.json_response({'score': score})
+
+@routes.post('/score-batch')
+async def compare_sentences_batch(request):
+    data = await request.json()
+    pairs = data.get('pairs')
+    sentences1 = data.get('sentences1')
+    sentences2 = data.get('sentences2')
+
+    if pairs is not None:
+        if not isinstance(pairs, list) or any(not isinstance(pair, (list, tuple)) or len(pair) != 2 for pair in pairs):
+            return error_response('Invalid input data', 400)
+        scores = await run_cpu(SentenceSimilarityPairs, pairs) if pairs else []
+        return web.json_response({'scores': scores})
+
+    if not isinstance(sentences1, list) or not isinstance(sentences2, list):
+        return error_response('Invalid input data', 400)
+    if not sentences1 or not sentences2:
+        return web.json_response({'scores': [[] for _ in sentences1]})
+
+    scores = await run_cpu(SentenceSimilarityMatrix, sentences1, sentences2)
+    return web.json_response({'scores': scores})
+
+@routes.post('/test')
+async def test(request):
+    score = await run_cpu(SentenceSimilarityScore, "Hi there", "Good morning")
+    return web.json_response({'score': score})
+
+@routes.post('/address-match')
+async def address_match(request):
+    data = await request.json()
+    sentence1 = data.get('address')
+    available_addresses = data.get('available_addresses')
+    set_id = data.get('set_id')
+
+    if sentence1 is None or (available_addresses is None and set_id is None):
+        return error_response('Invalid input data', 400)
+
+    if set_id is not None:
+        candidate_set = await run_cpu(address_sets.get, set_id)
+        if candidate_set is None:
+            return error_response(f'Unknown address set: {set_id}', 404)
+        best_match = await run_cpu(candidate_set.extract_one, sentence1)
+    else:
+        best_match = await run_cpu(process.extractOne, sentence1, available_addresses)
+    if best_match is None:
+        return web.json_response({'best_match': None, 'score': 0})
+    return web.json_response({'best_match': best_match[0], 'score': best_match[1]})
+
+@routes.post('/address-match-bulk')
+async def address_match_bulk(request):
+    data = await request.json()
+    addresses = data.get('addresses')
+    available_addresses = data.get('available_addresses')
+    set_id = data.get('set_id')
+
+    if not isinstance(addresses, list) or (available_addresses is None and set_id is None):
+        return error_response('Invalid input data', 400)
+    try:
+        # Checked before the stream starts; a bad value would otherwise cut the response short
+        limit, score_cutoff = bulk_match_options(data.get('limit', 1), data.get('score_cutoff', 0))
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    candidates = available_addresses
+    if set_id is not None:
+        candidates = await run_cpu(address_sets.get, set_id)
+        if candidates is None:
+            return error_response(f'Unknown address set: {set_id}', 404)
+
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    results = bulk_match(addresses, candidates, limit=limit, score_cutoff=score_cutoff)
+    try:
+        while True:
+            # Each step may score a whole block of queries, so it runs off the loop
+            result = await run_cpu(next, results, None)
+            if result is None:
+                break
+            await response.write((json.dumps(result) + "\n").encode('utf-8'))
+        await response.write_eof()
+    except ConnectionResetError:
+        # The client hung up mid-stream; there is nobody left to answer
+        pass
+    finally:
+        try:
+            results.close()
+        except ValueError:
+            # Cancelled while a step still runs in the executor; the generator ends with that step
+            pass
+    return response
+
+@routes.post('/address-sets')
+async def register_address_set(request):
+    data = await request.json()
+    set_id = data.get('set_id')
+    addresses = data.get('addresses')
+
+    if not set_id or not isinstance(addresses, list):
+        return error_response('Invalid input data', 400)
+
+    candidate_set = await run_cpu(address_sets.register, set_id, addresses)
+    return web.json_response({'set_id': set_id, 'size': len(candidate_set)})
+
+@routes.delete('/address-sets/{set_id}')
+async def delete_address_set(request):
+    set_id = request.match_info['set_id']
+    if not await run_cpu(address_sets.delete, set_id):
+        return error_response(f'Unknown address set: {set_id}', 404)
+    return web.json_response({'set_id': set_id})
+
+@routes.post('/text-clean')
+async def text_clean(request):
+    try:
+        data = await request.json()
+        engine = data.get('engine')
+        if engine is not None and engine not in NORMALIZATION_ENGINES:
+            return error_response(f'Unknown engine: {engine}; expected one of {", ".join(NORMALIZATION_ENGINES)}', 400)
+        text_block = await text_normalization_with_boundaries_async(data.get('text_block'), engine)
+        return web.json_response({'text': text_block})
+    except queue.Full:
+        # The NLP thread is saturated; the client should retry
+        return error_response('Text processing is overloaded, retry later', 503)
+    except Exception as e:
+        print(f"Error text_clean: {e}")
+        return error_response(str(e), 501)
+
+@routes.post('/text-normalize')
+async def text_normalize(request):
+    try:
+        data = await request.json()
+        text_block = await text_remove_stop_words_lemmatized_async(data.get('text_block'))
+        return web.json_response({'text': text_block})
+    except queue.Full:
+        # The NLP thread is saturated; the client should retry
+        return error_response('Text processing is overloaded, retry later', 503)
+    except Exception as e:
+        print(f"Error text_normalize: {e}")
+        return error_response(str(e), 501)
+
+@routes.post('/remove-pronouns')
+async def remove_pronouns(request):
+    try:
+        block = await request.json()
+        error, clean_text = await CoreferenceResolution.run_async(block['text_block'])
+        if error:
+            return error_response(str(error), 501)
+        return web.json_response({"text": clean_text})
+    except Exception as e:
+        return error_response(str(e), 501)
+
+@routes.post('/chunking')
+async def chunking(request):
+    try:
+        incoming_json_body = await request.json()
+        text = incoming_json_body['text_block']
+        wp_action_id = incoming_json_body['wp_action_id']
+        # Identical texts share one job or get the stored result re-delivered
+        submitted = await run_cpu(submit_chunking, q_chunking, text, wp_action_id)
+        print(f"Task {submitted['status']}: {submitted['job_id']}")
+        return web.json_response(submitted, status=200)
+    except Exception as e:
+        return error_response(str(e), 501)
+
+@routes.get('/embedding-cache')
+async def embedding_cache(request):
+    return web.json_response({"caches": embedding_cache_stats()})
+
+@routes.get('/parse-cache')
+async def parse_cache(request):
+    return web.json_response(get_parse_cache().stats())
+
+@routes.get('/startup')
+async def startup(request):
+    return web.json_response(registry.report())
+
+@routes.get('/metrics')
+async def metrics(request):
+    await run_cpu(update_queue_depth, [q_chunking])
+    body, content_type = exposition()
+    # aiohttp wants the charset separately from the content type
+    content_type, _, charset = content_type.partition('; charset=')
+    return web.Response(body=body, content_type=content_type, charset=charset or None)
+
+@routes.get('/ping')
+async def ping(request):
+    return web.json_response({"message": "pong"})
+
+async def warmup(app):
+    # Load the models listed in MODEL_WARMUP (if any) before serving
+    await run_cpu(registry.warmup)
+    print(f"Startup timing: {registry.report()}")
+
+async def shutdown(app):
+    cpu_executor.shutdown(wait=False)
+
+def create_app():
+    app = web.Application(middlewares=[aiohttp_middleware()])
+    app.add_routes(routes)
+    app.on_startup.append(warmup)
+    app.on_cleanup.append(shutdown)
+    return app
+
+app = create_app()
+
+if __name__ == '__main__':
+    web.run_app(app, port=3011)
@@ -0,0 +1,310 @@
+import argparse
+import importlib.util
+import re
+import sys
+import time
+
+import numpy as np
+
+from chunking.test_text import TestText
+
+# Micro benchmarks for the text pipeline.
+#
+#   python benchmark.py profiles [--repeat 20]
+#   python benchmark.py nlp-executor [--requests 200] [--profile boundaries]
+#   python benchmark.py normalization [--repeat 5]
+#   python benchmark.py semantic-core [--sentences 10000]
+#   python benchmark.py window-mode [--sentences 500]
+#   python benchmark.py chunk-many [--documents 200]
+#   python benchmark.py embedding-backends [--backends torch,torch-int8,onnx,onnx-int8] [--threads 4]
+
+def timed(func, repeat):
+    """Best of `repeat` runs, in seconds, and the last result."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def bench_profiles(args):
+    import spacy
+    from pre_text_normalization import PIPELINE_PROFILES, lemmatize_doc, normalize_doc, parse, tag_doc
+
+    if not spacy.util.is_package("en_core_web_sm"):
+        sys.exit("The profiles benchmark needs en_core_web_sm: python -m spacy download en_core_web_sm")
+    text = TestText
+    cases = [
+        ("text_normalization_with_boundaries", "boundaries", normalize_doc),
+        ("text_remove_stop_words_lemmatized", "lemmatize", lemmatize_doc),
+        ("ner_and_pos_tagging", "full", lambda doc: tag_doc(doc).to_dict()),
+    ]
+    # Load every model before timing
+    for profile in PIPELINE_PROFILES:
+        parse("Warm up.", profile)
+
+    print(f"{len(text)} characters, best of {args.repeat}")
+    print(f"{'function':<38}{'profile':<12}{'full ms':>10}{'profile ms':>12}{'speedup':>9}  same output")
+    for name, profile, helper in cases:
+        full_seconds, full_result = timed(lambda: helper(parse(text, "full")), args.repeat)
+        profile_seconds, profile_result = timed(lambda: helper(parse(text, profile)), args.repeat)
+        if profile == "boundaries":
+            # Sentence boundaries come from punctuation instead of the parser
+            same = full_result.split() == profile_result.split()
+        else:
+            same = full_result == profile_result
+        print(f"{name:<38}{profile:<12}{full_seconds * 1000:>10.1f}{profile_seconds * 1000:>12.1f}"
+              f"{full_seconds / profile_seconds:>8.1f}x  {same}")
+
+def bench_nlp_executor(args):
+    import asyncio
+    from nlp_batching import get_batcher
+    from pre_text_normalization import parse
+
+    texts = [f"Request {i}. " + TestText[:args.chars] for i in range(args.requests)]
+    batcher = get_batcher(args.profile)
+
+    async def per_call_threads():
+        return await asyncio.gather(*(asyncio.to_thread(parse, text, args.profile) for text in texts))
+
+    async def nlp_thread():
+        return await asyncio.gather(*(batcher.submit_async(text) for text in texts))
+
+    parse("Warm up.", args.profile)
+    batcher.parse("Warm up.")
+    print(f"{args.requests} concurrent requests of {args.chars} characters, profile {args.profile}, best of {args.repeat}")
+    threaded_seconds, _ = timed(lambda: asyncio.run(per_call_threads()), args.repeat)
+    executor_seconds, _ = timed(lambda: asyncio.run(nlp_thread()), args.repeat)
+    print(f"asyncio.to_thread per call  {threaded_seconds * 1000:>9.1f} ms  {args.requests / threaded_seconds:>8.0f} req/s")
+    print(f"shared NLP thread           {executor_seconds * 1000:>9.1f} ms  {args.requests / executor_seconds:>8.0f} req/s")
+
+def bench_normalization(args):
+    import spacy
+    from fast_normalization import ENGINES, normalize_text, token_agreement
+    from pre_text_normalization import normalize_doc, parse
+
+    text = TestText
+    models = [("boundaries", "blank en + sentencizer")]
+    if spacy.util.is_package("en_core_web_sm"):
+        models.append(("full", "en_core_web_sm"))
+    print(f"{len(text)} characters, best of {args.repeat}")
+    print(f"{'engine':<28}{'ms':>9}{'chars/s':>12}{'speedup':>9}{'tokens agree':>14}")
+    for profile, label in models:
+        parse("Warm up.", profile)
+        spacy_seconds, expected = timed(lambda: normalize_doc(parse(text, profile)), args.repeat)
+        print(f"{'spacy (' + label + ')':<28}{spacy_seconds * 1000:>9.1f}{len(text) / spacy_seconds:>12.0f}")
+    for engine in ENGINES:
+        seconds, result = timed(lambda: normalize_text(text, engine), args.repeat)
+        print(f"{engine:<28}{seconds * 1000:>9.1f}{len(text) / seconds:>12.0f}"
+              f"{spacy_seconds / seconds:>8.1f}x{token_agreement(expected, result):>14.4f}")
+
+class RandomEncoder:
+    """Stands in for the sentence transformer so only the chunker's own work is timed."""
+
+    def __init__(self, count, dim=384, seed=0):
+        self.embeddings = np.random.default_rng(seed).standard_normal((count, dim), dtype=np.float32)
+
+    def encode(self, texts, show_progress_bar=False, normalize_embeddings=False, **kwargs):
+        # A fresh array per call, like a real encoder
+        embeddings = self.embeddings[:len(texts)].copy()
+        if normalize_embeddings:
+            embeddings /= np.sqrt(np.einsum('ij,ij->i', embeddings, embeddings))[:, None]
+        return embeddings
+
+def legacy_semantic_chunks(chunker, sentences):
+    # SemanticChunker before the NumPy rewrite: a dict per sentence and scipy cosine in a loop
+    from scipy.spatial.distance import cosine
+
+    sentences = [{'sentence': sentence} for sentence in sentences]
+    for i in range(len(sentences)):
+        combined = []
+        for j in range(max(0, i - chunker.buffer_size), min(len(sentences), i + 1 + chunker.buffer_size)):
+            combined.append(sentences[j]['sentence'])
+        sentences[i]['combined_sentence'] = ' '.join(combined)
+    embeddings = chunker.model.encode([x['combined_sentence'] for x in sentences])
+    for i, sentence in enumerate(sentences):
+        sentence['combined_sentence_embedding'] = embeddings[i]
+    distances = []
+    for i in range(len(sentences) - 1):
+        distance = cosine(sentences[i]['combined_sentence_embedding'], sentences[i + 1]['combined_sentence_embedding'])
+        distances.append(distance)
+        sentences[i]['distance_to_next'] = distance
+    threshold = np.percentile(distances, chunker.breakpoint_percentile)
+    chunks, current, length = [], [], 0
+    for i, sentence in enumerate(sentences):
+        current.append(sentence['sentence'])
+        length += len(sentence['sentence'])
+        if (i > 0 and distances[i - 1] > threshold and length >= chunker.min_chunk_length) or length >= chunker.max_chunk_length:
+            chunks.append(' '.join(current))
+            current, length = [], 0
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+def peak_memory(func):
+    """Peak Python allocation while func runs, in bytes, and its result."""
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        result = func()
+        return tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+def bench_semantic_core(args):
+    from chunking.semantic_chunker import SemanticChunker
+
+    base = [sentence for sentence in re.split(r'(?<=[.!?])\s+', ' '.join(TestText.split())) if sentence]
+    sentences = [base[i % len(base)] for i in range(args.sentences)]
+    chunker = SemanticChunker()
+    # Same random embeddings for both implementations
+    chunker._model = RandomEncoder(len(sentences), args.dim)
+
+    def run(func):
+        return func(chunker, sentences)
+
+    legacy_seconds, legacy_chunks = timed(lambda: run(legacy_semantic_chunks), args.repeat)
+    numpy_seconds, numpy_chunks = timed(lambda: run(SemanticChunker._chunk_sentences), args.repeat)
+    legacy_peak, _ = peak_memory(lambda: run(legacy_semantic_chunks))
+    numpy_peak, _ = peak_memory(lambda: run(SemanticChunker._chunk_sentences))
+    print(f"{len(sentences)} sentences, {args.dim}-d embeddings (random, encoder not timed), best of {args.repeat}")
+    print(f"{'implementation':<18}{'ms':>9}{'peak MiB':>10}{'chunks':>8}")
+    print(f"{'dicts + scipy':<18}{legacy_seconds * 1000:>9.1f}{legacy_peak / 2**20:>10.1f}{len(legacy_chunks):>8}")
+    print(f"{'numpy':<18}{numpy_seconds * 1000:>9.1f}{numpy_peak / 2**20:>10.1f}{len(numpy_chunks):>8}")
+    print(f"speedup {legacy_seconds / numpy_seconds:.1f}x, same chunks: {legacy_chunks == numpy_chunks}")
+
+def boundary_agreement(ends, other_ends):
+    """F1 of two sets of chunk boundaries (sentence indices), 1.0 when they are identical."""
+    ends, other_ends = set(ends), set(other_ends)
+    if not ends and not other_ends:
+        return 1.0
+    return 2 * len(ends & other_ends) / (len(ends) + len(other_ends))
+
+def bench_window_mode(args):
+    from chunking.semantic_chunker import SemanticChunker
+
+    if importlib.util.find_spec("sentence_transformers") is None:
+        sys.exit("The window-mode benchmark needs sentence-transformers: pip install sentence-transformers")
+    base = [sentence for sentence in re.split(r'(?<=[.!?])\s+', ' '.join(TestText.split())) if sentence]
+    sentences = [base[i % len(base)] for i in range(args.sentences)]
+    lengths = np.array([len(sentence) for sentence in sentences])
+
+    results = {}
+    for mode in ("text", "pooled"):
+        chunker = SemanticChunker(window_mode=mode)
+        chunker.model.encode(["Warm up."])
+
+        def ends():
+            embeddings = chunker._window_embeddings(sentences)
+            return chunker._chunk_ends(chunker._calculate_cosine_distances(embeddings), lengths)
+
+        results[mode] = timed(ends, args.repeat)
+
+    text_seconds, text_ends = results["text"]
+    pooled_seconds, pooled_ends = results["pooled"]
+    print(f"{len(sentences)} sentences, buffer_size {SemanticChunker().buffer_size}, best of {args.repeat}")
+    print(f"{'window mode':<14}{'ms':>10}{'sentences/s':>13}{'chunks':>8}")
+    for mode, (seconds, mode_ends) in results.items():
+        print(f"{mode:<14}{seconds * 1000:>10.1f}{len(sentences) / seconds:>13.0f}{len(mode_ends):>8}")
+    print(f"speedup {text_seconds / pooled_seconds:.1f}x, boundary agreement (F1) {boundary_agreement(text_ends, pooled_ends):.3f}")
+
+def bench_chunk_many(args):
+    from chunking.semantic_chunker import SemanticChunker
+
+    if importlib.util.find_spec("sentence_transformers") is None:
+        sys.exit("The chunk-many benchmark needs sentence-transformers: pip install sentence-transformers")
+    base = [sentence for sentence in re.split(r'(?<=[.!?])\s+', ' '.join(TestText.split())) if sentence]
+    # Product-description sized documents; cleaning and the coreference LLM call are not timed
+    documents = [[base[(i * 7 + j) % len(base)] for j in range(args.sentences)] for i in range(args.documents)]
+    chunker = SemanticChunker(window_mode=args.window_mode)
+    chunker.model.encode(["Warm up."])
+
+    loop_seconds, loop_chunks = timed(lambda: [chunker._chunk_sentences(sentences) for sentences in documents], args.repeat)
+    batch_seconds, batch_chunks = timed(
+        lambda: chunker._chunk_many_sentences(documents, args.encode_batch_size, args.n_process), args.repeat)
+    print(f"{len(documents)} documents of {args.sentences} sentences, window mode {args.window_mode}, best of {args.repeat}")
+    print(f"{'':<24}{'s':>8}{'docs/s':>10}")
+    print(f"{'one at a time':<24}{loop_seconds:>8.2f}{len(documents) / loop_seconds:>10.1f}")
+    print(f"{'chunk_many':<24}{batch_seconds:>8.2f}{len(documents) / batch_seconds:>10.1f}")
+    print(f"speedup {loop_seconds / batch_seconds:.1f}x, same chunks: {loop_chunks == batch_chunks}")
+
+def bench_embedding_backends(args):
+    if importlib.util.find_spec("sentence_transformers") is None:
+        sys.exit("The embedding-backends benchmark needs sentence-transformers: pip install sentence-transformers")
+    from embedding.backends import cosine_drift, load_backend
+
+    base = [sentence for sentence in re.split(r'(?<=[.!?])\s+', ' '.join(TestText.split())) if sentence]
+    sentences = [base[i % len(base)] for i in range(args.sentences)]
+
+    results = {}
+    for backend_name in args.backends.split(","):
+        if backend_name.startswith("onnx") and importlib.util.find_spec("onnxruntime") is None:
+            print(f"skipping {backend_name}: pip install onnxruntime")
+            continue
+        backend = load_backend(args.model, backend_name, args.threads)
+        backend.encode(["Warm up."])
+        results[backend_name] = timed(lambda: backend.encode(sentences, batch_size=args.batch_size), args.repeat)
+
+    reference_seconds, reference = results.get("torch", next(iter(results.values()), (None, None)))
+    print(f"{args.model}, {len(sentences)} sentences, batch size {args.batch_size}, threads {args.threads or 'default'}, best of {args.repeat}")
+    print(f"{'backend':<14}{'s':>8}{'sentences/s':>13}{'speedup':>9}{'mean drift':>12}{'max drift':>11}")
+    for backend_name, (seconds, embeddings) in results.items():
+        drift = cosine_drift(reference, embeddings)
+        print(f"{backend_name:<14}{seconds:>8.2f}{len(sentences) / seconds:>13.0f}{reference_seconds / seconds:>8.1f}x"
+              f"{drift['mean']:>12.2e}{drift['max']:>11.2e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Text pipeline benchmarks")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    profiles = subcommands.add_parser("profiles", help="Per-function spaCy pipeline profiles against the full pipeline")
+    profiles.add_argument("--repeat", type=int, default=20)
+    profiles.set_defaults(func=bench_profiles)
+
+    executor = subcommands.add_parser("nlp-executor", help="asyncio.to_thread per parse against the shared NLP thread")
+    executor.add_argument("--requests", type=int, default=200)
+    executor.add_argument("--chars", type=int, default=500, help="characters per request")
+    executor.add_argument("--profile", default="boundaries")
+    executor.add_argument("--repeat", type=int, default=5)
+    executor.set_defaults(func=bench_nlp_executor)
+
+    normalization = subcommands.add_parser("normalization", help="fast_normalization engines against spaCy")
+    normalization.add_argument("--repeat", type=int, default=5)
+    normalization.set_defaults(func=bench_normalization)
+
+    semantic_core = subcommands.add_parser("semantic-core", help="SemanticChunker windows, distances and breakpoints")
+    semantic_core.add_argument("--sentences", type=int, default=10000)
+    semantic_core.add_argument("--dim", type=int, default=384)
+    semantic_core.add_argument("--repeat", type=int, default=3)
+    semantic_core.set_defaults(func=bench_semantic_core)
+
+    window_mode = subcommands.add_parser("window-mode", help="SemanticChunker window strings against pooled sentence embeddings")
+    window_mode.add_argument("--sentences", type=int, default=500)
+    window_mode.add_argument("--repeat", type=int, default=3)
+    window_mode.set_defaults(func=bench_window_mode)
+
+    chunk_many = subcommands.add_parser("chunk-many", help="SemanticChunker.chunk_many against chunking one document at a time")
+    chunk_many.add_argument("--documents", type=int, default=200)
+    chunk_many.add_argument("--sentences", type=int, default=8, help="sentences per document")
+    chunk_many.add_argument("--window-mode", default="text")
+    chunk_many.add_argument("--encode-batch-size", type=int, default=128)
+    chunk_many.add_argument("--n-process", type=int, default=1)
+    chunk_many.add_argument("--repeat", type=int, default=3)
+    chunk_many.set_defaults(func=bench_chunk_many)
+
+    backends = subcommands.add_parser("embedding-backends", help="Embedding backend throughput and cosine drift against torch")
+    backends.add_argument("--model", default="all-MiniLM-L6-v2")
+    backends.add_argument("--backends", default="torch,torch-int8,onnx,onnx-int8", help="comma separated; drift is measured against torch, or the first one when torch is not listed")
+    backends.add_argument("--sentences", type=int, default=2000)
+    backends.add_argument("--batch-size", type=int, default=32)
+    backends.add_argument("--threads", type=int, default=0, help="0 keeps the library default")
+    backends.add_argument("--repeat", type=int, default=3)
+    backends.set_defaults(func=bench_embedding_backends)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
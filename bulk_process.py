@@ -0,0 +1,105 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Iterator, Set, Tuple
+
+from pre_text_normalization import process_woocommerce_corpus
+
+logger = logging.getLogger(__name__)
+
+# Offline normalization, lemmatization and NER of a catalog dump.
+#
+#   python bulk_process.py products.jsonl results.jsonl --n-process -1
+#   python bulk_process.py ./descriptions/ results.jsonl --batch-size 64
+#
+# Input is a JSONL file (one {"id": ..., "text": ...} object per line) or a
+# directory of text files (the id is the path relative to the directory).
+# Every output line is {"id": ..., **process_woocommerce_text(text)}. Run the
+# same command again after an interruption to resume: documents already in
+# the output file are skipped.
+
+def read_jsonl(path: str, id_field: str, text_field: str) -> Iterator[Tuple[str, str]]:
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            doc_id = record.get(id_field, line_number)
+            yield record.get(text_field) or "", str(doc_id)
+
+def read_directory(path: str, extensions: Tuple[str, ...]) -> Iterator[Tuple[str, str]]:
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if extensions and not name.endswith(extensions):
+                continue
+            file_path = os.path.join(root, name)
+            with open(file_path, encoding='utf-8', errors='replace') as f:
+                yield f.read(), os.path.relpath(file_path, path)
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids already written, after dropping a partial last line left by an interruption."""
+    if not os.path.exists(output_path):
+        return set()
+    done = set()
+    with open(output_path, 'rb+') as f:
+        valid_end = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError):
+                break
+            valid_end += len(line)
+        f.truncate(valid_end)
+    return done
+
+def run(args):
+    if os.path.isdir(args.input):
+        records = read_directory(args.input, tuple(args.extensions))
+    else:
+        records = read_jsonl(args.input, args.id_field, args.text_field)
+
+    done = completed_ids(args.output)
+    if done:
+        logger.info(f"Resuming: {len(done)} documents already in {args.output}")
+    pending = ((text, doc_id) for text, doc_id in records if doc_id not in done)
+
+    started = time.perf_counter()
+    count = 0
+    characters = 0
+    with open(args.output, 'a', encoding='utf-8') as out:
+        for result, doc_id in process_woocommerce_corpus(pending, n_process=args.n_process, batch_size=args.batch_size):
+            out.write(json.dumps({"id": doc_id, **result}, ensure_ascii=False) + "\n")
+            count += 1
+            characters += len(result["original"])
+            if count % args.report_every == 0:
+                # A flushed line is a finished document for the next resume
+                out.flush()
+                elapsed = time.perf_counter() - started
+                logger.info(f"{count} documents, {count / elapsed:.1f} docs/s, {characters / elapsed / 1000:.0f}k chars/s")
+
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Done: {count} documents in {elapsed:.1f}s ({rate:.1f} docs/s) -> {args.output}")
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Normalize, lemmatize and tag a corpus with spaCy")
+    parser.add_argument("input", help="JSONL file or directory of text files")
+    parser.add_argument("output", help="JSONL results file; appended to and resumed from")
+    parser.add_argument("--n-process", type=int, default=-1, help="spaCy worker processes (-1: all cores)")
+    parser.add_argument("--batch-size", type=int, default=32, help="documents per nlp.pipe batch")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--extensions", nargs="*", default=[".txt"], help="file extensions read from a directory")
+    parser.add_argument("--report-every", type=int, default=1000, help="log throughput every N documents")
+    args = parser.parse_args(argv)
+    run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,27 @@
 import asyncio
-import instructor
-from openai import OpenAI
 import os
 from typing import List, Dict, Tuple, Optional, Any
 from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
 from dotenv import load_dotenv
-from pre_text_normalization import ner_and_pos_tagging_async
+from ai import get_client
+from columnar_tags import TagColumns
+from nlp_batching import ner_and_pos_tagging_async
+from metrics import record_llm_usage, track_llm_call
 
 load_dotenv()
 
 ai_model = os.getenv("OPENAI_MODEL_70B")
-OpenAI.api_key = os.getenv("OPENAI_API_KEY")
-client = instructor.from_openai(OpenAI())
 
 def Call(messages: List[Dict[str, str]], res_model: Any) -> Tuple[Optional[str], Optional[Any]]:
     try:
-        data = client.chat.completions.create(
-            model=ai_model,
-            response_model=res_model,
-            messages=messages,
-            temperature=0,
-         )
+        with track_llm_call(res_model):
+            data, completion = get_client().chat.completions.create_with_completion(
+                model=ai_model,
+                response_model=res_model,
+                messages=messages,
+                temperature=0,
+             )
+        record_llm_usage(res_model, completion)
         return None, data
     except ValidationError as e:
         next_message = e.errors()[0]['msg']
@@ -31,13 +32,15 @@ def Call(messages: List[Dict[str, str]], res_model: Any) -> Tuple[Optional[str],
 
 async def CallAsync(messages: List[Dict[str, str]], res_model: Any) -> Tuple[Optional[str], Optional[Any]]:
     try:
-        data = await asyncio.to_thread(
-            client.chat.completions.create,
-            model=ai_model,
-            response_model=res_model,
-            messages=messages,
-            temperature=0,
-        )
+        with track_llm_call(res_model):
+            data, completion = await asyncio.to_thread(
+                get_client().chat.completions.create_with_completion,
+                model=ai_model,
+                response_model=res_model,
+                messages=messages,
+                temperature=0,
+            )
+        record_llm_usage(res_model, completion)
         return None, data
     except ValidationError as e:
         next_message = e.errors()[0]['msg']
@@ -134,13 +137,13 @@ class Chunking(BaseModel):
         return chunks
 
     @classmethod
-    def run(cls, text_block: str, ner_and_pos: Dict[str, Any]):
+    def run(cls, text_block: str, ner_and_pos: TagColumns):
         """
         Perform chunking on the input text based on best fit.
 
         Args:
             text_block (str): The original product description text.
-            ner_and_pos (Dict[str, Any]): Named Entity Recognition and Part-of-Speech tagging results.
+            ner_and_pos (TagColumns): Named Entity Recognition and Part-of-Speech tagging results.
 
         Returns:
             tuple: A tuple containing an error message if applicable, and a Chunking object with chunks.
@@ -170,7 +173,7 @@ class Chunking(BaseModel):
                 "content": (
                     f"Please process the following WooCommerce product description text:\n\n"
                     f"\"{text_block}\"\n\n"
-                    f"NER and POS tagging results: {ner_and_pos}\n\n"
+                    f"NER and POS tagging results: {ner_and_pos.to_dict()}\n\n"
                     f"Provide the text chunks, utilizing the NER and POS information."
                 )
             }
@@ -189,9 +192,10 @@ class ProductChunkInfo(BaseModel):
     text_chunk: str = ""
 
     @classmethod
-    async def run(cls, chunk_text: str) -> Tuple[Optional[str], Optional['ProductChunkInfo']]:
-        # Assume ner_and_pos_tagging is an async function or wrap it if necessary
-        ner_and_pos = await ner_and_pos_tagging_async(chunk_text)
+    async def run(cls, chunk_text: str, ner_and_pos: Optional[TagColumns] = None) -> Tuple[Optional[str], Optional['ProductChunkInfo']]:
+        # Callers holding the parse of the parent text pass the chunk's tags in
+        if ner_and_pos is None:
+            ner_and_pos = await ner_and_pos_tagging_async(chunk_text)
 
         conv = [
             {
@@ -206,7 +210,7 @@ Chunk text:
 {chunk_text}
 
 NER and POS tagging:
-{ner_and_pos}
+{ner_and_pos.to_dict()}
 
 Please provide:
 1. 1-2 potential customer questions and answers (each as a single string)
@@ -238,7 +242,7 @@ ner:
         # Assume Call is an async function
         error, data = await CallAsync(conv, ProductChunkInfo)
         if data:
-            data.ner = ner_and_pos["ner"]
+            data.ner = ner_and_pos.entities()
             data.text_chunk = chunk_text
         return error, data
     
@@ -1,13 +1,43 @@
 from chunking.semantic_chunker import SemanticChunker
 from chunking.paragraph_chunker import ParagraphChunker
 from chunking.ichunker import IChunker
+from typing import List
+
+# Chunkers only hold configuration and a shared model, so one instance of each is reused
+_paragraph_chunker = None
+_semantic_chunker = None
 
 def get_chunker(text: str) -> IChunker:
+    global _paragraph_chunker, _semantic_chunker
     # Check if the text has paragraph separation
     if "\n\n" in text or "\r\n\r\n" in text:
-        return ParagraphChunker()
+        if _paragraph_chunker is None:
+            _paragraph_chunker = ParagraphChunker()
+        return _paragraph_chunker
     else:
-        return SemanticChunker()
+        if _semantic_chunker is None:
+            _semantic_chunker = SemanticChunker()
+        return _semantic_chunker
+
+def chunk_many(texts: List[str], n_process: int = 1) -> List[List[str]]:
+    """
+    get_chunker(text).chunk_text(text) for every text, with the texts that
+    go to the SemanticChunker embedded together (see SemanticChunker.chunk_many).
+    """
+    results: List[List[str]] = [[] for _ in texts]
+    semantic_chunker = None
+    semantic = []
+    for i, text in enumerate(texts):
+        chunker = get_chunker(text)
+        if isinstance(chunker, SemanticChunker):
+            semantic_chunker = chunker
+            semantic.append(i)
+        else:
+            results[i] = chunker.chunk_text(text)
+    if semantic:
+        for i, chunks in zip(semantic, semantic_chunker.chunk_many([texts[i] for i in semantic], n_process=n_process)):
+            results[i] = chunks
+    return results
 
 def review_text(text: str) -> str:
     if not text:
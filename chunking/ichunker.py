@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterable, Iterator, List, Union
 
 class IChunker(ABC):
 
@@ -7,3 +7,15 @@ class IChunker(ABC):
     def chunk_text(self, text: str) -> List[str]:
         pass
 
+    def chunk_text_iter(self, text_or_iterable: Union[str, Iterable[str]]) -> Iterator[str]:
+        """
+        Chunks as they are produced. `text_or_iterable` is a string or an
+        iterable of string pieces, such as an open text file. This default
+        reads everything and chunks it at once; chunkers that can emit
+        chunks earlier override it.
+        """
+        if isinstance(text_or_iterable, str):
+            text = text_or_iterable
+        else:
+            text = ''.join(text_or_iterable)
+        yield from self.chunk_text(text)
@@ -4,44 +4,60 @@ import os
 sys.path.insert(0, os.path.dirname(sys.path[0]))
 
 from chunking.ichunker import IChunker
-from chunking.semantic_chunker import SemanticChunker
-from pre_text_normalization import text_normalization_with_boundaries, text_remove_stop_words_lemmatized
+from chunking.semantic_chunker import CHUNK_LENGTH_UNIT, LENGTH_UNITS, SemanticChunker
+from pre_text_normalization import analyze_text
 from ai import CoreferenceResolution
 from coreference import coreference_resolution
+from token_count import ai_model, token_lengths
 
 def simple_sentence_tokenize(text):
     return re.findall(r'[^.!?]+[.!?]', text)
 
 class ParagraphChunker(IChunker):
-    def __init__(self):
-        self.max_chunk_length = 2000
-        self.min_chunk_length = 500
-        self.semantic_chunker = SemanticChunker()
+    def __init__(self, length_unit=None, token_model=None):
+        if length_unit is None:
+            length_unit = CHUNK_LENGTH_UNIT
+        if length_unit not in LENGTH_UNITS:
+            raise ValueError(f"Unknown length_unit {length_unit!r}; expected one of {LENGTH_UNITS}")
+        self.length_unit = length_unit
+        self.token_model = token_model
+        self.max_chunk_length = 2000 if length_unit == "chars" else 450
+        self.min_chunk_length = 500 if length_unit == "chars" else 110
+        self.semantic_chunker = SemanticChunker(length_unit=length_unit, token_model=token_model)
 
     def _split_paragraphs(self, text):
         paragraphs = re.split(r'\n\s*\n', text)
         return [p.strip() for p in paragraphs if p.strip()]
 
+    def _lengths(self, paragraphs):
+        # Counted once per paragraph; merged chunks add up their paragraphs
+        if self.length_unit == "tokens":
+            return token_lengths(paragraphs, self.token_model or ai_model)
+        return [len(paragraph) for paragraph in paragraphs]
+
     def _merge_short_paragraphs(self, paragraphs):
         merged = []
         current_chunk = ""
+        current_length = 0
         
-        for paragraph in paragraphs:
-            if len(current_chunk) + len(paragraph) < self.min_chunk_length:
+        for paragraph, length in zip(paragraphs, self._lengths(paragraphs)):
+            if current_length + length < self.min_chunk_length:
+                if current_chunk and self.length_unit == "chars":
+                    current_length += 1  # the joining space
                 current_chunk += " " + paragraph if current_chunk else paragraph
+                current_length += length
             else:
                 if current_chunk:
-                    merged.append(current_chunk)
+                    merged.append((current_chunk, current_length))
                 current_chunk = paragraph
+                current_length = length
         
         if current_chunk:
-            merged.append(current_chunk)
+            merged.append((current_chunk, current_length))
         
         return merged
 
-    def _process_chunk(self, chunk):
-        chunk_length = len(chunk)
-        
+    def _process_chunk(self, chunk, chunk_length):
         if chunk_length < self.min_chunk_length:
             # Short chunks are processed by semantic chunker
             return self.semantic_chunker.chunk_text(chunk)
@@ -53,8 +69,8 @@ class ParagraphChunker(IChunker):
             return self.semantic_chunker.chunk_text(chunk)
 
     def chunk_text(self, text):
-        text_normalized = text_normalization_with_boundaries(text)
-        text_clean = text_remove_stop_words_lemmatized(text_normalized)
+        # Only the lemmatized text is needed, so NER is skipped
+        text_clean = analyze_text(text, "lemmatize").cleaned
         # text_block = coreference_resolution(text_clean)
         error, text_block = CoreferenceResolution.run(text_clean)
         if error:
@@ -65,8 +81,8 @@ class ParagraphChunker(IChunker):
         merged_paragraphs = self._merge_short_paragraphs(paragraphs)
         
         chunks = []
-        for merged_chunk in merged_paragraphs:
-            chunks.extend(self._process_chunk(merged_chunk))
+        for merged_chunk, length in merged_paragraphs:
+            chunks.extend(self._process_chunk(merged_chunk, length))
 
         return chunks
 
@@ -1,9 +1,12 @@
+import bisect
+import functools
 import os
 import sys
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from scipy.spatial.distance import cosine
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Union
 
 # ------------------------------------
 import sys
@@ -12,92 +15,330 @@ sys.path.insert(0, os.path.dirname(sys.path[0]))
 # ------------------------------------
 from chunking.test_text import TestText
 from chunking.ichunker import IChunker
-from pre_text_normalization import text_normalization_with_boundaries, text_remove_stop_words_lemmatized
+from embedding.backends import cache_name
+from embedding.embedding_cache import CachedEncoder, get_embedding_cache
+from model_registry import registry
+from metrics import observe_encode
+from token_count import ai_model, token_lengths
+from pre_text_normalization import analyze_text
 from ai import CoreferenceResolution
 from coreference import coreference_resolution
 
+# How the embedding of a sentence and its buffer_size neighbours is made:
+#   "text"    encode the joined window string (every sentence is encoded ~2 * buffer_size + 1 times)
+#   "pooled"  encode every sentence once and average the sentence embeddings of the window
+WINDOW_MODES = ("text", "pooled")
+SEMANTIC_WINDOW_MODE = os.getenv("SEMANTIC_WINDOW_MODE", "text")
+# Unit of max_chunk_length / min_chunk_length: "chars", or "tokens" of token_model's tiktoken encoding
+LENGTH_UNITS = ("chars", "tokens")
+CHUNK_LENGTH_UNIT = os.getenv("CHUNK_LENGTH_UNIT", "chars")
+# chunk_text_iter cleans and resolves coreferences in blocks of about this many characters
+STREAM_BLOCK_CHARS = int(os.getenv("SEMANTIC_STREAM_BLOCK_CHARS", "20000"))
+SENTENCE_END = re.compile(r'[.!?]\s+')
+# Windows per encoder batch in chunk_many
+CHUNK_MANY_ENCODE_BATCH_SIZE = int(os.getenv("CHUNK_MANY_ENCODE_BATCH_SIZE", "128"))
+
 class SemanticChunker(IChunker):
 
-    def __init__(self, model_name=None, breakpoint_percentile=None, max_chunk_length=None, buffer_size=None, min_chunk_length=None):
+    def __init__(self, model_name=None, breakpoint_percentile=None, max_chunk_length=None, buffer_size=None, min_chunk_length=None, cache_embeddings=False, window_mode=None,
+                 length_unit=None, token_model=None):
         if model_name is None:
             model_name = "all-MiniLM-L6-v2"
         if breakpoint_percentile is None:
             breakpoint_percentile = 0.9  # Increased from 0.8 to 0.9
+        if length_unit is None:
+            length_unit = CHUNK_LENGTH_UNIT
+        if length_unit not in LENGTH_UNITS:
+            raise ValueError(f"Unknown length_unit {length_unit!r}; expected one of {LENGTH_UNITS}")
         if max_chunk_length is None:
-            max_chunk_length = 3000  # Increased from 1500 to 3000
+            max_chunk_length = 3000 if length_unit == "chars" else 700  # Increased from 1500 to 3000
         if buffer_size is None:
             buffer_size = 3  # Increased from 2 to 3
         if min_chunk_length is None:
-            min_chunk_length = 600  # Increased from 300 to 600
-        self.model = SentenceTransformer(model_name)
+            min_chunk_length = 600 if length_unit == "chars" else 140  # Increased from 300 to 600
+        if window_mode is None:
+            window_mode = SEMANTIC_WINDOW_MODE
+        if window_mode not in WINDOW_MODES:
+            raise ValueError(f"Unknown window_mode {window_mode!r}; expected one of {WINDOW_MODES}")
+        self.model_name = model_name
+        self.cache_embeddings = cache_embeddings
+        self._model = None
         self.breakpoint_percentile = breakpoint_percentile
         self.max_chunk_length = max_chunk_length
         self.buffer_size = buffer_size
         self.min_chunk_length = min_chunk_length
+        self.window_mode = window_mode
+        self.length_unit = length_unit
+        self.token_model = token_model
+
+    @property
+    def model(self):
+        # Shared through the model registry and loaded on first use; the
+        # reference is released when this chunker is garbage collected.
+        if self._model is None:
+            model = registry.acquire_for(self, f"sentence-transformer:{self.model_name}")
+            if self.cache_embeddings:
+                # Window strings rarely repeat across documents, so caching is opt-in here
+                # (single sentences in "pooled" mode repeat more often)
+                model = CachedEncoder(model, get_embedding_cache(cache_name(self.model_name)), "semantic_chunker")
+            self._model = model
+        return self._model
 
     def _split_sentences(self, text):
         # Simple regex-based sentence splitter
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        return [{'sentence': sentence} for sentence in sentences if sentence]
+        return [sentence for sentence in re.split(r'(?<=[.!?])\s+', text) if sentence]
 
     def _combine_sentences(self, sentences):
-        for i in range(len(sentences)):
-            combined = []
-            range_start = max(0, i - self.buffer_size)
-            range_end = min(len(sentences), i + 1 + self.buffer_size)
-            for j in range(range_start, range_end):
-                combined.append(sentences[j]['sentence'])
-            sentences[i]['combined_sentence'] = ' '.join(combined)
-        return sentences
-
-    def _calculate_cosine_distances(self, sentences):
-        embeddings = [s['combined_sentence_embedding'] for s in sentences]
-        distances = []
-        for i in range(len(embeddings) - 1):
-            distance = cosine(embeddings[i], embeddings[i + 1])
-            distances.append(distance)
-            sentences[i]['distance_to_next'] = distance
-        return distances, sentences
+        # Each sentence with buffer_size sentences of context on either side
+        return [' '.join(sentences[max(0, i - self.buffer_size):i + 1 + self.buffer_size]) for i in range(len(sentences))]
 
-    def chunk_text(self, text):
-        text_normalized = text_normalization_with_boundaries(text)
-        text_clean = text_remove_stop_words_lemmatized(text_normalized)
+    def _embed(self, texts, **kwargs) -> np.ndarray:
+        # Loaded before timing; a CachedEncoder only counts and times its cache misses
+        model = self.model
+        if isinstance(model, CachedEncoder):
+            embeddings = model.encode(texts, show_progress_bar=False, normalize_embeddings=True, **kwargs)
+        else:
+            with observe_encode("semantic_chunker", len(texts)):
+                embeddings = model.encode(texts, show_progress_bar=False, normalize_embeddings=True, **kwargs)
+        return unit_rows(embeddings)
+
+    def _window_inputs(self, sentences: List[str]) -> List[str]:
+        # One text to encode per sentence
+        return sentences if self.window_mode == "pooled" else self._combine_sentences(sentences)
+
+    def _windows_from_encoded(self, encoded: np.ndarray) -> np.ndarray:
+        return pooled_windows(encoded, self.buffer_size) if self.window_mode == "pooled" else encoded
+
+    def _window_embeddings(self, sentences: List[str]) -> np.ndarray:
+        return self._windows_from_encoded(self._embed(self._window_inputs(sentences)))
+
+    def _calculate_cosine_distances(self, embeddings: np.ndarray) -> np.ndarray:
+        # Rows are unit length: distance i is 1 - cos(row i, row i + 1)
+        return 1.0 - np.einsum('ij,ij->i', embeddings[:-1], embeddings[1:])
+
+    def _lengths(self, sentences: List[str]) -> np.ndarray:
+        """
+        Length of every sentence in length_unit. A chunk's length is the sum
+        over its sentences, so no chunk is ever encoded as a whole; in tokens
+        that can differ from encoding the joined chunk by about one token
+        per sentence boundary.
+        """
+        if self.length_unit == "tokens":
+            return np.array(token_lengths(sentences, self.token_model or ai_model), dtype=np.int64)
+        return np.fromiter((len(sentence) for sentence in sentences), dtype=np.int64, count=len(sentences))
+
+    def _chunk_ends(self, distances: np.ndarray, lengths: np.ndarray) -> List[int]:
+        """
+        Index of the last sentence of every chunk.
+
+        A chunk ends after sentence i when the distance from sentence i - 1 to
+        i is above the breakpoint percentile and the chunk has reached
+        min_chunk_length (in length_unit), or as soon as it reaches
+        max_chunk_length. Both are found with binary searches over the
+        cumulative lengths, so the loop runs once per chunk, not per sentence.
+        """
+        count = len(lengths)
+        threshold = np.percentile(distances, self.breakpoint_percentile) if len(distances) else np.inf
+        # Plain lists: bisect on them is much cheaper per call than np.searchsorted
+        ends_at = np.cumsum(lengths).tolist()
+        breaks = (np.flatnonzero(distances > threshold) + 1).tolist()
+        ends = []
+        start, start_offset = 0, 0
+        while start < count:
+            by_length = bisect.bisect_left(ends_at, start_offset + self.max_chunk_length)
+            long_enough = max(start, bisect.bisect_left(ends_at, start_offset + self.min_chunk_length))
+            k = bisect.bisect_left(breaks, long_enough)
+            by_break = breaks[k] if k < len(breaks) else count
+            end = min(by_length, by_break, count - 1)
+            ends.append(end)
+            start, start_offset = end + 1, ends_at[end]
+        return ends
+
+    def _chunk_sentences(self, sentences: List[str]) -> List[str]:
+        if not sentences:
+            return []
+        return self._chunks_from_embeddings(sentences, self._window_embeddings(sentences))
+
+    def _chunks_from_embeddings(self, sentences: List[str], embeddings: np.ndarray) -> List[str]:
+        if not sentences:
+            return []
+        distances = self._calculate_cosine_distances(embeddings)
+        lengths = self._lengths(sentences)
+        chunks = []
+        start = 0
+        for end in self._chunk_ends(distances, lengths):
+            chunks.append(' '.join(sentences[start:end + 1]))
+            start = end + 1
+        return chunks
+
+    def _prepare_text(self, text):
+        # Only the lemmatized text is needed, so NER is skipped
+        text_clean = analyze_text(text, "lemmatize").cleaned
         # text_block = coreference_resolution(text_clean)
         error, text_block = CoreferenceResolution.run(text_clean)
         if error:
             print(f"Warning: Error in CoreferenceResolution: {error}")
             text_block = text_clean  # Fallback to cleaned text if pronoun removal fails
-        
-        sentences = self._split_sentences(text_block)
-        sentences = self._combine_sentences(sentences)
-        
-        # Generate embeddings for the combined sentences
-        embeddings = self.model.encode([x['combined_sentence'] for x in sentences], show_progress_bar=False)
-        for i, sentence in enumerate(sentences):
-            sentence['combined_sentence_embedding'] = embeddings[i]
-        
-        distances, sentences = self._calculate_cosine_distances(sentences)
-        
-        breakpoint_distance_threshold = np.percentile(distances, self.breakpoint_percentile)
-        
-        chunks = []
-        current_chunk = []
-        current_chunk_length = 0
-        
-        for i, sentence in enumerate(sentences):
-            current_chunk.append(sentence['sentence'])
-            current_chunk_length += len(sentence['sentence'])
-            
-            if (i > 0 and distances[i-1] > breakpoint_distance_threshold and current_chunk_length >= self.min_chunk_length) or \
-               current_chunk_length >= self.max_chunk_length:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = []
-                current_chunk_length = 0
-        
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        return chunks
+        return text_block
+
+    def chunk_text(self, text):
+        return self._chunk_sentences(self._split_sentences(self._prepare_text(text)))
+
+    def chunk_many(self, texts: Iterable[str], encode_batch_size: int = CHUNK_MANY_ENCODE_BATCH_SIZE,
+                   n_process: int = 1) -> List[List[str]]:
+        """
+        chunk_text for many documents, one list of chunks per text.
+
+        The windows of every document go to the encoder in one call, so its
+        batches are full (and sorted by length across documents) instead of
+        one small, padded encode per document. Breakpoints are then selected
+        per document, in n_process worker processes when n_process > 1.
+        """
+        documents = [self._split_sentences(self._prepare_text(text)) for text in texts]
+        return self._chunk_many_sentences(documents, encode_batch_size, n_process)
+
+    def _chunk_many_sentences(self, documents: List[List[str]], encode_batch_size: int = CHUNK_MANY_ENCODE_BATCH_SIZE,
+                              n_process: int = 1) -> List[List[str]]:
+        inputs = [text for sentences in documents for text in self._window_inputs(sentences)]
+        encoded = self._embed(inputs, batch_size=encode_batch_size) if inputs else None
+        ends = np.cumsum([len(sentences) for sentences in documents]).tolist()
+        embeddings = [self._windows_from_encoded(encoded[end - len(sentences):end]) if sentences else None
+                      for sentences, end in zip(documents, ends)]
+        if n_process == 1 or len(documents) < 2:
+            return [self._chunks_from_embeddings(sentences, rows) for sentences, rows in zip(documents, embeddings)]
+        settings = {
+            "breakpoint_percentile": self.breakpoint_percentile,
+            "max_chunk_length": self.max_chunk_length,
+            "min_chunk_length": self.min_chunk_length,
+            "length_unit": self.length_unit,
+            "token_model": self.token_model,
+        }
+        workers = None if n_process < 1 else n_process
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(functools.partial(_chunk_embedded, settings), documents, embeddings,
+                                 chunksize=max(1, len(documents) // (4 * (workers or os.cpu_count() or 1)))))
+
+    def _iter_sentences(self, text_or_iterable: Union[str, Iterable[str]]) -> Iterator[str]:
+        pieces = [text_or_iterable] if isinstance(text_or_iterable, str) else text_or_iterable
+        buffer = ""
+        for piece in pieces:
+            buffer += piece
+            while len(buffer) > STREAM_BLOCK_CHARS:
+                cut = _block_end(buffer, STREAM_BLOCK_CHARS)
+                block, buffer = buffer[:cut], buffer[cut:]
+                yield from self._split_sentences(self._prepare_text(block))
+        if buffer.strip():
+            yield from self._split_sentences(self._prepare_text(buffer))
+
+    def chunk_text_iter(self, text_or_iterable: Union[str, Iterable[str]], batch_size: int = 64,
+                        breakpoint_threshold: Optional[float] = None, calibration_size: int = 2000) -> Iterator[str]:
+        """
+        Streaming chunk_text for book-length input.
+
+        Sentences are embedded batch_size at a time, as soon as the
+        buffer_size sentences after them have arrived. Only that look-ahead,
+        the sentences of the chunk being built and the last calibration_size
+        distances are kept. A chunk is yielded as soon as its last sentence is
+        known.
+
+        The breakpoint is breakpoint_threshold when given (a cosine distance,
+        e.g. calibrated offline with chunk_text on similar documents);
+        otherwise it is the breakpoint_percentile of the distances seen so
+        far, capped at the last calibration_size. A text of at most
+        batch_size sentences gets the same chunks as chunk_text.
+        """
+        window: List[str] = []  # sentences still needed for context, window[0] is sentence `first`
+        first = 0
+        embedded = 0  # first sentence without a window embedding
+        previous = None  # window embedding of sentence embedded - 1
+        recent = deque(maxlen=calibration_size)
+        chunk: List[str] = []
+        chunk_length = 0
+
+        def advance(final):
+            nonlocal first, embedded, previous, chunk, chunk_length
+            while True:
+                available = first + len(window)
+                end = min(available if final else available - self.buffer_size, embedded + batch_size)
+                if end <= embedded:
+                    return
+                start = max(embedded - self.buffer_size, first)
+                segment = window[start - first:min(end + self.buffer_size, available) - first]
+                embeddings = self._window_embeddings(segment)[embedded - start:end - start]
+                if previous is not None:
+                    embeddings = np.vstack([previous[None, :], embeddings])
+                distances = self._calculate_cosine_distances(embeddings).tolist()
+                if previous is None:
+                    distances.insert(0, None)  # the first sentence has no predecessor
+                recent.extend(distance for distance in distances if distance is not None)
+                if breakpoint_threshold is not None:
+                    threshold = breakpoint_threshold
+                else:
+                    threshold = np.percentile(recent, self.breakpoint_percentile) if recent else np.inf
+
+                sentences = window[embedded - first:end - first]
+                for sentence, length, distance in zip(sentences, self._lengths(sentences).tolist(), distances):
+                    chunk.append(sentence)
+                    chunk_length += length
+                    if (distance is not None and distance > threshold and chunk_length >= self.min_chunk_length) or \
+                       chunk_length >= self.max_chunk_length:
+                        yield ' '.join(chunk)
+                        chunk = []
+                        chunk_length = 0
+
+                previous = embeddings[-1]
+                embedded = end
+                drop = embedded - self.buffer_size - first
+                if drop > 0:
+                    del window[:drop]
+                    first += drop
+
+        for sentence in self._iter_sentences(text_or_iterable):
+            window.append(sentence)
+            if first + len(window) - embedded >= batch_size + self.buffer_size:
+                yield from advance(final=False)
+        yield from advance(final=True)
+        if chunk:
+            yield ' '.join(chunk)
+
+def unit_rows(embeddings) -> np.ndarray:
+    """float32 embedding matrix with every non-zero row scaled to length 1."""
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    # einsum does not materialize matrix ** 2 like np.linalg.norm does
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))
+    if np.allclose(norms[norms > 0], 1.0, atol=1e-4):
+        # Already normalized by the encoder: no copy
+        return matrix
+    return matrix / np.where(norms > 0, norms, 1.0)[:, None]
+
+def _chunk_embedded(settings, sentences, embeddings):
+    # Process-pool worker of chunk_many; the chunker never loads a model here
+    return SemanticChunker(**settings)._chunks_from_embeddings(sentences, embeddings)
+
+def _block_end(text: str, max_chars: int) -> int:
+    # After the last sentence end within max_chars, so no sentence is cleaned in two halves
+    last = None
+    for last in SENTENCE_END.finditer(text, 0, max_chars):
+        pass
+    if last is not None:
+        return last.end()
+    space = text.rfind(' ', 0, max_chars)
+    return space + 1 if space > 0 else max_chars
+
+def pooled_windows(embeddings: np.ndarray, buffer_size: int) -> np.ndarray:
+    """
+    Unit-length mean of each row and its buffer_size neighbours on either side.
+
+    Every window sum is the difference of two rows of the running (float64)
+    total, so the cost does not grow with buffer_size.
+    """
+    count = len(embeddings)
+    totals = np.zeros((count + 1, embeddings.shape[1]), dtype=np.float64)
+    np.cumsum(embeddings, axis=0, out=totals[1:])
+    index = np.arange(count)
+    window_start = np.maximum(index - buffer_size, 0)
+    window_end = np.minimum(index + buffer_size + 1, count)
+    return unit_rows(totals[window_end] - totals[window_start])
 
 if __name__ == "__main__":
     text = """Babylon was an ancient city located on the lower Euphrates river in southern Mesopotamia, within modern-day Hillah, Iraq, about 85 kilometers (55 miles) south of modern day Baghdad. Babylon functioned as the main cultural and political centre of the Akkadian-speaking region of Babylonia. Its rulers established two important empires in antiquity, the 19th–16th century BC Old Babylonian Empire, and the 7th–6th century BC Neo-Babylonian Empire. Babylon was also used as a regional capital of other empires, such as the Achaemenid Empire. Babylon was one of the most important urban centres of the ancient Near East, until its decline during the Hellenistic period. Nearby ancient sites are Kish, Borsippa, Dilbat, and Kutha.[2] The earliest known mention of Babylon as a small town appears on a clay tablet from the reign of Shar-Kali-Sharri (2217–2193 BC), of the Akkadian Empire.[3] Babylon was merely a religious and cultural centre at this point and neither an independent state nor a large city, subject to the Akkadian Empire. After the collapse of the Akkadian Empire, the south Mesopotamian region was dominated by the Gutian Dynasty for a few decades, before the rise of the Third Dynasty of Ur, which encompassed the whole of Mesopotamia, including the town of Babylon. The town became part of a small independent city-state with the rise of the first Babylonian Empire, now known as the Old Babylonian Empire, in the 19th century BC. The Amorite king Hammurabi founded the short-lived Old Babylonian Empire in the 18th century BC. He built Babylon into a major city and declared himself its king. Southern Mesopotamia became known as Babylonia, and Babylon eclipsed Nippur as the region's holy city. The empire waned under Hammurabi's son Samsu-iluna, and Babylon spent long periods under Assyrian, Kassite and Elamite domination. After the Assyrians destroyed and then rebuilt it, Babylon became the capital of the short-lived Neo-Babylonian Empire, from 626 to 539 BC. The Hanging Gardens of Babylon were ranked as one of the Seven Wonders of the Ancient World, allegedly existing between approximately 600 BC and AD 1. However, there are questions about whether the Hanging Gardens of Babylon even existed, as there is no mention within any extant Babylonian texts of its existence.[4][5] After the fall of the Neo-Babylonian Empire, the city came under the rule of the Achaemenid, Seleucid, Parthian, Roman, Sassanid, and Muslim empires. The last known habitation of the town dates from the 11th century, when it was referred to as the "small village of Babel". It has been estimated that Babylon was the largest city in the world c. 1770 – c. 1670 BC, and again c. 612 – c. 320 BC. It was perhaps the first city to reach a population above 200,000.[6] Estimates for the maximum extent of its area range from 890 (3½ sq. mi.)[7] to 900 ha (2,200 acres).[8] The main sources of information about Babylon—excavation of the site itself, references in cuneiform texts found elsewhere in Mesopotamia, references in the Bible, descriptions in other classical writing, especially by Herodotus, and second-hand descriptions, citing the work of Ctesias and Berossus—present an incomplete and sometimes contradictory picture of the ancient city, even at its peak in the sixth century BC.[9] UNESCO inscribed Babylon as a World Heritage Site in 2019. The site receives thousands of visitors each year, almost all of whom are Iraqis.[10][11] Construction is rapidly increasing, which has caused encroachments upon the ruins.[12][13][14]"""
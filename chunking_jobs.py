@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+
+from redis.exceptions import WatchError
+from rq import get_current_job
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+
+from text_keys import normalize_text
+from text_processing import PreprocessTextForRAG, deliver_chunks, deserialize_chunks, serialize_chunks
+
+# /chunking deduplication: identical product texts (after whitespace
+# normalization) are processed once. A finished result is re-delivered to new
+# wp_action_ids; a request for a text that is still being processed joins the
+# running job and gets the same chunks when it finishes. A request whose job
+# was lost (enqueue failed, job expired or failed) takes the text over, and its
+# job delivers to everyone who joined the lost one.
+
+RESULT_TTL = int(os.getenv("CHUNKING_RESULT_TTL", str(60 * 60 * 24 * 7)))
+JOB_TTL = int(os.getenv("CHUNKING_JOB_TTL", str(60 * 60)))
+# How long the job key may stay empty while the first request enqueues its job
+ENQUEUE_TTL = 30
+ALIVE_STATUSES = (JobStatus.QUEUED, JobStatus.STARTED, JobStatus.DEFERRED, JobStatus.SCHEDULED)
+KEY_PREFIX = "chunking:"
+
+def content_hash(text_block: str) -> str:
+    return hashlib.sha256(normalize_text(text_block).encode('utf-8')).hexdigest()
+
+def _keys(content_key: str):
+    return (
+        f"{KEY_PREFIX}result:{content_key}",
+        f"{KEY_PREFIX}job:{content_key}",
+        f"{KEY_PREFIX}waiters:{content_key}",
+    )
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+def _job_alive(redis_conn, job_id: str) -> bool:
+    try:
+        return Job.fetch(job_id, connection=redis_conn).get_status() in ALIVE_STATUSES
+    except NoSuchJobError:
+        return False
+
+def submit_chunking(queue, text_block: str, wp_action_id) -> dict:
+    """
+    Queue chunking for text_block unless the same text is done or in progress.
+
+    Returns:
+        dict: {"job_id", "status"} where status is "queued" (new job),
+              "in_progress" (joined a running job) or "cached" (re-delivery job).
+    """
+    redis_conn = queue.connection
+    content_key = content_hash(text_block)
+    result_key, job_key, waiters_key = _keys(content_key)
+
+    with redis_conn.pipeline() as pipe:
+        while True:
+            try:
+                # Watching the result closes the race with a job that finishes meanwhile
+                pipe.watch(result_key, job_key)
+                if pipe.exists(result_key):
+                    pipe.unwatch()
+                    status = "cached"
+                    break
+                running_job_id = _decode(pipe.get(job_key))
+                # An empty id is a job another request is enqueueing right now
+                joined = running_job_id == "" or (running_job_id is not None and _job_alive(redis_conn, running_job_id))
+                pipe.multi()
+                pipe.sadd(waiters_key, str(wp_action_id))
+                pipe.expire(waiters_key, JOB_TTL)
+                if not joined:
+                    pipe.set(job_key, "", ex=ENQUEUE_TTL)
+                pipe.execute()
+                status = "in_progress" if joined else "queued"
+                break
+            except WatchError:
+                continue
+
+    if status == "cached":
+        job = queue.enqueue(redeliver_chunks, content_key, wp_action_id, text_block)
+        return {"job_id": job.id, "status": status}
+    if status == "in_progress":
+        # None while the first request is still enqueueing its job
+        return {"job_id": running_job_id or None, "status": status}
+
+    try:
+        job = queue.enqueue(run_chunking_job, text_block, content_key)
+    except Exception:
+        # The next request takes over instead of joining a job that was never queued
+        if _decode(redis_conn.get(job_key)) == "":
+            redis_conn.delete(job_key)
+        redis_conn.srem(waiters_key, str(wp_action_id))
+        raise
+    redis_conn.set(job_key, job.id, ex=JOB_TTL)
+    return {"job_id": job.id, "status": status}
+
+def run_chunking_job(text_block: str, content_key: str):
+    """RQ job: chunk the text once and deliver the chunks to every waiting wp_action_id."""
+    redis_conn = get_current_job().connection
+    result_key, job_key, waiters_key = _keys(content_key)
+    try:
+        result = PreprocessTextForRAG().process(text_block)
+    except Exception as e:
+        result = {"error": f"Error in rag_pipeline_processing: {e}", "chunks": []}
+
+    pipe = redis_conn.pipeline(transaction=True)
+    if "error" not in result:
+        pipe.set(result_key, json.dumps(serialize_chunks(result["chunks"])), ex=RESULT_TTL)
+    pipe.smembers(waiters_key)
+    pipe.delete(waiters_key, job_key)
+    waiters = pipe.execute()[-2]
+
+    if "error" in result:
+        print(result["error"])
+        return result
+    for wp_action_id in waiters:
+        wp_action_id = _decode(wp_action_id)
+        try:
+            deliver_chunks(wp_action_id, result["chunks"])
+        except Exception as e:
+            print(f"Error delivering chunks to {wp_action_id}: {e}")
+    return result
+
+def redeliver_chunks(content_key: str, wp_action_id, text_block: str):
+    """RQ job: deliver a stored result to a new wp_action_id without recomputing it."""
+    redis_conn = get_current_job().connection
+    result_key, _, _ = _keys(content_key)
+    raw = redis_conn.get(result_key)
+    if raw is None:
+        # Expired since the request was accepted; process it the normal way
+        return PreprocessTextForRAG().run(text_block, wp_action_id)
+    chunks = deserialize_chunks(json.loads(raw))
+    deliver_chunks(wp_action_id, chunks)
+    return {"chunks": chunks}
@@ -0,0 +1,157 @@
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import srsly
+
+from model_registry import registry
+
+FORMAT_VERSION = 1
+
+def _compact(values) -> np.ndarray:
+    """Non-negative integers in the smallest unsigned dtype that holds them."""
+    values = np.asarray(values, dtype=np.int64)
+    high = int(values.max()) if len(values) else 0
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if high <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values.astype(np.uint64)
+
+def _intern(hashes: np.ndarray, strings) -> Tuple[List[str], np.ndarray]:
+    """Label table and per-row codes for a column of spaCy string hashes."""
+    unique, codes = np.unique(hashes, return_inverse=True)
+    return [strings[int(h)] for h in unique], _compact(codes)
+
+class TagColumns:
+    """
+    NER and POS results of a Doc (or chunk Span) as a structure of arrays.
+
+    Token and entity texts are not stored; they are slices of `text` given
+    by start offsets and lengths. POS, tag, dependency and entity labels are
+    interned: each has a small table of distinct strings and an integer code
+    per token or entity. Every column uses the smallest integer type that
+    holds it. `to_dict` rebuilds the legacy ner_and_pos_tagging format
+    exactly; it is only meant for LLM prompts and external APIs. `to_bytes`
+    (msgpack, also used for pickling) and `to_json` store token starts as
+    the gap after the previous token, which is almost always 0 or 1.
+    """
+
+    COLUMNS = ("token_start", "token_length", "pos", "tag", "dep", "ent_start", "ent_length", "ent_label")
+
+    def __init__(self, text: str, labels: Dict[str, List[str]], **columns: np.ndarray):
+        self.text = text
+        self.labels = labels
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+
+    @classmethod
+    def from_doc(cls, doc) -> 'TagColumns':
+        # Offsets of a chunk view are relative to the chunk, as if it was parsed on its own
+        offset = getattr(doc, 'start_char', 0)
+        attrs = _spacy_attrs()
+        strings = doc.vocab.strings
+        if len(doc):
+            array = doc.to_array([attrs.IDX, attrs.LENGTH, attrs.POS, attrs.TAG, attrs.DEP])
+        else:
+            array = np.zeros((0, 5), dtype=np.uint64)
+        pos_labels, pos = _intern(array[:, 2], strings)
+        tag_labels, tag = _intern(array[:, 3], strings)
+        dep_labels, dep = _intern(array[:, 4], strings)
+
+        ents = list(doc.ents)
+        ent_labels, ent_label = _intern(np.array([ent.label for ent in ents], dtype=np.uint64), strings)
+        return cls(
+            doc.text,
+            {"pos": pos_labels, "tag": tag_labels, "dep": dep_labels, "ent": ent_labels},
+            token_start=(array[:, 0].astype(np.int64) - offset).astype(np.int32),
+            token_length=_compact(array[:, 1]),
+            pos=pos, tag=tag, dep=dep,
+            ent_start=np.array([ent.start_char - offset for ent in ents], dtype=np.int32),
+            ent_length=_compact([ent.end_char - ent.start_char for ent in ents]),
+            ent_label=ent_label,
+        )
+
+    @classmethod
+    def empty(cls, text: str = "") -> 'TagColumns':
+        """No tokens and no entities; what a text that could not be parsed is tagged with."""
+        none = np.zeros(0, dtype=np.uint8)
+        return cls(text, {"pos": [], "tag": [], "dep": [], "ent": []},
+                   token_start=np.zeros(0, dtype=np.int32), token_length=none, pos=none, tag=none, dep=none,
+                   ent_start=np.zeros(0, dtype=np.int32), ent_length=none, ent_label=none)
+
+    def __len__(self):
+        return len(self.token_start)
+
+    def __reduce__(self):
+        # RQ pickles job results; msgpack is several times smaller than pickling the arrays
+        return TagColumns.from_bytes, (self.to_bytes(),)
+
+    def entities(self) -> List[Dict[str, Any]]:
+        """The "ner" list of the ner_and_pos_tagging format."""
+        text = self.text
+        ent_labels = self.labels["ent"]
+        return [
+            {"text": text[start:start + length], "start_char": start, "end_char": start + length, "label": ent_labels[label]}
+            for start, length, label in zip(self.ent_start.tolist(), self.ent_length.tolist(), self.ent_label.tolist())
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The ner_and_pos_tagging result: {"ner": [...], "pos": [...]}."""
+        text = self.text
+        pos_labels, tag_labels, dep_labels = self.labels["pos"], self.labels["tag"], self.labels["dep"]
+        return {
+            "ner": self.entities(),
+            "pos": [
+                {"text": text[start:start + length], "pos": pos_labels[pos], "tag": tag_labels[tag], "dep": dep_labels[dep]}
+                for start, length, pos, tag, dep in zip(self.token_start.tolist(), self.token_length.tolist(),
+                                                        self.pos.tolist(), self.tag.tolist(), self.dep.tolist())
+            ],
+        }
+
+    def _serialized_columns(self) -> Dict[str, np.ndarray]:
+        columns = {name: getattr(self, name) for name in self.COLUMNS if name != "token_start"}
+        starts = self.token_start.astype(np.int64)
+        previous_ends = np.concatenate(([0], starts[:-1] + self.token_length[:-1]))
+        columns["token_gap"] = _compact(starts - previous_ends)
+        return columns
+
+    @classmethod
+    def _from_serialized(cls, text: str, labels: Dict[str, List[str]], columns: Dict[str, Any]) -> 'TagColumns':
+        gaps = np.asarray(columns.pop("token_gap"), dtype=np.int64)
+        lengths = np.asarray(columns["token_length"], dtype=np.int64)
+        # start[i] = start[i - 1] + length[i - 1] + gap[i]
+        columns["token_start"] = np.cumsum(gaps + np.concatenate(([0], lengths[:-1]))).astype(np.int32)
+        columns["ent_start"] = np.asarray(columns["ent_start"], dtype=np.int32)
+        for name in ("token_length", "pos", "tag", "dep", "ent_length", "ent_label"):
+            columns[name] = _compact(columns[name])
+        return cls(text, labels, **columns)
+
+    def to_json(self) -> Dict[str, Any]:
+        """JSON-compatible form: label tables plus one integer list per column."""
+        return {
+            "version": FORMAT_VERSION,
+            "text": self.text,
+            "labels": self.labels,
+            "columns": {name: values.tolist() for name, values in self._serialized_columns().items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> 'TagColumns':
+        return cls._from_serialized(data["text"], data["labels"], dict(data["columns"]))
+
+    def to_bytes(self) -> bytes:
+        """msgpack with the columns as raw arrays."""
+        return srsly.msgpack_dumps({
+            "version": FORMAT_VERSION,
+            "text": self.text,
+            "labels": self.labels,
+            "columns": self._serialized_columns(),
+        })
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TagColumns':
+        msg = srsly.msgpack_loads(data)
+        return cls._from_serialized(msg["text"], msg["labels"], dict(msg["columns"]))
+
+def _spacy_attrs():
+    # spaCy is imported lazily, like the models themselves
+    return registry.import_module("spacy.attrs")
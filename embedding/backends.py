@@ -0,0 +1,222 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from model_registry import registry
+
+# Sentence embedding backends for CPU inference.
+#
+# Every backend exposes the subset of SentenceTransformer.encode the code base
+# uses, so the registry can hand one out wherever a SentenceTransformer was
+# used before ("sentence-transformer:<model>" names). EMBEDDING_BACKEND picks
+# the implementation:
+#
+#   "torch"       the SentenceTransformer as is (full precision, on CUDA when
+#                 available); the other backends always run on the CPU
+#   "torch-int8"  the SentenceTransformer with its Linear layers dynamically
+#                 quantized to int8 (torch.quantization.quantize_dynamic)
+#   "onnx"        the transformer exported to ONNX and run with ONNX Runtime;
+#                 tokenization and pooling stay in Python
+#   "onnx-int8"   the ONNX export with dynamically quantized int8 weights
+#
+# EMBEDDING_THREADS sets torch's intra-op thread count or ONNX Runtime's
+# intra_op_num_threads (0 keeps the library default, one thread per core).
+# ONNX exports are written once under EMBEDDING_ONNX_DIR and reused.
+# `cosine_drift` measures how far a backend is from the torch one; see
+# tests/test_embedding_backend.py and `python benchmark.py embedding-backends`.
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join(os.path.expanduser("~"), ".cache", "gpt-spacy", "onnx"))
+
+class EmbeddingBackend(ABC):
+    """
+    SentenceTransformer-compatible `encode` over a backend that embeds one batch at a time.
+
+    Sentences are sorted longest first before batching, like SentenceTransformer
+    does, so each batch pads to similar lengths.
+    """
+
+    name = ""
+
+    def __init__(self, model_name: str, dimension: int):
+        self.model_name = model_name
+        self.dimension = dimension
+
+    @abstractmethod
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """float32 embeddings, one row per text."""
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False, convert_to_numpy: bool = True,
+               convert_to_tensor: bool = False, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts: List[str] = [sentences] if single else list(sentences)
+
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            embeddings[rows] = self._encode_batch([texts[i] for i in rows])
+
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        if single:
+            embeddings = embeddings[0]
+        if convert_to_tensor:
+            return registry.import_module("torch").from_numpy(embeddings)
+        return embeddings
+
+class TorchBackend(EmbeddingBackend):
+    """The SentenceTransformer itself, in full precision, on the device it picks (CUDA when available)."""
+
+    name = "torch"
+    device: Optional[str] = None
+
+    def __init__(self, model_name: str, threads: int = EMBEDDING_THREADS):
+        if threads:
+            # Process-wide; every torch model in the process shares the pool
+            registry.import_module("torch").set_num_threads(threads)
+        self.model = registry.import_module("sentence_transformers").SentenceTransformer(model_name, device=self.device)
+        super().__init__(model_name, self.model.get_sentence_embedding_dimension())
+
+    def __getattr__(self, name):
+        # tokenizer, max_seq_length, ... of the wrapped SentenceTransformer
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+    def encode(self, sentences, **kwargs):
+        return self.model.encode(sentences, **kwargs)
+
+class QuantizedTorchBackend(TorchBackend):
+    """The SentenceTransformer with int8 dynamically quantized Linear layers."""
+
+    name = "torch-int8"
+    # Dynamic quantization only has CPU kernels
+    device = "cpu"
+
+    def __init__(self, model_name: str, threads: int = EMBEDDING_THREADS):
+        super().__init__(model_name, threads)
+        torch = registry.import_module("torch")
+        # Weights are quantized once here, activations per batch at run time
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    The model's transformer exported to ONNX and run with ONNX Runtime.
+
+    The SentenceTransformer is only loaded to export the transformer, and for
+    its tokenizer and pooling settings; it is dropped once the session is up.
+    """
+
+    name = "onnx"
+    quantize = False
+
+    def __init__(self, model_name: str, threads: int = EMBEDDING_THREADS):
+        ort = registry.import_module("onnxruntime")
+        model = registry.import_module("sentence_transformers").SentenceTransformer(model_name, device="cpu")
+        super().__init__(model_name, model.get_sentence_embedding_dimension())
+        self.tokenizer = model.tokenizer
+        self.max_seq_length = model.max_seq_length
+        modules = list(model)
+        self.cls_pooling = any(getattr(module, "pooling_mode_cls_token", False) for module in modules)
+        self.normalize = any(type(module).__name__ == "Normalize" for module in modules)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(export_onnx(model, model_name, self.quantize), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = [session_input.name for session_input in self.session.get_inputs()]
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        features = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np")
+        token_embeddings = self.session.run(None, {name: features[name].astype(np.int64) for name in self.input_names})[0]
+        if self.cls_pooling:
+            embeddings = token_embeddings[:, 0]
+        else:
+            mask = features["attention_mask"][:, :, None].astype(np.float32)
+            embeddings = np.einsum("bsd,bsk->bd", token_embeddings, mask) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings.astype(np.float32, copy=False)
+
+class QuantizedOnnxBackend(OnnxBackend):
+    """The ONNX export with int8 dynamically quantized weights."""
+
+    name = "onnx-int8"
+    quantize = True
+
+BACKENDS = {backend.name: backend for backend in (TorchBackend, QuantizedTorchBackend, OnnxBackend, QuantizedOnnxBackend)}
+
+def export_onnx(model, model_name: str, quantize: bool = False) -> str:
+    """Export the SentenceTransformer's transformer to ONNX once and return the (int8) file."""
+    os.makedirs(EMBEDDING_ONNX_DIR, exist_ok=True)
+    base = os.path.join(EMBEDDING_ONNX_DIR, model_name.replace("/", "__"))
+    path = f"{base}.onnx"
+    if not os.path.exists(path):
+        torch = registry.import_module("torch")
+        sample = model.tokenizer(["Export the transformer."], return_tensors="pt")
+        # The transformer's forward takes input_ids, attention_mask, token_type_ids in this order
+        names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]}
+        transformer = model[0].auto_model.eval()
+        with _temporary_path(path) as tmp_path, torch.no_grad():
+            torch.onnx.export(transformer, tuple(sample[name] for name in names), tmp_path, input_names=names,
+                              output_names=["last_hidden_state"], dynamic_axes=dynamic_axes, opset_version=14)
+    if not quantize:
+        return path
+    quantized_path = f"{base}.int8.onnx"
+    if not os.path.exists(quantized_path):
+        quantization = registry.import_module("onnxruntime.quantization")
+        with _temporary_path(quantized_path) as tmp_path:
+            quantization.quantize_dynamic(path, tmp_path, weight_type=quantization.QuantType.QInt8)
+    return quantized_path
+
+@contextmanager
+def _temporary_path(path: str):
+    """
+    A unique file next to `path` that replaces it when the block succeeds.
+
+    Workers exporting the same model at once each write their own file, and
+    none of them ever loads a partial one.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_backend(model_name: str, backend: Optional[str] = None, threads: int = EMBEDDING_THREADS) -> EmbeddingBackend:
+    backend = backend or EMBEDDING_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {tuple(BACKENDS)}")
+    return BACKENDS[backend](model_name, threads)
+
+def cache_name(model_name: str, backend: Optional[str] = None) -> str:
+    """EmbeddingCache name for the model; quantized embeddings are not mixed with full precision ones."""
+    backend = backend or EMBEDDING_BACKEND
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+def cosine_drift(reference, candidate) -> Dict[str, float]:
+    """Cosine distance between matching rows of two embedding matrices (0.0 = same direction)."""
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    similarity = np.einsum("ij,ij->i", reference, candidate) / np.clip(
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1), 1e-12, None)
+    drift = 1.0 - similarity
+    return {"mean": float(drift.mean()) if len(drift) else 0.0, "max": float(drift.max()) if len(drift) else 0.0}
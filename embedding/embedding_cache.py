@@ -0,0 +1,226 @@
+import fcntl
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from metrics import observe_encode
+from text_keys import normalize_text
+
+def embedding_key(model_name: str, text: str) -> str:
+    return hashlib.sha1(f"{model_name}\0{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+class DiskEmbeddingStore:
+    """
+    Append-only on-disk embedding store shared by every process on the host.
+
+    Vectors are appended as raw float32 rows to `vectors.f32` and read back
+    through a numpy memmap; `index.txt` maps each key to its row. Appends are
+    serialized with an exclusive flock so several workers can share one store.
+
+    Rows are never evicted: once `vectors.f32` holds `max_bytes` (0 = no limit)
+    the store stops growing and new embeddings only live in the in-memory LRU.
+    Entries do not expire either; to reclaim the space, or after a model
+    changes under the same name, stop the workers and delete the store
+    directory. It is rebuilt as embeddings are computed again.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.full = False
+        os.makedirs(path, exist_ok=True)
+        self.vectors_path = os.path.join(path, 'vectors.f32')
+        self.index_path = os.path.join(path, 'index.txt')
+        self.lock_path = os.path.join(path, '.lock')
+        self.dim: Optional[int] = None
+        self._rows: Dict[str, int] = {}
+        self._index_offset = 0
+        self._memmap = None
+        self._lock = threading.Lock()
+        self._refresh()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _refresh(self):
+        # Pick up rows appended by other processes since the last read.
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # Partially written line, read it next time
+                self._index_offset += len(line.encode('utf-8'))
+                key, row, dim = line.split()
+                self._rows[key] = int(row)
+                self.dim = int(dim)
+
+    def _vectors(self, row: int):
+        if self._memmap is None or row >= self._memmap.shape[0]:
+            rows = os.path.getsize(self.vectors_path) // (self.dim * 4)
+            self._memmap = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+        return self._memmap
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            if key not in self._rows:
+                self._refresh()
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            return np.array(self._vectors(row)[row])
+
+    def put(self, key: str, embedding: np.ndarray):
+        vector = np.ascontiguousarray(embedding, dtype=np.float32).reshape(-1)
+        with self._lock, open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if key in self._rows:
+                    return
+                if self.dim is not None and vector.shape[0] != self.dim:
+                    raise ValueError(f"Embedding dimension {vector.shape[0]} does not match store dimension {self.dim}")
+                size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+                if self.max_bytes and size + vector.nbytes > self.max_bytes:
+                    self.full = True
+                    return
+                with open(self.vectors_path, 'ab') as f:
+                    row = f.tell() // (vector.shape[0] * 4)
+                    f.write(vector.tobytes())
+                # The index line is written after the vector so readers never see a row without data.
+                with open(self.index_path, 'a', encoding='utf-8') as f:
+                    f.write(f"{key} {row} {vector.shape[0]}\n")
+                self._refresh()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class EmbeddingCache:
+    """
+    Bounded LRU of sentence embeddings for one model, optionally backed by a DiskEmbeddingStore.
+
+    Keys are the SHA-1 of the model name and the whitespace-normalized text.
+    """
+
+    def __init__(self, model_name: str, max_entries: int = 10000, cache_dir: Optional[str] = None, max_disk_bytes: int = 0):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = None
+        if cache_dir:
+            self.disk = DiskEmbeddingStore(os.path.join(cache_dir, model_name.replace('/', '__')), max_disk_bytes)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = embedding_key(self.model_name, text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+        embedding = self.disk.get(key) if self.disk is not None else None
+        with self._lock:
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, embedding)
+        return embedding
+
+    def put(self, text: str, embedding: np.ndarray):
+        key = embedding_key(self.model_name, text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, embedding)
+        if self.disk is not None:
+            self.disk.put(key, embedding)
+
+    def _remember(self, key: str, embedding: np.ndarray):
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "disk_entries": len(self.disk) if self.disk is not None else 0,
+            "disk_full": self.disk.full if self.disk is not None else False,
+        }
+
+class CachedEncoder:
+    """
+    Drop-in wrapper around SentenceTransformer.encode that serves repeated sentences from an EmbeddingCache.
+
+    Only the cache misses are sent to the model, in one batched encode call;
+    that call is what the encode metrics of `source` count and time.
+    """
+
+    def __init__(self, model, cache: EmbeddingCache, source: str = "cached"):
+        self.model = model
+        self.cache = cache
+        self.source = source
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def encode(self, sentences, convert_to_tensor: bool = False, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts: List[str] = [sentences] if single else list(sentences)
+
+        embeddings = [self.cache.get(text) for text in texts]
+        missing = list(dict.fromkeys(normalize_text(text) for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            kwargs.pop('convert_to_numpy', None)
+            with observe_encode(self.source, len(missing)):
+                encoded = self.model.encode(missing, convert_to_numpy=True, **kwargs)
+            fresh = dict(zip(missing, encoded))
+            for text, embedding in fresh.items():
+                self.cache.put(text, embedding)
+            embeddings = [fresh[normalize_text(text)] if embedding is None else embedding for text, embedding in zip(texts, embeddings)]
+
+        result = np.vstack(embeddings).astype(np.float32) if embeddings else np.zeros((0, 0), dtype=np.float32)
+        if normalize_embeddings and len(result):
+            result = result / np.clip(np.linalg.norm(result, axis=1, keepdims=True), 1e-12, None)
+        if single:
+            result = result[0]
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(np.ascontiguousarray(result))
+        return result
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+def get_embedding_cache(model_name: str) -> EmbeddingCache:
+    """
+    Process-wide cache for a model, sized by EMBEDDING_CACHE_SIZE and persisted
+    under EMBEDDING_CACHE_DIR when that variable is set, up to
+    EMBEDDING_CACHE_DISK_MB megabytes per model (0 = no limit).
+    """
+    with _caches_lock:
+        if model_name not in _caches:
+            _caches[model_name] = EmbeddingCache(
+                model_name,
+                max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+                cache_dir=os.getenv("EMBEDDING_CACHE_DIR") or None,
+                max_disk_bytes=int(os.getenv("EMBEDDING_CACHE_DISK_MB", "1024")) * 1024 * 1024,
+            )
+        return _caches[model_name]
+
+def embedding_cache_stats() -> List[dict]:
+    with _caches_lock:
+        return [cache.stats() for cache in _caches.values()]
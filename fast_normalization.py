@@ -0,0 +1,112 @@
+import difflib
+import functools
+import os
+import pickle
+import re
+import string
+from typing import List
+
+# spaCy-free text_normalization_with_boundaries for bulk cleaning.
+#
+# The spaCy "boundaries" profile tokenizes, drops punctuation other than
+# . ? !, keeps the alphanumeric characters of every other token in lower case
+# and starts a new line after each run of . ? ! tokens. This module
+# reproduces that with a few regular expressions and a translation table: it
+# applies the English tokenizer rules that change the output (abbreviations,
+# contractions, infix hyphens and slashes, periods inside numbers and
+# acronyms) and nothing else. `token_agreement` measures how far the result
+# is from the spaCy path; see tests/test_fast_normalization.py.
+#
+#   "rules"  sentence breaks after . ? ! tokens, like spaCy's sentencizer
+#   "punkt"  sentence breaks from the vendored NLTK Punkt model
+
+ENGINES = ("rules", "punkt")
+PUNKT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data", "tokenizers", "punkt", "PY3")
+
+TERMINALS = ".?!"
+
+# Tokenizer exceptions of spaCy's English tokenizer that keep their final period
+ABBREVIATIONS = (
+    "Adm Ak Ala Apr Ariz Ark Aug Bros Calif Co Colo Conn Corp Dec Del Dr E.G E.g Feb Fla Ga Gen Gov I.E I.e "
+    "Ia Id Ill Inc Ind Jan Jr Jul Jun Kan Kans Ky La Ltd Mar Mass Md Messrs Mich Minn Miss Mo Mont Mr Mrs Ms "
+    "Mt Neb Nebr Nev Nov Oct Okla Ore Pa Ph.D Prof Rep Rev Sen Sep Sept St Tenn Va Wash Wis a.m co e.g i.e "
+    "p.m v.s vs"
+).split()
+
+_ABBREVIATION_SET = frozenset(ABBREVIATIONS)
+
+# Patterns start with the character they are about, so the regex engine can
+# skip ahead instead of trying a lookbehind at every position
+_URL = re.compile(r"(?:\b(?:https?://|www\.)|(?<!\S)[\w.+-]+@)\S+?(?=[.?!,;:)\]\"'”’]*(?:\s|$))")
+_ELLIPSIS = re.compile(r"\.{2,}|…")
+_CONTRACTION = re.compile(r"(?<=\S)(n['’]t|['’](?:s|m|d|ll|re|ve))(?![^\W_])", re.IGNORECASE)
+_FINAL_PERIOD = re.compile(r"\.(?![\w.])")
+_ACRONYM = re.compile(r"(?:[A-Z]\.)+|[a-z]\.")
+# Infixes the tokenizer splits on: hyphens and : < > = / before a letter,
+# commas between letters, arithmetic between digits
+_INFIX_SPLIT = re.compile(r"[-–—:<>=/](?<=[^\W_].)(?=[^\W\d_])|,(?<=[^\W\d_],)(?=[^\W\d_])|[-+*^](?<=\d.)(?=[\d-])")
+_INFIX_PERIOD = re.compile(r"\.(?<=[a-z].)(?=[A-Z])")
+# Any other punctuation inside a token ("3.50", "1,000", "a.b") disappears with it
+_INFIX_JOIN = re.compile(r"(?<=\w)[^\w\s]+(?=\w)")
+_TERMINAL = re.compile(r"[.?!]")
+_NON_ALNUM = re.compile(r"[^\w\s.?!]|_")
+_SENTENCE_BREAK = re.compile(r"(?<=[.?!]) (?=[^.?!])")
+
+_SPACED = "".join(char for char in string.punctuation if char not in TERMINALS + "_").encode()
+_ASCII_TABLE = bytes.maketrans(_SPACED, b" " * len(_SPACED))
+
+def _final_period(m) -> str:
+    # Abbreviations, single letters and upper-case acronyms (A. U.S. D.C.) keep
+    # their period as part of the token; any other final period is a token
+    text, end = m.string, m.start()
+    start = end
+    while start > 0 and (text[start - 1].isalpha() or text[start - 1] == "."):
+        start -= 1
+    if start == end or (start > 0 and (text[start - 1].isalnum() or text[start - 1] in "_'’")):
+        return "."
+    word = text[start:end]
+    return "" if word in _ABBREVIATION_SET or _ACRONYM.fullmatch(text, start, end + 1) else "."
+
+def _tokens(text: str) -> List[str]:
+    if "@" in text or "://" in text or "www." in text:
+        text = _URL.sub(lambda m: "".join(char for char in m.group(0) if char.isalnum()), text)
+    if ".." in text or "…" in text:
+        text = _ELLIPSIS.sub(" ", text)
+    if "'" in text or "’" in text:
+        text = _CONTRACTION.sub(r" \1", text)
+    text = _FINAL_PERIOD.sub(_final_period, text)
+    text = _INFIX_SPLIT.sub(" ", text)
+    text = _INFIX_PERIOD.sub(" . ", text)
+    text = _INFIX_JOIN.sub("", text)
+    text = _TERMINAL.sub(r" \g<0> ", text).lower()
+    if text.isascii():
+        text = text.encode("ascii").translate(_ASCII_TABLE, b"_").decode("ascii")
+    else:
+        text = _NON_ALNUM.sub(" ", text)
+    return text.split()
+
+def normalize_sentence_text(text: str) -> str:
+    """One line of normalized tokens, without sentence breaks."""
+    return " ".join(_tokens(text))
+
+@functools.lru_cache(maxsize=None)
+def get_punkt(language: str = "english"):
+    # nltk.data.load no longer unpickles models; these files are part of the repo
+    with open(os.path.join(PUNKT_DIR, f"{language}.pickle"), "rb") as f:
+        return pickle.load(f)
+
+def normalize_text(text: str, engine: str = "rules") -> str:
+    """text_normalization_with_boundaries without spaCy: one normalized sentence per line."""
+    if engine == "rules":
+        return _SENTENCE_BREAK.sub("\n", " ".join(_tokens(text)))
+    if engine == "punkt":
+        sentences = (normalize_sentence_text(sentence) for sentence in get_punkt().tokenize(text))
+        return "\n".join(sentence for sentence in sentences if sentence)
+    raise ValueError(f"Unknown normalization engine {engine!r}; expected 'spacy' or one of {ENGINES}")
+
+def token_agreement(expected: str, actual: str) -> float:
+    """Share of tokens two normalized texts have in common, in order (1.0 = identical tokens)."""
+    expected_tokens, actual_tokens = expected.split(), actual.split()
+    if not expected_tokens and not actual_tokens:
+        return 1.0
+    return difflib.SequenceMatcher(None, expected_tokens, actual_tokens, autojunk=False).ratio()
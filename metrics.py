@@ -0,0 +1,146 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess, start_http_server)
+
+# Prometheus metrics for the Flask / aiohttp apps and the RQ workers.
+#
+# Updating a metric is an in-process counter increment. Processes that fork
+# (gunicorn workers, RQ work horses) must share a PROMETHEUS_MULTIPROC_DIR so
+# their samples survive the process and are summed on scrape; clear that
+# directory when the service starts.
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Seconds; covers fast spaCy calls up to multi-minute LLM / chunking jobs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+MEMORY_BUCKETS = tuple(2**20 * mib for mib in (64, 128, 256, 512, 1024, 2048, 4096, 8192))
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route.",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+SPACY_PARSE_SECONDS = Histogram(
+    "spacy_parse_seconds", "Time spent running the spaCy pipeline, per call or per nlp.pipe batch.",
+    ["profile", "mode"], buckets=LATENCY_BUCKETS)
+PARSE_CACHE_LOOKUPS = Counter(
+    "parse_cache_lookups", "Parse cache lookups by result.", ["result"])
+NLP_BATCH_SIZE = Histogram(
+    "nlp_batch_size", "Texts per coalesced nlp.pipe batch.", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+EMBEDDING_ENCODE_SECONDS = Histogram(
+    "embedding_encode_seconds", "Time spent in encode calls.",
+    ["source"], buckets=LATENCY_BUCKETS)
+EMBEDDING_TEXTS = Counter(
+    "embedding_texts", "Texts sent to encode calls.", ["source"])
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_seconds", "LLM call latency, including instructor validation retries.",
+    ["response_model", "outcome"], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Counter(
+    "llm_tokens", "Tokens reported by the LLM API.", ["response_model", "kind"])
+HTTP_PUT_SECONDS = Histogram(
+    "http_put_seconds", "Duration of a single http_put attempt.",
+    ["status"], buckets=LATENCY_BUCKETS)
+HTTP_PUT_RETRIES = Counter(
+    "http_put_retries", "http_put attempts that failed and are retried.")
+QUEUE_DEPTH = Gauge(
+    "rq_queue_jobs", "Jobs in an RQ queue by state, sampled on scrape.",
+    ["queue", "state"], multiprocess_mode="livemax")
+JOB_SECONDS = Histogram(
+    "rq_job_seconds", "RQ job duration.", ["function", "status"], buckets=LATENCY_BUCKETS)
+JOB_MEMORY_BYTES = Histogram(
+    "rq_job_memory_bytes", "Work horse memory at the end of a job.", ["kind"], buckets=MEMORY_BUCKETS)
+
+@contextmanager
+def track_llm_call(res_model):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        LLM_CALL_SECONDS.labels(_model_label(res_model), outcome).observe(time.perf_counter() - started)
+
+def record_llm_usage(res_model, completion):
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return
+    label = _model_label(res_model)
+    LLM_TOKENS.labels(label, "prompt").inc(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels(label, "completion").inc(usage.completion_tokens or 0)
+
+def observe_encode(source: str, count: int):
+    """Context manager timing an encode call of `count` texts."""
+    EMBEDDING_TEXTS.labels(source).inc(count)
+    return EMBEDDING_ENCODE_SECONDS.labels(source).time()
+
+def update_queue_depth(queues):
+    for queue in queues:
+        QUEUE_DEPTH.labels(queue.name, "queued").set(queue.count)
+        QUEUE_DEPTH.labels(queue.name, "started").set(queue.started_job_registry.count)
+        QUEUE_DEPTH.labels(queue.name, "failed").set(queue.failed_job_registry.count)
+
+def _model_label(res_model) -> str:
+    return getattr(res_model, "__name__", str(res_model))
+
+def _route_label(rule) -> str:
+    # The route template, not the raw path, keeps label cardinality bounded
+    return rule if rule else "unmatched"
+
+def exposition():
+    """Return (body, content_type) for a /metrics response."""
+    if MULTIPROC_DIR:
+        collector_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collector_registry)
+        return generate_latest(collector_registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def instrument_flask(app):
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_latency(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # Streamed responses are timed up to the first byte
+            route = _route_label(request.url_rule.rule if request.url_rule else None)
+            REQUEST_LATENCY.labels(request.method, route, str(response.status_code)).observe(time.perf_counter() - started)
+        return response
+
+    return app
+
+def aiohttp_middleware():
+    from aiohttp import web
+
+    @web.middleware
+    async def observe_latency(request, handler):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            resource = request.match_info.route.resource
+            route = _route_label(resource.canonical if resource is not None else None)
+            REQUEST_LATENCY.labels(request.method, route, str(status)).observe(time.perf_counter() - started)
+
+    return observe_latency
+
+def start_metrics_server():
+    """Serve /metrics on WORKER_METRICS_PORT (for RQ workers); no-op when unset."""
+    port = os.getenv("WORKER_METRICS_PORT")
+    if not port:
+        return None
+    if MULTIPROC_DIR:
+        collector_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collector_registry)
+        return start_http_server(int(port), registry=collector_registry)
+    return start_http_server(int(port))
@@ -0,0 +1,183 @@
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """
+    Process-wide registry of lazily loaded, shared models.
+
+    Models are registered by name with a zero-argument loader and are only
+    loaded the first time they are asked for, once per process. Names with a
+    known prefix ("spacy:<package>", "sentence-transformer:<model>") do not need
+    an explicit registration. Import and load times are recorded for the
+    startup report.
+
+    `get` hands out a model for the lifetime of the process (module-level
+    users). Objects that own a model for their own lifetime use `acquire` /
+    `release`; a model that was only ever acquired can be dropped by
+    `unload_unused` once its reference count is back to zero. Loading is
+    serialized per model.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._refs: Dict[str, int] = {}
+        self._pinned = set()
+        self._memory_bytes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._import_seconds: Dict[str, float] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._local = threading.local()
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        # The first registration wins so modules can register shared names independently
+        with self._lock:
+            if name not in self._loaders:
+                self._loaders[name] = loader
+                self._locks[name] = threading.Lock()
+                self._refs[name] = 0
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get(self, name: str) -> Any:
+        model = self._load(name)
+        with self._lock:
+            self._pinned.add(name)
+        return model
+
+    def acquire(self, name: str) -> Any:
+        model = self._load(name)
+        with self._lock:
+            self._refs[name] += 1
+        return model
+
+    def acquire_for(self, owner: Any, name: str) -> Any:
+        """Acquire the model for as long as `owner` is alive."""
+        model = self.acquire(name)
+        weakref.finalize(owner, self.release, name)
+        return model
+
+    def release(self, name: str):
+        with self._lock:
+            if self._refs.get(name, 0) > 0:
+                self._refs[name] -= 1
+
+    def refs(self, name: str) -> int:
+        return self._refs.get(name, 0)
+
+    def unload_unused(self) -> List[str]:
+        """Drop models that are not pinned by `get` and have no references left."""
+        unloaded = []
+        with self._lock:
+            for name in list(self._models):
+                if name not in self._pinned and self._refs.get(name, 0) == 0:
+                    del self._models[name]
+                    self._memory_bytes.pop(name, None)
+                    unloaded.append(name)
+        for name in unloaded:
+            logger.info(f"Unloaded model {name}")
+        return unloaded
+
+    def _load(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            self.register(name, default_loader(name))
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            outer_import_seconds = getattr(self._local, 'import_seconds', 0.0)
+            self._local.import_seconds = 0.0
+            rss_before = _rss_bytes()
+            started = time.perf_counter()
+            try:
+                model = self._loaders[name]()
+            finally:
+                elapsed = time.perf_counter() - started
+                import_seconds = self._local.import_seconds
+                self._local.import_seconds = outer_import_seconds + import_seconds
+            # Imports triggered by the loader are reported separately
+            self._load_seconds[name] = elapsed - import_seconds
+            # RSS growth while loading; approximate when other models load concurrently
+            self._memory_bytes[name] = max(0, _rss_bytes() - rss_before)
+            logger.info(f"Loaded model {name} in {elapsed:.2f}s (+{self._memory_bytes[name] / 2**20:.0f} MiB)")
+            self._models[name] = model
+            return model
+
+    def import_module(self, module_name: str):
+        """Import a (heavy) dependency and record how long the first import took."""
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        elapsed = time.perf_counter() - started
+        self.record_import(module_name, elapsed)
+        self._local.import_seconds = getattr(self._local, 'import_seconds', 0.0) + elapsed
+        return module
+
+    def record_import(self, module_name: str, seconds: float):
+        self._import_seconds[module_name] = self._import_seconds.get(module_name, 0.0) + seconds
+
+    def warmup(self, names: Optional[List[str]] = None) -> List[str]:
+        """
+        Load the given models now. Defaults to the comma separated MODEL_WARMUP
+        variable; "*" loads every registered model.
+        """
+        if names is None:
+            names = [name.strip() for name in os.getenv("MODEL_WARMUP", "").split(",") if name.strip()]
+        if "*" in names:
+            names = list(self._loaders)
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Warmup of model {name} failed: {str(e)}")
+        return names
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "imports": dict(self._import_seconds),
+            "models": {
+                name: {
+                    "loaded": name in self._models,
+                    "load_seconds": self._load_seconds.get(name),
+                    "refs": self._refs.get(name, 0),
+                    "memory_bytes": self._memory_bytes.get(name),
+                }
+                for name in self._loaders
+            },
+            "total_import_seconds": sum(self._import_seconds.values()),
+            "total_load_seconds": sum(self._load_seconds.values()),
+            "total_model_memory_bytes": sum(self._memory_bytes.values()),
+            "rss_bytes": _rss_bytes(),
+        }
+
+def _rss_bytes() -> int:
+    return psutil.Process().memory_info().rss
+
+def default_loader(name: str) -> Callable[[], Any]:
+    kind, _, model_name = name.partition(":")
+    if kind == "spacy":
+        return lambda: registry.import_module("spacy").load(model_name)
+    if kind == "sentence-transformer":
+        # Torch, int8 or ONNX Runtime inference, as configured by EMBEDDING_BACKEND
+        return lambda: registry.import_module("embedding.backends").load_backend(model_name)
+    raise KeyError(f"No loader registered for model: {name}")
+
+registry = ModelRegistry()
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+
+from columnar_tags import TagColumns
+from metrics import NLP_BATCH_SIZE, SPACY_PARSE_SECONDS
+from pre_text_normalization import (MAX_TEXT_LENGTH, NORMALIZATION_ENGINE, lemmatize_doc, normalize_doc, parse_many,
+                                    safe_text_processing, tag_doc, text_normalization_with_boundaries,
+                                    text_remove_stop_words_lemmatized, truncate_for_nlp)
+
+logger = logging.getLogger(__name__)
+
+NLP_BATCH_MAX_SIZE = int(os.getenv("NLP_BATCH_MAX_SIZE", "32"))
+NLP_BATCH_MAX_WAIT_MS = float(os.getenv("NLP_BATCH_MAX_WAIT_MS", "5"))
+# Texts waiting for the NLP thread; submitters wait (up to the timeout) when it is full
+NLP_QUEUE_MAX_SIZE = int(os.getenv("NLP_QUEUE_MAX_SIZE", "256"))
+NLP_SUBMIT_TIMEOUT = float(os.getenv("NLP_SUBMIT_TIMEOUT", "30"))
+# Longest wait for a queued text's Doc, so callers do not hang if the NLP thread stalls
+NLP_PARSE_TIMEOUT = float(os.getenv("NLP_PARSE_TIMEOUT", "60"))
+
+class NLPBatcher:
+    """
+    Coalesces concurrent spaCy calls into `nlp.pipe` batches.
+
+    Request threads submit texts and wait on a future. A single NLP thread
+    takes the first waiting text, keeps collecting for up to max_wait_ms or
+    until max_batch_size texts are waiting, parses them in one `nlp.pipe`
+    call and hands each Doc back to its caller. A lone request pays at most
+    max_wait_ms of extra latency.
+
+    The queue is bounded by max_queue_size. When the NLP thread falls that
+    far behind, `submit` blocks and `submit_async` backs off until there is
+    room, and both raise queue.Full after submit_timeout seconds, so load
+    beyond what one spaCy thread can parse is pushed back onto the callers
+    instead of piling up in memory. `parse` and `submit_async` also raise
+    queue.Full when a queued text has no Doc after parse_timeout seconds.
+    The HTTP handlers answer queue.Full with 503.
+    """
+
+    def __init__(self, profile: str = "full", max_batch_size: int = NLP_BATCH_MAX_SIZE,
+                 max_wait_ms: float = NLP_BATCH_MAX_WAIT_MS, name: Optional[str] = None,
+                 max_queue_size: int = NLP_QUEUE_MAX_SIZE, submit_timeout: float = NLP_SUBMIT_TIMEOUT,
+                 parse_timeout: float = NLP_PARSE_TIMEOUT):
+        self.profile = profile
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name or f"nlp-batcher-{profile}"
+        self.submit_timeout = submit_timeout
+        self.parse_timeout = parse_timeout
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue(maxsize=max(0, max_queue_size))
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for parsing; the future resolves to its Doc. Blocks while the queue is full."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future), timeout=self.submit_timeout)
+        return future
+
+    def parse(self, text: str, timeout: Optional[float] = None):
+        timeout = self.parse_timeout if timeout is None else timeout
+        future = self.submit(text)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise queue.Full(f"{self.name}: no parse within {timeout}s") from None
+
+    async def submit_async(self, text: str):
+        """Parse on the NLP thread without blocking the event loop; returns the Doc."""
+        self._ensure_started()
+        future = Future()
+        deadline = time.monotonic() + self.submit_timeout
+        delay = 0.001
+        while True:
+            try:
+                self._queue.put_nowait((text, future))
+                break
+            except queue.Full:
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.parse_timeout)
+        except asyncio.TimeoutError:
+            raise queue.Full(f"{self.name}: no parse within {self.parse_timeout}s") from None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [(text, future) for text, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            NLP_BATCH_SIZE.observe(len(batch))
+            try:
+                texts = [text for text, _ in batch]
+                with SPACY_PARSE_SECONDS.labels(self.profile, "batch").time():
+                    docs = list(parse_many(texts, self.profile, batch_size=len(texts)))
+            except Exception as e:
+                logger.error(f"Error in {self.name}: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), doc in zip(batch, docs):
+                future.set_result(doc)
+
+_batchers: Dict[str, NLPBatcher] = {}
+_batchers_lock = threading.Lock()
+
+def get_batcher(profile: str = "full") -> NLPBatcher:
+    """The process-wide batcher (and NLP thread) of a pipeline profile."""
+    batcher = _batchers.get(profile)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.setdefault(profile, NLPBatcher(profile))
+    return batcher
+
+@safe_text_processing
+def text_normalization_with_boundaries_batched(text: str, engine: Optional[str] = None) -> str:
+    """text_normalization_with_boundaries, parsed together with concurrent requests."""
+    if (engine or NORMALIZATION_ENGINE) != "spacy" or len(text) > MAX_TEXT_LENGTH:
+        # No parse to batch, or streamed paragraph by paragraph instead
+        return text_normalization_with_boundaries(text, engine)
+    return normalize_doc(get_batcher("boundaries").parse(text))
+
+@safe_text_processing
+def text_remove_stop_words_lemmatized_batched(text: str) -> str:
+    """text_remove_stop_words_lemmatized, parsed together with concurrent requests."""
+    if len(text) > MAX_TEXT_LENGTH:
+        return text_remove_stop_words_lemmatized(text)
+    return lemmatize_doc(get_batcher("lemmatize").parse(text))
+
+async def ner_and_pos_tagging_async(text: str) -> TagColumns:
+    """ner_and_pos_tagging, parsed on the shared NLP thread together with concurrent calls."""
+    if not isinstance(text, str):
+        text = str(text)
+    if not text.strip():
+        return TagColumns.empty(text)
+    doc = await get_batcher("full").submit_async(truncate_for_nlp(text, "ner_and_pos_tagging"))
+    return tag_doc(doc)
+
+async def _parse_and_render_async(profile: str, render, sync_func, text: str) -> str:
+    # Empty, non-string and very long inputs keep the synchronous path (and its fallbacks)
+    if not isinstance(text, str) or not text.strip() or len(text) > MAX_TEXT_LENGTH:
+        return await asyncio.to_thread(sync_func, text)
+    try:
+        return render(await get_batcher(profile).submit_async(text))
+    except queue.Full:
+        raise
+    except Exception as e:
+        logger.error(f"Error in {sync_func.__name__}: {str(e)}")
+        return text
+
+async def text_normalization_with_boundaries_async(text: str, engine: Optional[str] = None) -> str:
+    if (engine or NORMALIZATION_ENGINE) != "spacy":
+        return await asyncio.to_thread(text_normalization_with_boundaries, text, engine)
+    return await _parse_and_render_async("boundaries", normalize_doc, text_normalization_with_boundaries_batched, text)
+
+async def text_remove_stop_words_lemmatized_async(text: str) -> str:
+    return await _parse_and_render_async("lemmatize", lemmatize_doc, text_remove_stop_words_lemmatized_batched, text)
@@ -0,0 +1,188 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from metrics import PARSE_CACHE_LOOKUPS
+from model_registry import registry
+
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "2000"))
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR") or None
+PARSE_CACHE_DISK_ENTRIES = int(os.getenv("PARSE_CACHE_DISK_ENTRIES", "200000"))
+# Tokenizer-only profiles are about as fast to parse as to deserialize
+PARSE_CACHE_PROFILES = [name.strip() for name in os.getenv("PARSE_CACHE_PROFILES", "full,lemmatize").split(",") if name.strip()]
+
+def parse_key(pipeline_id: str, text: str) -> str:
+    # Exact text: whitespace changes tokens and character offsets
+    return hashlib.sha1(f"{pipeline_id}\0{text}".encode('utf-8')).hexdigest()
+
+class DiskParseStore:
+    """
+    One serialized DocBin file per parse, shared by every process on the host.
+
+    Files are sharded by the first two hex digits of the key and written to
+    a temporary file first, then renamed, so readers never see a partial
+    entry. A hit refreshes the file's mtime, and a shard holding more than its
+    share of `max_entries` (0 = no limit) drops its least recently used files
+    on the next write. Entries of other pipelines are keyed apart and age out
+    the same way; clear the directory to reclaim space at once.
+    """
+
+    SHARDS = 256
+
+    def __init__(self, path: str, max_entries: int = PARSE_CACHE_DISK_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(path, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key[2:] + '.spacy')
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # Evicted by another process meanwhile
+        return data
+
+    def __len__(self):
+        return sum(len(self._entries(os.path.join(self.path, shard))) for shard in os.listdir(self.path)
+                   if os.path.isdir(os.path.join(self.path, shard)))
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if self.max_entries > 0:
+            self._evict(os.path.dirname(path))
+
+    def _entries(self, shard: str) -> List[str]:
+        return [os.path.join(shard, name) for name in os.listdir(shard) if name.endswith('.spacy')]
+
+    def _evict(self, shard: str):
+        # Keys are uniform over the shards, so each keeps its share of max_entries
+        limit = -(-self.max_entries // self.SHARDS)
+        paths = self._entries(shard)
+        if len(paths) <= limit:
+            return
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                pass
+        for path in sorted(mtimes, key=mtimes.get)[:len(mtimes) - limit]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+class ParseCache:
+    """
+    Bounded LRU of serialized spaCy parses, optionally backed by a DiskParseStore.
+
+    Entries are DocBin bytes rather than Doc objects: they are several times
+    smaller, hold no reference to the pipeline and are what the disk tier
+    stores anyway. A hit deserializes against the pipeline's vocab, which is
+    much cheaper than running the tagger, parser and NER again.
+    """
+
+    def __init__(self, max_entries: int = PARSE_CACHE_SIZE, cache_dir: Optional[str] = None,
+                 max_disk_entries: int = PARSE_CACHE_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = DiskParseStore(cache_dir, max_disk_entries) if cache_dir else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.disk is not None
+
+    def get(self, key: str, vocab) -> Optional[Any]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+        if data is None and self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                with self._lock:
+                    self._remember(key, data)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                PARSE_CACHE_LOOKUPS.labels("miss").inc()
+                return None
+            self.hits += 1
+        PARSE_CACHE_LOOKUPS.labels("hit").inc()
+        return _from_bytes(data, vocab)
+
+    def put(self, key: str, doc):
+        data = _to_bytes(doc)
+        with self._lock:
+            self._remember(key, data)
+        if self.disk is not None:
+            self.disk.put(key, data)
+
+    def _remember(self, key: str, data: bytes):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": sum(len(data) for data in self._entries.values()),
+            "disk": self.disk.path if self.disk is not None else None,
+        }
+
+def _to_bytes(doc) -> bytes:
+    doc_bin = registry.import_module("spacy.tokens").DocBin(docs=[doc])
+    return doc_bin.to_bytes()
+
+def _from_bytes(data: bytes, vocab):
+    doc_bin = registry.import_module("spacy.tokens").DocBin().from_bytes(data)
+    return next(iter(doc_bin.get_docs(vocab)))
+
+_cache: Optional[ParseCache] = None
+_cache_lock = threading.Lock()
+
+def get_parse_cache() -> ParseCache:
+    """
+    Process-wide parse cache, sized by PARSE_CACHE_SIZE (0 disables the memory
+    tier) and persisted under PARSE_CACHE_DIR when that variable is set, up to
+    about PARSE_CACHE_DISK_ENTRIES files (0 = no limit).
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ParseCache(PARSE_CACHE_SIZE, PARSE_CACHE_DIR)
+        return _cache
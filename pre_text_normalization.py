@@ -1,22 +1,224 @@
-import asyncio
-import spacy
-from transformers import AutoModel, AutoTokenizer
+import bisect
+import itertools
 import logging
-from typing import List, Optional, Dict, Any
+import os
+import queue
+import re
+from typing import Iterable, Iterator, List, Optional, Dict, Any, Tuple, Union
+from model_registry import registry
+from metrics import SPACY_PARSE_SECONDS
+from columnar_tags import TagColumns
+from parse_cache import PARSE_CACHE_PROFILES, get_parse_cache, parse_key
+import fast_normalization
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Load models and tokenizer
-try:
-    tokenizer = AutoTokenizer.from_pretrained("bert-base-uncased", clean_up_tokenization_spaces=True)
-    model = AutoModel.from_pretrained("bert-base-uncased")
-    nlp = spacy.load("en_core_web_sm")
-except Exception as e:
-    logger.error(f"Error loading models: {str(e)}")
-    # Fallback to a simple tokenizer if spaCy fails to load
-    nlp = lambda text: type('obj', (object,), {'sents': [text], 'doc': [type('token', (object,), {'text': word, 'is_punct': False, 'is_stop': False, 'lemma_': word.lower()}) for word in text.split()]})()
+SPACY_MODEL = "spacy:en_core_web_sm"
+# Longer inputs are streamed paragraph by paragraph where the output allows it
+# and truncated (with a warning) where it does not.
+MAX_TEXT_LENGTH = 1000000
+STREAM_PARAGRAPH_CHARS = 100000
+STREAM_BATCH_SIZE = 64
+PARAGRAPH_BREAK = re.compile(r'\n[ \t\r\f\v]*\n')
+LAST_WHITESPACE = re.compile(r'.*\s', re.DOTALL)
+# text_normalization_with_boundaries engine when the caller does not pick one:
+# "spacy", or "rules" / "punkt" from fast_normalization
+NORMALIZATION_ENGINE = os.getenv("NORMALIZATION_ENGINE", "spacy")
+NORMALIZATION_ENGINES = ("spacy",) + fast_normalization.ENGINES
+
+def _load_spacy():
+    try:
+        return registry.import_module("spacy").load("en_core_web_sm")
+    except Exception as e:
+        logger.error(f"Error loading models: {str(e)}")
+        # Fallback to a simple tokenizer if spaCy fails to load
+        return lambda text: type('obj', (object,), {'sents': [text], 'doc': [type('token', (object,), {'text': word, 'is_punct': False, 'is_stop': False, 'lemma_': word.lower()}) for word in text.split()]})()
+
+SPACY_BOUNDARIES_MODEL = "spacy:blank-en+sentencizer"
+
+def _load_boundaries():
+    # Same English tokenizer as en_core_web_sm, punctuation-based sentence splitting
+    nlp = registry.import_module("spacy").blank("en")
+    nlp.add_pipe("sentencizer")
+    return nlp
+
+registry.register(SPACY_MODEL, _load_spacy)
+registry.register(SPACY_BOUNDARIES_MODEL, _load_boundaries)
+
+# Pipeline profile -> (registry model, components disabled for the call).
+# Profiles sharing a model share one loaded copy; disabling is per call.
+PIPELINE_PROFILES = {
+    # Everything: entities, POS tags and dependency labels
+    "full": (SPACY_MODEL, []),
+    # Lemmas, stop words and parser sentence boundaries; entities are not needed
+    "lemmatize": (SPACY_MODEL, ["ner"]),
+    # Tokens and sentence boundaries only; a sentencizer instead of the parser
+    "boundaries": (SPACY_BOUNDARIES_MODEL, []),
+}
+
+def get_nlp(profile: str = "full"):
+    # spaCy is loaded on first use, not at import
+    return registry.get(PIPELINE_PROFILES[profile][0])
+
+def _pipeline_id(nlp, profile: str) -> Optional[str]:
+    """Identifies the parses a profile produces; None when they are not cacheable."""
+    if profile not in PARSE_CACHE_PROFILES or not get_parse_cache().enabled or not hasattr(nlp, 'pipe_names'):
+        return None
+    _, disable = PIPELINE_PROFILES[profile]
+    meta = nlp.meta
+    components = ','.join(name for name in nlp.pipe_names if name not in disable)
+    spacy_version = registry.import_module("spacy").__version__
+    return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}:{components}:spacy-{spacy_version}"
+
+def parse(text: str, profile: str = "full"):
+    """Run the text through the components of the given pipeline profile, or take it from the parse cache."""
+    _, disable = PIPELINE_PROFILES[profile]
+    nlp = get_nlp(profile)
+    pipeline_id = _pipeline_id(nlp, profile)
+    if pipeline_id is not None:
+        key = parse_key(pipeline_id, text)
+        doc = get_parse_cache().get(key, nlp.vocab)
+        if doc is not None:
+            return doc
+    with SPACY_PARSE_SECONDS.labels(profile, "single").time():
+        # The fallback tokenizer takes no options
+        doc = nlp(text, disable=disable) if disable and hasattr(nlp, 'pipe_names') else nlp(text)
+    if pipeline_id is not None:
+        get_parse_cache().put(key, doc)
+    return doc
+
+def parse_many(texts: Iterable[Any], profile: str = "full", batch_size: int = 32, as_tuples: bool = False,
+               n_process: int = 1) -> Iterator[Any]:
+    """nlp.pipe over the texts with the given pipeline profile."""
+    _, disable = PIPELINE_PROFILES[profile]
+    nlp = get_nlp(profile)
+    if not hasattr(nlp, 'pipe'):
+        if as_tuples:
+            return ((nlp(text), context) for text, context in texts)
+        return (nlp(text) for text in texts)
+    pipeline_id = _pipeline_id(nlp, profile)
+    if pipeline_id is not None and n_process == 1:
+        return _cached_pipe(nlp, texts, pipeline_id, disable, batch_size, as_tuples)
+    return nlp.pipe(texts, batch_size=batch_size, disable=disable, as_tuples=as_tuples, n_process=n_process)
+
+def _cached_pipe(nlp, items: Iterable[Any], pipeline_id: str, disable: List[str], batch_size: int, as_tuples: bool) -> Iterator[Any]:
+    # Look each batch up in the parse cache and only pipe the misses
+    cache = get_parse_cache()
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, batch_size))
+        if not batch:
+            return
+        texts = [item[0] for item in batch] if as_tuples else batch
+        keys = [parse_key(pipeline_id, text) for text in texts]
+        docs = [cache.get(key, nlp.vocab) for key in keys]
+        missing = [i for i, doc in enumerate(docs) if doc is None]
+        for i, doc in zip(missing, nlp.pipe([texts[i] for i in missing], batch_size=batch_size, disable=disable)):
+            cache.put(keys[i], doc)
+            docs[i] = doc
+        for item, doc in zip(batch, docs):
+            yield (doc, item[1]) if as_tuples else doc
+
+def truncate_for_nlp(text: str, func_name: str) -> str:
+    """text cut to MAX_TEXT_LENGTH characters, with a warning naming func_name when it was longer."""
+    if len(text) > MAX_TEXT_LENGTH:
+        logger.warning(f"{func_name}: input of {len(text)} characters truncated to {MAX_TEXT_LENGTH}")
+    return text[:MAX_TEXT_LENGTH]
+
+def iter_paragraphs(source: Union[str, Iterable[str]], max_chars: int = STREAM_PARAGRAPH_CHARS) -> Iterator[Tuple[str, int]]:
+    """
+    Split text into (paragraph, start offset) pairs at blank lines.
+
+    `source` is a string or an iterable of string pieces, such as an open
+    text file, which is read incrementally. Paragraphs longer than max_chars
+    are cut after the last whitespace before the limit. Whitespace-only
+    paragraphs are skipped.
+    """
+    pieces = [source] if isinstance(source, str) else source
+    buffer = ""
+    base = 0  # offset of buffer[0] in the whole text
+    position = 0  # start of the pending paragraph in buffer
+    for piece in pieces:
+        buffer = buffer[position:] + piece
+        base += position
+        position = 0
+        while True:
+            match = PARAGRAPH_BREAK.search(buffer, position, position + max_chars + 1)
+            if match is not None:
+                end, next_position = match.start(), match.end()
+            elif len(buffer) - position > max_chars:
+                cut = position + max_chars
+                # After the last whitespace before the limit, so words are not cut
+                split = LAST_WHITESPACE.match(buffer, position, cut)
+                end = next_position = split.end() if split is not None else cut
+            else:
+                break
+            if buffer[position:end].strip():
+                yield buffer[position:end], base + position
+            position = next_position
+    if buffer[position:].strip():
+        yield buffer[position:], base + position
+
+def iter_sentences(source: Union[str, Iterable[str]], profile: str = "boundaries", max_paragraph_chars: int = STREAM_PARAGRAPH_CHARS,
+                   batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Tuple[Any, int]]:
+    """
+    Parse text of any length paragraph by paragraph with nlp.pipe.
+
+    Yields (sentence span, paragraph offset) pairs; the sentence starts at
+    offset + span.start_char in the original text. At most batch_size
+    paragraphs are parsed and held at a time, so memory does not grow with
+    the input.
+    """
+    docs = parse_many(iter_paragraphs(source, max_paragraph_chars), profile, batch_size=batch_size, as_tuples=True)
+    for doc, offset in docs:
+        for sent in doc.sents:
+            yield sent, offset
+
+def iter_normalized_sentences(source: Union[str, Iterable[str]], max_paragraph_chars: int = STREAM_PARAGRAPH_CHARS,
+                              batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming text_normalization_with_boundaries.
+
+    Yields the same lines as normalizing the whole text at once: a sentence
+    that runs over a paragraph break (the paragraph does not end in sentence
+    punctuation) is one line, and sentences that normalize to nothing are
+    empty lines.
+
+    Yields:
+        dict: {"text": normalized sentence, "start_char", "end_char"} with
+              offsets into the original text.
+    """
+    punct_chars = get_nlp("boundaries").get_pipe("sentencizer").punct_chars
+    read = {"length": 0, "tail": ""}
+
+    def pieces():
+        for piece in ([source] if isinstance(source, str) else source):
+            read["length"] += len(piece)
+            read["tail"] = (read["tail"] + piece)[-1:]
+            yield piece
+
+    pending = None
+    for sent, offset in iter_sentences(pieces(), "boundaries", max_paragraph_chars, batch_size):
+        sentence = {"text": normalize_sentence(sent), "start_char": offset + sent.start_char, "end_char": offset + sent.end_char}
+        if pending is not None and sent.start == 0 and not pending_ended:
+            # Paragraphs are parsed separately; the whole-text parse continues this sentence
+            pending["text"] = ' '.join(text for text in (pending["text"], sentence["text"]) if text)
+            pending["end_char"] = sentence["end_char"]
+        else:
+            if pending is not None:
+                yield pending
+            pending = sentence
+        # The sentencizer starts a new sentence after any of its punctuation characters
+        pending_ended = any(token.text in punct_chars for token in sent)
+    if pending is None:
+        return
+    yield pending
+    trailing = read["length"] - pending["end_char"]
+    if pending_ended and trailing and not (trailing == 1 and read["tail"] == " "):
+        # Whitespace after the last sentence is a token of its own (a lone space is not), an empty sentence
+        yield {"text": "", "start_char": pending["end_char"], "end_char": read["length"]}
 
 def safe_text_processing(func):
     def wrapper(text: str, *args, **kwargs) -> str:
@@ -34,86 +236,265 @@ def safe_text_processing(func):
         
         try:
             return func(text, *args, **kwargs)
+        except queue.Full:
+            raise  # NLP queue backpressure (nlp_batching); the caller answers 503
         except Exception as e:
             logger.error(f"Error in {func.__name__}: {str(e)}")
             return text  # Return original text if processing fails
     return wrapper
 
 @safe_text_processing
-def text_normalization_with_boundaries(text: str) -> str:
-    doc = nlp(text[:1000000])  # Limit input size to prevent memory issues
-    normalized_sents: List[str] = []
-    
-    for sent in doc.sents:
-        normalized_tokens: List[str] = []
-        for token in sent:
-            if token.is_punct:
-                if token.text in ['.', '?', '!']:
-                    normalized_tokens.append(token.text)
-            else:
-                normalized_token = ''.join(char.lower() for char in token.text if char.isalnum())
-                if normalized_token:
-                    normalized_tokens.append(normalized_token)
-        normalized_sents.append(' '.join(normalized_tokens))
-    
-    return '\n'.join(normalized_sents)
+def text_normalization_with_boundaries(text: str, engine: Optional[str] = None) -> str:
+    engine = engine or NORMALIZATION_ENGINE
+    if engine != "spacy":
+        return fast_normalization.normalize_text(text, engine)
+    if len(text) > MAX_TEXT_LENGTH:
+        return '\n'.join(sentence["text"] for sentence in iter_normalized_sentences(text))
+    return normalize_doc(parse(text, "boundaries"))
+
+def sentences(doc):
+    # Span.sents yields whole sentences; clip them to the span for chunk views
+    if not hasattr(doc, 'start'):
+        return doc.sents
+    return [doc.doc[max(sent.start, doc.start):min(sent.end, doc.end)] for sent in doc.sents]
+
+def normalize_doc(doc) -> str:
+    return '\n'.join(normalize_sentence(sent) for sent in sentences(doc))
+
+def normalize_sentence(sent) -> str:
+    normalized_tokens: List[str] = []
+    for token in sent:
+        if token.is_punct:
+            if token.text in ['.', '?', '!']:
+                normalized_tokens.append(token.text)
+        else:
+            normalized_token = ''.join(char.lower() for char in token.text if char.isalnum())
+            if normalized_token:
+                normalized_tokens.append(normalized_token)
+    return ' '.join(normalized_tokens)
 
 @safe_text_processing
 def text_remove_stop_words_lemmatized(text: str) -> str:
-    doc = nlp(text[:1000000])  # Limit input size to prevent memory issues
-    cleaned_sents: List[str] = []
-    
-    for sent in doc.sents:
-        cleaned_tokens = [token.lemma_ if not token.is_punct else token.text
-                          for token in sent
-                          if not token.is_stop or token.text in ['.', '?', '!']]
-        cleaned_sents.append(' '.join(cleaned_tokens))
-    
-    return '\n'.join(cleaned_sents)
+    if len(text) > MAX_TEXT_LENGTH:
+        return '\n'.join(lemmatize_sentence(sent) for sent, _ in iter_sentences(text, "lemmatize"))
+    return lemmatize_doc(parse(text, "lemmatize"))
 
-@safe_text_processing
-async def ner_and_pos_tagging_async(text: str) -> Dict[str, Any]:
-    # Use asyncio.to_thread to run the NLP processing in a separate thread
-    return await asyncio.to_thread(ner_and_pos_tagging, text)
+def lemmatize_doc(doc) -> str:
+    return '\n'.join(lemmatize_sentence(sent) for sent in sentences(doc))
+
+def lemmatize_sentence(sent) -> str:
+    return ' '.join(token.lemma_ if not token.is_punct else token.text
+                    for token in sent
+                    if not token.is_stop or token.text in ['.', '?', '!'])
+
+# The async version (nlp_batching.ner_and_pos_tagging_async) parses on the shared NLP thread
+def ner_and_pos_tagging(text: str) -> TagColumns:
+    # Entity offsets refer to one Doc, so very long inputs are truncated here
+    doc = parse(truncate_for_nlp(text, "ner_and_pos_tagging"), "full")
+    return tag_doc(doc)
+
+def tag_doc(doc) -> TagColumns:
+    """NER and POS of a Doc or Span; .to_dict() gives the legacy {"ner": [...], "pos": [...]} format."""
+    return TagColumns.from_doc(doc)
+
+class DocumentAnalysis:
+    """
+    Everything the RAG pipeline needs from a text, taken from a single parse.
+
+    `normalized`, `cleaned` and `ner_and_pos` are computed on first access
+    from the same Doc. `cleaned` reproduces
+    text_remove_stop_words_lemmatized(text_normalization_with_boundaries(text))
+    token by token instead of parsing the normalized text again, so lemmas
+    and stop words come from the cased original and can differ slightly
+    from the two-parse output.
+
+    `view(chunk_text)` returns the analysis of a chunk that occurs in the
+    original or the cleaned text as a slice of this parse.
+
+    Like the safe_text_processing functions it replaces, every output falls
+    back to the input text when spaCy fails (doc is None or the fallback
+    tokenizer's result).
+    """
+
+    def __init__(self, doc, text: Optional[str] = None):
+        self.doc = doc
+        self.text = doc.text if text is None else text
+        self._normalized: Optional[str] = None
+        self._cleaned: Optional[str] = None
+        self._cleaned_starts: List[int] = []
+        self._cleaned_ends: List[int] = []
+        self._cleaned_tokens: List[int] = []
+        self._ner_and_pos: Optional[TagColumns] = None
+
+    @property
+    def normalized(self) -> str:
+        if self._normalized is None:
+            try:
+                self._normalized = normalize_doc(self.doc)
+            except Exception as e:
+                logger.error(f"Error in normalized: {str(e)}")
+                self._normalized = self.text
+        return self._normalized
+
+    @property
+    def cleaned(self) -> str:
+        if self._cleaned is None:
+            try:
+                self._build_cleaned()
+            except Exception as e:
+                logger.error(f"Error in cleaned: {str(e)}")
+                self._cleaned = self.text
+        return self._cleaned
+
+    @property
+    def lemmatized(self) -> str:
+        """text_remove_stop_words_lemmatized of the original text."""
+        try:
+            return lemmatize_doc(self.doc)
+        except Exception as e:
+            logger.error(f"Error in lemmatized: {str(e)}")
+            return self.text
+
+    @property
+    def ner_and_pos(self) -> TagColumns:
+        """NER and POS as compact arrays; see TagColumns."""
+        if self._ner_and_pos is None:
+            try:
+                self._ner_and_pos = tag_doc(self.doc)
+            except Exception as e:
+                logger.error(f"Error in ner_and_pos: {str(e)}")
+                self._ner_and_pos = TagColumns.empty(self.text)
+        return self._ner_and_pos
+
+    @property
+    def ner(self) -> List[Dict[str, Any]]:
+        return self.ner_and_pos.entities()
+
+    @property
+    def pos(self) -> List[Dict[str, Any]]:
+        return self.ner_and_pos.to_dict()["pos"]
+
+    def _build_cleaned(self):
+        vocab = self.doc.vocab
+        lines: List[str] = []
+        length = 0
+        starts: List[int] = []
+        ends: List[int] = []
+        token_ids: List[int] = []
+        for sent in sentences(self.doc):
+            words: List[str] = []
+            line_start = length + (1 if lines else 0)  # after the joining newline
+            position = line_start
+            for token in sent:
+                if token.is_punct:
+                    # Normalization keeps only sentence-final punctuation
+                    if token.text not in ['.', '?', '!']:
+                        continue
+                    word = token.text
+                else:
+                    normalized = ''.join(char.lower() for char in token.text if char.isalnum())
+                    # Stop words are checked on the normalized form, like the second parse did
+                    if not normalized or vocab[normalized].is_stop:
+                        continue
+                    lemma = token.lemma_.lower()
+                    word = lemma if normalized == token.lower_ and lemma else normalized
+                if words:
+                    position += 1
+                starts.append(position)
+                token_ids.append(token.i)
+                words.append(word)
+                position += len(word)
+                ends.append(position)
+            if not words:
+                continue
+            lines.append(' '.join(words))
+            length = position
+        self._cleaned = '\n'.join(lines)
+        self._cleaned_starts = starts
+        self._cleaned_ends = ends
+        self._cleaned_tokens = token_ids
+
+    def view(self, chunk_text: str, start_char: Optional[int] = None) -> Optional['DocumentAnalysis']:
+        """
+        Analysis of a chunk of this text without parsing it again; None if it is not found.
+
+        Callers that know where the chunk starts in the original text pass
+        start_char. Otherwise the chunk is looked up in the original text,
+        then in the cleaned text, preferring an occurrence that starts and
+        ends on token boundaries. Tokens the chunk only partly covers are
+        left out.
+        """
+        if not isinstance(chunk_text, str) or not hasattr(self.doc, 'char_span'):
+            return None
+        if start_char is not None:
+            return self._span_view(self.doc.char_span(start_char, start_char + len(chunk_text), alignment_mode="contract"))
+        chunk = chunk_text.strip()
+        if not chunk:
+            return None
+
+        first = None
+        for start in _occurrences(self.text, chunk):
+            span = self.doc.char_span(start, start + len(chunk))
+            if span is not None:
+                return self._span_view(span)
+            first = start if first is None else first
+        if first is not None:
+            return self._span_view(self.doc.char_span(first, first + len(chunk), alignment_mode="contract"))
+
+        cleaned = self.cleaned
+        starts, ends = self._cleaned_starts, self._cleaned_ends
+        first = None
+        for start in _occurrences(cleaned, chunk):
+            word = bisect.bisect_left(starts, start)
+            last = bisect.bisect_left(ends, start + len(chunk))
+            if word < len(starts) and starts[word] == start and last < len(ends) and ends[last] == start + len(chunk):
+                return self._cleaned_view(word, last)
+            first = start if first is None else first
+        if first is None:
+            return None
+        return self._cleaned_view(bisect.bisect_left(starts, first), bisect.bisect_right(ends, first + len(chunk)) - 1)
+
+    def _span_view(self, span) -> Optional['DocumentAnalysis']:
+        return DocumentAnalysis(span) if span is not None and len(span) else None
+
+    def _cleaned_view(self, first: int, last: int) -> Optional['DocumentAnalysis']:
+        # Cleaned words first..last, mapped back to the tokens they came from
+        if last < first:
+            return None
+        return DocumentAnalysis(self.doc.doc[self._cleaned_tokens[first]:self._cleaned_tokens[last] + 1])
+
+def _occurrences(text: str, chunk: str) -> Iterator[int]:
+    start = text.find(chunk)
+    while start >= 0:
+        yield start
+        start = text.find(chunk, start + 1)
+
+def analyze_text(text: str, profile: str = "full") -> DocumentAnalysis:
+    """
+    Parse the text once; see DocumentAnalysis.
+
+    Callers that only need `normalized`/`cleaned`/`lemmatized` pass the
+    "lemmatize" profile, which skips NER; its ner_and_pos has no entities.
+    """
+    if not isinstance(text, str):
+        text = str(text)
+    text = truncate_for_nlp(text, "analyze_text")
+    try:
+        doc = parse(text, profile)
+    except Exception as e:
+        logger.error(f"Error in analyze_text: {str(e)}")
+        doc = None
+    return DocumentAnalysis(doc, text)
 
-# Synchronous version of the function, which is run in a separate thread
-def ner_and_pos_tagging(text: str) -> Dict[str, Any]:
-    doc = nlp(text[:1000000])  # Limit input size to prevent memory issues
-    
-    ner_results = []
-    pos_results = []
-    
-    for ent in doc.ents:
-        ner_results.append({
-            "text": ent.text,
-            "start_char": ent.start_char,
-            "end_char": ent.end_char,
-            "label": ent.label_
-        })
-    
-    for token in doc:
-        pos_results.append({
-            "text": token.text,
-            "pos": token.pos_,
-            "tag": token.tag_,
-            "dep": token.dep_
-        })
-    
-    return {
-        "ner": ner_results,
-        "pos": pos_results
-    }
 def process_woocommerce_text(text: str) -> Optional[dict]:
     try:
-        normalized_text = text_normalization_with_boundaries(text)
-        cleaned_text = text_remove_stop_words_lemmatized(text)
-        ner_pos_results = ner_and_pos_tagging(text)
+        analysis = analyze_text(text)
         
         return {
             "original": text,
-            "normalized": normalized_text,
-            "cleaned": cleaned_text,
-            "ner_pos": ner_pos_results
+            "normalized": analysis.normalized,
+            "cleaned": analysis.lemmatized,
+            "ner_pos": analysis.ner_and_pos.to_dict()
         }
     except Exception as e:
         logger.error(f"Error processing WooCommerce text: {str(e)}")
@@ -124,6 +505,29 @@ def process_woocommerce_text(text: str) -> Optional[dict]:
             "ner_pos": {"ner": [], "pos": []}
         }
 
+def process_woocommerce_corpus(records: Iterable[Tuple[str, Any]], n_process: int = 1, batch_size: int = 32) -> Iterator[Tuple[dict, Any]]:
+    """
+    process_woocommerce_text for a whole corpus, in input order.
+
+    Args:
+        records: (text, context) pairs, read lazily; context (e.g. a document id) is passed through.
+        n_process: spaCy worker processes; -1 uses every core.
+        batch_size: texts per nlp.pipe batch and worker round trip.
+
+    Yields:
+        tuple: (result in the process_woocommerce_text format, context)
+    """
+    texts = ((truncate_for_nlp(text if isinstance(text, str) else str(text), "process_woocommerce_corpus"), context)
+             for text, context in records)
+    for doc, context in parse_many(texts, "full", batch_size=batch_size, as_tuples=True, n_process=n_process):
+        analysis = DocumentAnalysis(doc)
+        yield {
+            "original": analysis.text,
+            "normalized": analysis.normalized,
+            "cleaned": analysis.lemmatized,
+            "ner_pos": analysis.ner_and_pos.to_dict()
+        }, context
+
 if __name__ == "__main__":
     input_text = """
 Title:
@@ -1,9 +1,10 @@
-import spacy
 from typing import List, Dict, Set, Any
 from dataclasses import dataclass
 import json
+import os
 import re
 from collections import defaultdict
+from model_registry import registry
 
 @dataclass
 class RecognizedEntity:
@@ -16,9 +17,6 @@ class RecognizedEntity:
 
 class CigarEntityRecognizer:
     def __init__(self, vocabulary_file: str = 'enhanced_cigar_vocabulary.json'):
-        # Load spaCy model
-        self.nlp = spacy.load("en_core_web_sm")
-        
         # Load domain vocabulary
         with open(vocabulary_file, 'r') as f:
             self.vocabulary = json.load(f)
@@ -26,8 +24,8 @@ class CigarEntityRecognizer:
         # Initialize entity dictionaries
         self.initialize_entity_dictionaries()
         
-        # Add custom pipeline components
-        self.add_custom_pipeline()
+        # Load spaCy model with the custom pipeline components
+        self.nlp = self.add_custom_pipeline(vocabulary_file)
 
     def initialize_entity_dictionaries(self):
         """Initialize dictionaries for different entity types"""
@@ -77,11 +75,14 @@ class CigarEntityRecognizer:
             "belicoso", "perfecto", "petit corona", "gordo"
         }
 
-    def add_custom_pipeline(self):
-        """Add custom pipeline components to spaCy"""
-        # Add entity ruler for custom entities
-        ruler = self.nlp.add_pipe("entity_ruler", before="ner")
-        
+    def add_custom_pipeline(self, vocabulary_file: str):
+        """
+        Add custom pipeline components to spaCy.
+
+        The entity ruler changes the pipeline, so this cannot use the shared
+        en_core_web_sm instance; recognizers built from the same vocabulary
+        file share one ruler-extended pipeline instead.
+        """
         patterns = []
         
         # Add patterns for each entity type
@@ -92,7 +93,16 @@ class CigarEntityRecognizer:
                     "pattern": term
                 })
         
-        ruler.add_patterns(patterns)
+        def load():
+            nlp = registry.import_module("spacy").load("en_core_web_sm")
+            # Add entity ruler for custom entities
+            ruler = nlp.add_pipe("entity_ruler", before="ner")
+            ruler.add_patterns(patterns)
+            return nlp
+
+        name = f"spacy:en_core_web_sm+entity_ruler:{os.path.abspath(vocabulary_file)}"
+        registry.register(name, load)
+        return registry.acquire_for(self, name)
 
     def extract_price_mentions(self, text: str) -> List[RecognizedEntity]:
         """Extract price-related mentions from text"""
@@ -1,10 +1,10 @@
 from dataclasses import dataclass
 from typing import Dict, List, Tuple, Optional
-import spacy
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 from enum import Enum
+from model_registry import registry
 
 class QueryIntent(Enum):
     SEARCH = "search"                   # Basic search queries
@@ -28,7 +28,7 @@ class IntentClassification:
 class CigarIntentClassifier:
     def __init__(self):
         # Load spaCy model for text processing
-        self.nlp = spacy.load("en_core_web_sm")
+        self.nlp = registry.acquire_for(self, "spacy:en_core_web_sm")
         
         # Initialize intent patterns
         self.initialize_intent_patterns()
@@ -1,8 +1,8 @@
 import logging
 from typing import Dict, List, Tuple
 import json
-import spacy
 from collections import defaultdict
+from model_registry import registry
 
 class CigarSynonymExpander:
     def __init__(self, vocabulary_file: str = 'enhanced_cigar_vocabulary.json'):
@@ -25,7 +25,7 @@ class CigarSynonymExpander:
         
         # Load spaCy for text processing
         try:
-            self.nlp = spacy.load("en_core_web_sm")
+            self.nlp = registry.acquire_for(self, "spacy:en_core_web_sm")
         except Exception as e:
             logging.error(f"Failed to load spaCy model: {e}")
             raise e  # Cannot proceed without spaCy
@@ -1,8 +1,8 @@
 from dataclasses import dataclass
 from typing import List, Dict, Optional, Set
-import spacy
 from enum import Enum
 import json
+from model_registry import registry
 
 class SemanticRole(Enum):
     SUBJECT = "subject"           # The main entity being queried
@@ -32,7 +32,7 @@ class SemanticParseResult:
 class CigarSemanticParser:
     def __init__(self, schema_file: str = 'enhanced_cigar_vocabulary.json'):
         # Load spaCy model
-        self.nlp = spacy.load("en_core_web_sm")
+        self.nlp = registry.acquire_for(self, "spacy:en_core_web_sm")
         
         # Load schema information
         with open(schema_file, 'r') as f:
@@ -2,8 +2,8 @@ from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
 import re
 from enum import Enum
-import spacy
 import json
+from model_registry import registry
 
 class RewriteType(Enum):
     ABBREVIATION = "abbreviation"
@@ -31,7 +31,7 @@ class RewrittenQuery:
 class CigarQueryRewriter:
     def __init__(self, vocabulary_file: str = 'enhanced_cigar_vocabulary.json', rules_file: str = 'rewrite_rules.json'):
         # Load spaCy for text processing
-        self.nlp = spacy.load("en_core_web_sm")
+        self.nlp = registry.acquire_for(self, "spacy:en_core_web_sm")
         
         # Load vocabulary if available
         try:
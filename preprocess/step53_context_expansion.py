@@ -1,8 +1,8 @@
 from dataclasses import dataclass
 from typing import List, Dict, Set, Optional
 from enum import Enum
-import spacy
 import json
+from model_registry import registry
 
 class ImplicitContext(Enum):
     POPULARITY = "popularity"
@@ -31,7 +31,7 @@ class ExpandedQuery:
 
 class CigarContextExpander:
     def __init__(self, vocabulary_file: str = 'enhanced_cigar_vocabulary.json'):
-        self.nlp = spacy.load("en_core_web_sm")
+        self.nlp = registry.acquire_for(self, "spacy:en_core_web_sm")
         
         # Load domain vocabulary if available
         try:
@@ -1,19 +1,57 @@
-import spacy
-from spacy.matcher import Matcher
-from sentence_transformers import SentenceTransformer, util
-from transformers import pipeline
+from embedding.backends import cache_name
+from embedding.embedding_cache import CachedEncoder, get_embedding_cache
+from model_registry import registry
 
-# Load models and tools
-nlp = spacy.load('en_core_web_md')
-model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
+model_name = 'paraphrase-MiniLM-L6-v2'
+
+def get_model():
+    # The embedding backend is loaded on first use; the cache is shared process-wide.
+    # The encoder records the encode metrics for its cache misses.
+    return CachedEncoder(registry.get(f"sentence-transformer:{model_name}"), get_embedding_cache(cache_name(model_name)), "sentence")
 
 def SentenceSimilarityScore(sentence1, sentence2):
+    util = registry.import_module("sentence_transformers.util")
+    model = get_model()
     embeddings1 = model.encode(sentence1, convert_to_tensor=True)
     embeddings2 = model.encode(sentence2, convert_to_tensor=True)
     similarity_score = util.pytorch_cos_sim(embeddings1, embeddings2).item()
     return similarity_score
 
+def SentenceSimilarityMatrix(sentences1, sentences2):
+    """
+    Score every sentence in sentences1 against every sentence in sentences2.
+
+    Both lists are embedded with a single batched encode call.
+
+    Returns:
+        List[List[float]]: len(sentences1) x len(sentences2) cosine similarity matrix.
+    """
+    util = registry.import_module("sentence_transformers.util")
+    embeddings = get_model().encode(list(sentences1) + list(sentences2), convert_to_tensor=True)
+    split = len(sentences1)
+    return util.pytorch_cos_sim(embeddings[:split], embeddings[split:]).tolist()
+
+def SentenceSimilarityPairs(pairs):
+    """
+    Score a list of (sentence1, sentence2) pairs.
+
+    Sentences repeated across pairs are embedded only once, and all of them go
+    through a single batched encode call.
+
+    Returns:
+        List[float]: one cosine similarity score per pair, in input order.
+    """
+    unique_sentences = list(dict.fromkeys(sentence for pair in pairs for sentence in pair))
+    index = {sentence: i for i, sentence in enumerate(unique_sentences)}
+    util = registry.import_module("sentence_transformers.util")
+    embeddings = get_model().encode(unique_sentences, convert_to_tensor=True)
+    left = embeddings[[index[sentence1] for sentence1, _ in pairs]]
+    right = embeddings[[index[sentence2] for _, sentence2 in pairs]]
+    return util.pairwise_cos_sim(left, right).tolist()
+
 if __name__ == "__main__":
+    from transformers import pipeline
+
     # Initialize the classifier
     classifier = pipeline("text-classification", model="textattack/roberta-base-CoLA")
 
@@ -0,0 +1,124 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+# ------------------------------------
+import sys
+import os
+sys.path.insert(0, os.path.dirname(sys.path[0]))
+# ------------------------------------
+import json
+import random
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from fuzzywuzzy import process
+from address_matching import CandidateSet, bulk_match, bulk_match_options
+
+STREETS = ["Main St", "Oak Avenue", "Pine Road", "Maple Drive", "Cedar Lane", "Elm Street", "Sunset Blvd", "Lake Shore Dr"]
+CITIES = ["Springfield, IL", "Portland, OR", "Austin, TX", "Denver, CO", "Madison, WI"]
+
+class Test_AddressMatching(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(7)
+        cls.addresses = [f"{rng.randint(1, 9999)} {rng.choice(STREETS)}, {rng.choice(CITIES)} {rng.randint(10000, 99999)}" for _ in range(2000)]
+        cls.candidate_set = CandidateSet("test", cls.addresses)
+
+    def test_exact_match(self):
+        address = self.addresses[123]
+        best_match = self.candidate_set.extract_one(address)
+        self.assertEqual(best_match, (address, 100))
+
+    def test_same_score_as_extract_one(self):
+        queries = [
+            self.addresses[5].upper(),
+            self.addresses[42].replace(",", ""),
+            self.addresses[777].replace("Avenue", "Ave").replace("Street", "St"),
+            self.addresses[1500][:-3] + "0" + self.addresses[1500][-2:],
+        ]
+        for query in queries:
+            expected = process.extractOne(query, self.addresses)
+            best_match = self.candidate_set.extract_one(query)
+            self.assertEqual(best_match[1], expected[1], query)
+
+    def test_no_shared_ngrams_falls_back_to_full_scan(self):
+        best_match = self.candidate_set.extract_one("zzz")
+        self.assertEqual(best_match, process.extractOne("zzz", self.addresses))
+
+    def test_empty_set(self):
+        self.assertIsNone(CandidateSet("empty", []).extract_one("1 Main St"))
+
+class Test_BulkMatch(TestCase):
+
+    def setUp(self):
+        rng = random.Random(11)
+        self.addresses = [f"{rng.randint(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}" for _ in range(300)]
+        self.queries = [self.addresses[3], self.addresses[42].upper(), self.addresses[99].replace(",", ""),
+                        self.addresses[150].replace("Street", "St"), "zzz", ""]
+
+    def test_same_as_extract_one(self):
+        # Small block_size so the queries span several cdist blocks
+        results = list(bulk_match(self.queries, self.addresses, block_size=4))
+        self.assertEqual([result["index"] for result in results], list(range(len(self.queries))))
+        for query, result in zip(self.queries, results):
+            expected = process.extractOne(query, self.addresses)
+            best = result["matches"][0]
+            self.assertEqual((best["match"], best["score"]), expected, query)
+            self.assertEqual(self.addresses[best["index"]], best["match"])
+
+    def test_limit_and_score_cutoff(self):
+        candidate_set = CandidateSet("bulk", self.addresses)
+        for result in bulk_match(self.queries, candidate_set, limit=5, score_cutoff=80):
+            scores = [match["score"] for match in result["matches"]]
+            self.assertLessEqual(len(scores), 5)
+            self.assertEqual(scores, sorted(scores, reverse=True))
+            self.assertTrue(all(score >= 80 for score in scores))
+        self.assertEqual(list(bulk_match(["1 Main St"], [])), [{"index": 0, "address": "1 Main St", "matches": []}])
+
+    def test_options(self):
+        self.assertEqual(bulk_match_options("3", "72.5"), (3, 72.5))
+        for limit, score_cutoff in ((0, 0), (-1, 0), ("many", 0), (None, 0), (1, -5), (1, 101), (1, "high"), (1, [])):
+            with self.subTest(limit=limit, score_cutoff=score_cutoff):
+                with self.assertRaises(ValueError):
+                    bulk_match_options(limit, score_cutoff)
+
+    def test_bad_options_rejected_before_streaming(self):
+        import app
+
+        response = app.app.test_client().post("/address-match-bulk", json={
+            "addresses": self.queries, "available_addresses": self.addresses, "limit": "many"})
+        self.assertEqual(response.status_code, 400)
+
+class Test_AsyncBulkMatch(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        from aiohttp.test_utils import TestClient, TestServer
+        import async_app
+
+        # The app's cleanup shuts its executor down, so every app gets a fresh one
+        self.enterContext(patch.object(async_app, "cpu_executor", ThreadPoolExecutor(max_workers=2)))
+        self.client = TestClient(TestServer(async_app.create_app()))
+        await self.client.start_server()
+        self.addAsyncCleanup(self.client.close)
+        self.closed = False
+
+    def results(self, queries, *args, **kwargs):
+        try:
+            for index, query in enumerate(queries):
+                yield {"index": index, "address": query, "matches": []}
+        finally:
+            self.closed = True
+
+    async def test_streams_results(self):
+        response = await self.client.post("/address-match-bulk", json={
+            "addresses": ["1 Main St", "2 Oak Avenue"], "available_addresses": ["1 Main St"]})
+        lines = (await response.text()).splitlines()
+        self.assertEqual([json.loads(line)["index"] for line in lines], [0, 1])
+
+    async def test_client_disconnect_closes_results(self):
+        from aiohttp import web
+
+        with patch("async_app.bulk_match", side_effect=self.results), \
+                patch.object(web.StreamResponse, "write", side_effect=ConnectionResetError()), \
+                self.assertNoLogs("aiohttp.server"):
+            await self.client.post("/address-match-bulk", json={
+                "addresses": ["1 Main St", "2 Oak Avenue"], "available_addresses": ["1 Main St"]})
+        self.assertTrue(self.closed)
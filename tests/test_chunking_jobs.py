@@ -0,0 +1,110 @@
+from unittest import TestCase
+# ------------------------------------
+import sys
+import os
+sys.path.insert(0, os.path.dirname(sys.path[0]))
+# ------------------------------------
+import json
+from unittest.mock import patch
+import fakeredis
+import spacy
+from rq import Queue, SimpleWorker
+from spacy.tokens import Doc
+from chunking_jobs import _keys, content_hash, redeliver_chunks, run_chunking_job, submit_chunking
+from pre_text_normalization import tag_doc
+from text_processing import deliver_chunks, deserialize_chunks, serialize_chunks
+
+TEXT = "Stay warm,  stay dry!\nIs it waterproof?"
+
+def make_chunk():
+    doc = Doc(spacy.blank("en").vocab, words=["Acme", "jackets", "are", "warm", "."], spaces=[True, True, True, False, False],
+              pos=["PROPN", "NOUN", "AUX", "ADJ", "PUNCT"], ents=["B-ORG", "O", "O", "O", "O"])
+    return {"type": "content", "chunk_text": doc.text, "tags": ["jacket"], "key_features": ["warm"], "ner": tag_doc(doc)}
+
+ENTITIES = [{"text": "Acme", "start_char": 0, "end_char": 4, "label": "ORG"}]
+
+def delivered(deliver):
+    """(wp_action_id, chunk ner entities) of every deliver_chunks call."""
+    return sorted((call.args[0], [chunk["ner"].entities() for chunk in call.args[1]]) for call in deliver.call_args_list)
+
+class Test_SubmitChunking(TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        self.queue = Queue("chunking", connection=self.redis)
+        self.result_key, self.job_key, self.waiters_key = _keys(content_hash(TEXT))
+
+    def waiters(self):
+        return {waiter.decode() for waiter in self.redis.smembers(self.waiters_key)}
+
+    def test_queued(self):
+        submitted = submit_chunking(self.queue, TEXT, 1)
+        self.assertEqual(submitted["status"], "queued")
+        job = self.queue.fetch_job(submitted["job_id"])
+        self.assertEqual((job.func, job.args), (run_chunking_job, (TEXT, content_hash(TEXT))))
+        self.assertEqual(self.redis.get(self.job_key).decode(), job.id)
+        self.assertEqual(self.waiters(), {"1"})
+
+    def test_joined(self):
+        first = submit_chunking(self.queue, TEXT, 1)
+        # Same text after whitespace normalization
+        second = submit_chunking(self.queue, ' '.join(TEXT.split()), 2)
+        self.assertEqual(second, {"job_id": first["job_id"], "status": "in_progress"})
+        self.assertEqual(len(self.queue), 1)
+        self.assertEqual(self.waiters(), {"1", "2"})
+
+    def test_cached(self):
+        self.redis.set(self.result_key, json.dumps(serialize_chunks([make_chunk()])))
+        submitted = submit_chunking(self.queue, TEXT, 3)
+        self.assertEqual(submitted["status"], "cached")
+        job = self.queue.fetch_job(submitted["job_id"])
+        self.assertEqual((job.func, job.args), (redeliver_chunks, (content_hash(TEXT), 3, TEXT)))
+        self.assertEqual(self.waiters(), set())
+
+    def test_failed_enqueue(self):
+        with patch.object(self.queue, "enqueue", side_effect=ConnectionError("redis went away")):
+            with self.assertRaises(ConnectionError):
+                submit_chunking(self.queue, TEXT, 1)
+        self.assertIsNone(self.redis.get(self.job_key))
+        self.assertEqual(self.waiters(), set())
+        # The next request queues a job instead of joining one that does not exist
+        self.assertEqual(submit_chunking(self.queue, TEXT, 2)["status"], "queued")
+
+    def test_takes_over_lost_job(self):
+        lost = submit_chunking(self.queue, TEXT, 1)
+        self.queue.fetch_job(lost["job_id"]).delete()
+        submitted = submit_chunking(self.queue, TEXT, 2)
+        self.assertEqual(submitted["status"], "queued")
+        self.assertNotEqual(submitted["job_id"], lost["job_id"])
+        self.assertEqual(self.redis.get(self.job_key).decode(), submitted["job_id"])
+        # The new job also delivers to the request that joined the lost one
+        self.assertEqual(self.waiters(), {"1", "2"})
+
+    def test_job_delivers_to_every_waiter(self):
+        submit_chunking(self.queue, TEXT, 1)
+        submit_chunking(self.queue, TEXT, 2)
+        with patch("chunking_jobs.PreprocessTextForRAG.process", return_value={"chunks": [make_chunk()]}), \
+                patch("chunking_jobs.deliver_chunks") as deliver:
+            SimpleWorker([self.queue], connection=self.redis).work(burst=True)
+        self.assertEqual(delivered(deliver), [("1", [ENTITIES]), ("2", [ENTITIES])])
+        stored = deserialize_chunks(json.loads(self.redis.get(self.result_key)))
+        self.assertEqual(stored[0]["ner"].to_dict(), make_chunk()["ner"].to_dict())
+        self.assertIsNone(self.redis.get(self.job_key))
+
+    def test_redelivers_stored_result(self):
+        self.redis.set(self.result_key, json.dumps(serialize_chunks([make_chunk()])))
+        submit_chunking(self.queue, TEXT, 3)
+        with patch("chunking_jobs.deliver_chunks") as deliver:
+            SimpleWorker([self.queue], connection=self.redis).work(burst=True)
+        self.assertEqual(delivered(deliver), [(3, [ENTITIES])])
+
+class Test_DeliverChunks(TestCase):
+
+    def test_admin_api_gets_entity_lists(self):
+        chunk = make_chunk()
+        # Results stored before the columnar format already hold the list
+        legacy = {**chunk, "ner": ENTITIES}
+        with patch("text_processing.http_put") as http_put:
+            deliver_chunks("7", [chunk, legacy])
+        self.assertEqual(http_put.call_args.args[1], [{**chunk, "ner": ENTITIES}, legacy])
+        self.assertEqual(deserialize_chunks([legacy]), [legacy])
@@ -0,0 +1,123 @@
+from unittest import TestCase, skipUnless
+# ------------------------------------
+import sys
+import os
+sys.path.insert(0, os.path.dirname(sys.path[0]))
+# ------------------------------------
+import importlib.util
+import re
+import tempfile
+import numpy as np
+from chunking.test_text import TestText
+from embedding.backends import EmbeddingBackend, _temporary_path, cache_name, cosine_drift, load_backend
+
+HAS_SENTENCE_TRANSFORMERS = importlib.util.find_spec("sentence_transformers") is not None
+HAS_ONNXRUNTIME = importlib.util.find_spec("onnxruntime") is not None
+
+# Upper bounds on the mean / max cosine distance to the full precision embeddings
+INT8_DRIFT = (0.02, 0.08)
+ONNX_DRIFT = (1e-5, 1e-4)
+
+class LengthBackend(EmbeddingBackend):
+    """Embeds a text as (length, 1); records the batches it was given."""
+
+    name = "length"
+
+    def __init__(self):
+        super().__init__("length", 2)
+        self.batches = []
+
+    def _encode_batch(self, texts):
+        self.batches.append(texts)
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+class Test_EmbeddingBackend(TestCase):
+
+    def test_encode_keeps_input_order(self):
+        backend = LengthBackend()
+        texts = ["a", "abcd", "ab", "abcdef", "abc"]
+        embeddings = backend.encode(texts, batch_size=2)
+        np.testing.assert_array_equal(embeddings[:, 0], [1, 4, 2, 6, 3])
+        # Longest first, so each batch holds texts of similar length
+        self.assertEqual(backend.batches, [["abcdef", "abcd"], ["abc", "ab"], ["a"]])
+
+    def test_encode_options(self):
+        backend = LengthBackend()
+        self.assertEqual(backend.encode("abc").shape, (2,))
+        np.testing.assert_allclose(backend.encode(["abc"], normalize_embeddings=True), [[0.9486833, 0.3162278]], rtol=1e-6)
+        self.assertEqual(backend.encode([]).shape, (0, 2))
+
+    def test_cosine_drift(self):
+        embeddings = np.random.default_rng(0).standard_normal((10, 8))
+        self.assertAlmostEqual(cosine_drift(embeddings, embeddings * 3)["max"], 0.0)
+        self.assertAlmostEqual(cosine_drift(embeddings, -embeddings)["mean"], 2.0)
+
+    def test_cache_name(self):
+        self.assertEqual(cache_name("all-MiniLM-L6-v2", "torch"), "all-MiniLM-L6-v2")
+        self.assertEqual(cache_name("all-MiniLM-L6-v2", "onnx-int8"), "all-MiniLM-L6-v2@onnx-int8")
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            load_backend("all-MiniLM-L6-v2", "openvino")
+
+class Test_TemporaryPath(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "model.onnx")
+
+    def test_replaces_path(self):
+        # Concurrent exports of the same model write to different files
+        with _temporary_path(self.path) as first, _temporary_path(self.path) as second:
+            self.assertNotEqual(first, second)
+            for tmp_path in (first, second):
+                with open(tmp_path, "w") as f:
+                    f.write(tmp_path)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), first)
+        self.assertEqual(os.listdir(self.directory.name), ["model.onnx"])
+
+    def test_failure_leaves_nothing(self):
+        with self.assertRaises(RuntimeError):
+            with _temporary_path(self.path) as tmp_path:
+                with open(tmp_path, "w") as f:
+                    f.write("partial")
+                raise RuntimeError("export failed")
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+@skipUnless(HAS_SENTENCE_TRANSFORMERS, "needs sentence-transformers and torch")
+class Test_BackendParity(TestCase):
+    """Cosine drift of each backend against the full precision PyTorch embeddings."""
+
+    MODELS = ("all-MiniLM-L6-v2", "paraphrase-MiniLM-L6-v2")
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sentences = [sentence for sentence in re.split(r'(?<=[.!?])\s+', ' '.join(TestText.split())) if sentence][:200]
+        cls.reference = {model: load_backend(model, "torch").encode(cls.sentences) for model in cls.MODELS}
+
+    def assertDrift(self, backend, bounds):
+        for model in self.MODELS:
+            with self.subTest(model=model, backend=backend):
+                drift = cosine_drift(self.reference[model], load_backend(model, backend).encode(self.sentences))
+                self.assertLess(drift["mean"], bounds[0])
+                self.assertLess(drift["max"], bounds[1])
+
+    def test_torch_int8(self):
+        self.assertDrift("torch-int8", INT8_DRIFT)
+
+    @skipUnless(HAS_ONNXRUNTIME, "needs onnxruntime")
+    def test_onnx(self):
+        self.assertDrift("onnx", ONNX_DRIFT)
+
+    @skipUnless(HAS_ONNXRUNTIME, "needs onnxruntime")
+    def test_onnx_int8(self):
+        self.assertDrift("onnx-int8", INT8_DRIFT)
+
+    @skipUnless(HAS_ONNXRUNTIME, "needs onnxruntime")
+    def test_onnx_single_sentence_and_normalization(self):
+        backend = load_backend("all-MiniLM-L6-v2", "onnx")
+        embedding = backend.encode(self.sentences[0], normalize_embeddings=True)
+        self.assertEqual(embedding.shape, (backend.get_sentence_embedding_dimension(),))
+        self.assertAlmostEqual(float(np.linalg.norm(embedding)), 1.0, places=5)
@@ -0,0 +1,108 @@
+from unittest import TestCase
+# ------------------------------------
+import sys
+import os
+sys.path.insert(0, os.path.dirname(sys.path[0]))
+# ------------------------------------
+import tempfile
+import numpy as np
+from prometheus_client import REGISTRY
+from chunking_jobs import content_hash
+from embedding.embedding_cache import CachedEncoder, DiskEmbeddingStore, EmbeddingCache, embedding_key
+from text_keys import normalize_text
+
+def vector(value: float, dim: int = 4) -> np.ndarray:
+    return np.full(dim, value, dtype=np.float32)
+
+class CountingModel:
+    """Embeds a text as its length; records every text it was asked to encode."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, convert_to_numpy: bool = True, **kwargs):
+        self.encoded.extend(texts)
+        return np.array([vector(len(text)) for text in texts])
+
+class Test_EmbeddingCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_lru_bound(self):
+        cache = EmbeddingCache("model", max_entries=2)
+        cache.put("a", vector(1))
+        cache.put("b", vector(2))
+        cache.get("a")  # "b" is now the least recently used
+        cache.put("c", vector(3))
+        self.assertIsNone(cache.get("b"))
+        np.testing.assert_array_equal(cache.get("a"), vector(1))
+        np.testing.assert_array_equal(cache.get("c"), vector(3))
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_stats(self):
+        cache = EmbeddingCache("model", max_entries=10)
+        cache.put("Hello  world", vector(1))
+        self.assertIsNotNone(cache.get("Hello world"))
+        self.assertIsNotNone(cache.get(" Hello\nworld "))
+        self.assertIsNone(cache.get("hello world"))
+        self.assertEqual(cache.stats(), {
+            "model": "model", "hits": 2, "misses": 1, "hit_rate": 2 / 3, "entries": 1,
+            "max_entries": 10, "disk_entries": 0, "disk_full": False,
+        })
+
+    def test_disk_round_trip(self):
+        cache = EmbeddingCache("org/model", max_entries=1, cache_dir=self.directory.name)
+        cache.put("first", vector(1))
+        cache.put("second", vector(2))
+        # Evicted from memory, still on disk
+        np.testing.assert_array_equal(cache.get("first"), vector(1))
+
+        # Another worker sharing the directory
+        other = EmbeddingCache("org/model", cache_dir=self.directory.name)
+        np.testing.assert_array_equal(other.get("second"), vector(2))
+        self.assertEqual(other.stats()["disk_entries"], 2)
+        self.assertIsNone(EmbeddingCache("other-model", cache_dir=self.directory.name).get("first"))
+
+    def test_disk_bound(self):
+        store = DiskEmbeddingStore(self.directory.name, max_bytes=2 * vector(0).nbytes)
+        for i in range(3):
+            store.put(f"key{i}", vector(i))
+        self.assertTrue(store.full)
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get("key2"))
+        np.testing.assert_array_equal(store.get("key1"), vector(1))
+        self.assertEqual(os.path.getsize(store.vectors_path), 2 * vector(0).nbytes)
+
+    def test_dimension_mismatch(self):
+        store = DiskEmbeddingStore(self.directory.name)
+        store.put("key", vector(1))
+        with self.assertRaises(ValueError):
+            store.put("other", vector(1, dim=3))
+
+    def test_cached_encoder_only_encodes_misses(self):
+        model = CountingModel()
+        encoder = CachedEncoder(model, EmbeddingCache("model"))
+        encoder.encode(["one", "two"])
+        embeddings = encoder.encode(["two", "three", "three ", "one"])
+        self.assertEqual(model.encoded, ["one", "two", "three"])
+        np.testing.assert_array_equal(embeddings[:, 0], [3, 5, 5, 3])
+
+    def test_metrics_count_cache_misses(self):
+        def sample(name):
+            return REGISTRY.get_sample_value(name, {"source": "test-misses"}) or 0.0
+
+        encoder = CachedEncoder(CountingModel(), EmbeddingCache("model"), "test-misses")
+        encoder.encode(["one", "two"])
+        encoder.encode(["two", "three"])
+        encoder.encode(["one", "three"])
+        self.assertEqual(sample("embedding_texts_total"), 3)
+        self.assertEqual(sample("embedding_encode_seconds_count"), 2)
+
+    def test_shared_normalization(self):
+        # Decomposed accent and extra whitespace
+        text = "Cafe\u0301  au\tlait\n"
+        self.assertEqual(normalize_text(text), "Caf\u00e9 au lait")
+        self.assertEqual(content_hash(text), content_hash("Caf\u00e9 au lait"))
+        self.assertEqual(embedding_key("model", text), embedding_key("model", "Caf\u00e9 au lait"))
@@ -0,0 +1,91 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+# ------------------------------------
+import sys
+import os
+sys.path.insert(0, os.path.dirname(sys.path[0]))
+# ------------------------------------
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from chunking.test_text import TestText
+from fast_normalization import normalize_text, token_agreement
+from pre_text_normalization import normalize_doc, parse, text_normalization_with_boundaries
+
+# Product-description style sentences exercising the tokenizer rules the fast engine emulates
+PRODUCT_TEXTS = [
+    "Stay warm, stay dry! Is it waterproof? Yes (S-XXL).",
+    "The XYZ-1000 costs $1,299.99. It ships from the U.S. in 3-5 days.",
+    "Made by Acme Co. Inc. in Dr. Smith's lab, e.g. for home/office use.",
+    "Don't wash it hot; it's 100% cotton... Really? Yes!!",
+    "Dimensions: 10x20 cm. Weight: 2.5 kg. Color: Red/Blue.",
+    "Questions? Email support@example.com or visit https://example.com/help.",
+    "State-of-the-art design.It fits any decor. Plan A. Then plan B.",
+    "Naïve café crème — 2 × 250 ml. Très bien!",
+]
+
+def spacy_normalize(text: str) -> str:
+    return normalize_doc(parse(text, "boundaries"))
+
+class Test_FastNormalization(TestCase):
+
+    def test_rules_engine(self):
+        self.assertEqual(normalize_text("Stay warm, stay dry! Is it waterproof? Yes (S-XXL)."),
+                         "stay warm stay dry !\nis it waterproof ?\nyes s xxl .")
+
+    def test_tokenizer_rules(self):
+        self.assertEqual(normalize_text("The U.S. Army paid $3.50 for 1,000 units. Dr. Smith's end.Next"),
+                         "the us army paid 350 for 1000 units .\ndr smith s end .\nnext")
+        self.assertEqual(normalize_text("I don't know... state-of-the-art a/b"), "i do nt know state of the art a b")
+
+    def test_punkt_engine(self):
+        self.assertEqual(normalize_text("Dr. Smith arrived. Then he left!", "punkt"), "dr smith arrived .\nthen he left !")
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            normalize_text("Hello.", "regex")
+
+    def test_engine_per_call(self):
+        text = "Hello there. How are you?"
+        self.assertEqual(text_normalization_with_boundaries(text, engine="rules"), normalize_text(text))
+        self.assertEqual(text_normalization_with_boundaries(text, engine="spacy"), spacy_normalize(text))
+
+class Test_FastNormalizationAgreement(TestCase):
+    """How far the fast engines are from the spaCy boundaries profile."""
+
+    def test_product_texts_match_spacy(self):
+        for text in PRODUCT_TEXTS:
+            with self.subTest(text=text):
+                self.assertEqual(normalize_text(text), spacy_normalize(text))
+
+    def test_rules_agreement(self):
+        # Differences left: Wikipedia citation markers like "too.[91]"
+        self.assertGreaterEqual(token_agreement(spacy_normalize(TestText), normalize_text(TestText)), 0.995)
+
+    def test_punkt_agreement(self):
+        # Punkt also breaks sentences before citation markers, which splits a few tokens differently
+        self.assertGreaterEqual(token_agreement(spacy_normalize(TestText), normalize_text(TestText, "punkt")), 0.93)
+
+class Test_TextCleanEngine(IsolatedAsyncioTestCase):
+    """/text-clean rejects unknown engines instead of returning the raw text."""
+
+    def test_flask(self):
+        import app
+
+        client = app.app.test_client()
+        response = client.post("/text-clean", json={"text_block": "Hello there. Bye!", "engine": "rules"})
+        self.assertEqual(response.get_json(), {"text": "hello there .\nbye !"})
+        for engine in ("regex", 3):
+            with self.subTest(engine=engine):
+                response = client.post("/text-clean", json={"text_block": "Hello there.", "engine": engine})
+                self.assertEqual(response.status_code, 400)
+
+    async def test_aiohttp(self):
+        from aiohttp.test_utils import TestClient, TestServer
+        import async_app
+
+        # The app's cleanup shuts its executor down, so every app gets a fresh one
+        self.enterContext(patch.object(async_app, "cpu_executor", ThreadPoolExecutor(max_workers=2)))
+        async with TestClient(TestServer(async_app.create_app())) as client:
+            response = await client.post("/text-clean", json={"text_block": "Hello there. Bye!", "engine": "punkt"})
+            self.assertEqual(await response.json(), {"text": "hello there .\nbye !"})
+            response = await client.post("/text-clean", json={"text_block": "Hello there.", "engine": "regex"})
+            self.assertEqual(response.status, 400)
@@ -0,0 +1,121 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+# ------------------------------------
+import sys
+import os
+sys.path.insert(0, os.path.dirname(sys.path[0]))
+# ------------------------------------
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import nlp_batching
+from nlp_batching import NLPBatcher, text_normalization_with_boundaries_async, text_normalization_with_boundaries_batched
+from pre_text_normalization import normalize_doc, parse
+
+TEXTS = [f"Item {i} is warm. Is it dry? Yes!" for i in range(40)]
+
+class StalledBatcher(NLPBatcher):
+    """A batcher whose NLP thread is stuck in its first batch until released."""
+
+    def __init__(self, **kwargs):
+        super().__init__("boundaries", max_queue_size=1, submit_timeout=0.05, parse_timeout=0.05, **kwargs)
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def _collect(self):
+        batch = super()._collect()
+        self.started.set()
+        self.release.wait()
+        return batch
+
+    def saturate(self):
+        # One text held by the NLP thread, one filling the queue
+        self.submit("held")
+        self.started.wait(1)
+        self.submit("queued")
+
+class Test_NLPBatcher(TestCase):
+
+    def test_batches_concurrent_texts(self):
+        batcher = NLPBatcher("boundaries", max_batch_size=8, max_wait_ms=20)
+        with patch("nlp_batching.parse_many", wraps=nlp_batching.parse_many) as parse_many, \
+                ThreadPoolExecutor(max_workers=16) as pool:
+            docs = list(pool.map(batcher.parse, TEXTS))
+        self.assertEqual([doc.text for doc in docs], TEXTS)
+        self.assertEqual([normalize_doc(doc) for doc in docs], [normalize_doc(parse(text, "boundaries")) for text in TEXTS])
+        self.assertLess(parse_many.call_count, len(TEXTS))
+        self.assertTrue(all(len(call.args[0]) <= 8 for call in parse_many.call_args_list))
+
+    def test_parse_errors_reach_the_caller(self):
+        batcher = NLPBatcher("boundaries")
+        with patch("nlp_batching.parse_many", side_effect=RuntimeError("spaCy is broken")):
+            with self.assertRaises(RuntimeError):
+                batcher.parse("Hello.")
+
+    def test_full_queue(self):
+        batcher = StalledBatcher()
+        self.addCleanup(batcher.release.set)
+        batcher.saturate()
+        with self.assertRaises(queue.Full):
+            batcher.submit("rejected")
+
+    def test_parse_timeout(self):
+        batcher = StalledBatcher()
+        self.addCleanup(batcher.release.set)
+        with self.assertRaises(queue.Full):
+            batcher.parse("Never parsed.")
+
+    def test_backpressure_is_not_swallowed(self):
+        batcher = StalledBatcher()
+        self.addCleanup(batcher.release.set)
+        batcher.saturate()
+        with patch("nlp_batching.get_batcher", return_value=batcher):
+            with self.assertRaises(queue.Full):
+                text_normalization_with_boundaries_batched("Hello there.", "spacy")
+
+class Test_NLPBatcherAsync(IsolatedAsyncioTestCase):
+
+    async def test_submit_async(self):
+        doc = await NLPBatcher("boundaries").submit_async("Hello there. How are you?")
+        self.assertEqual(normalize_doc(doc), "hello there .\nhow are you ?")
+
+    async def test_full_queue(self):
+        batcher = StalledBatcher()
+        self.addCleanup(batcher.release.set)
+        batcher.saturate()
+        with self.assertRaises(queue.Full):
+            await batcher.submit_async("rejected")
+        with patch("nlp_batching.get_batcher", return_value=batcher):
+            with self.assertRaises(queue.Full):
+                await text_normalization_with_boundaries_async("Hello there.", "spacy")
+
+    async def test_parse_timeout(self):
+        batcher = StalledBatcher()
+        self.addCleanup(batcher.release.set)
+        with self.assertRaises(queue.Full):
+            await batcher.submit_async("Never parsed.")
+
+TEXT_ENDPOINTS = (("/text-clean", "text_normalization_with_boundaries"), ("/text-normalize", "text_remove_stop_words_lemmatized"))
+
+class Test_Overloaded(IsolatedAsyncioTestCase):
+
+    def test_text_endpoints_answer_503(self):
+        import app
+
+        client = app.app.test_client()
+        for path, name in TEXT_ENDPOINTS:
+            with self.subTest(path=path), patch(f"app.{name}_batched", side_effect=queue.Full()):
+                response = client.post(path, json={"text_block": "Hello there."})
+                self.assertEqual(response.status_code, 503)
+
+    async def test_async_text_endpoints_answer_503(self):
+        from aiohttp.test_utils import TestClient, TestServer
+        import async_app
+
+        # The app's cleanup shuts its executor down, so every app gets a fresh one
+        self.enterContext(patch.object(async_app, "cpu_executor", ThreadPoolExecutor(max_workers=2)))
+        async with TestClient(TestServer(async_app.create_app())) as client:
+            for path, name in TEXT_ENDPOINTS:
+                with self.subTest(path=path), patch(f"async_app.{name}_async", side_effect=queue.Full()):
+                    response = await client.post(path, json={"text_block": "Hello there."})
+                    self.assertEqual(response.status, 503)
@@ -0,0 +1,89 @@
+from unittest import TestCase
+# ------------------------------------
+import sys
+import os
+sys.path.insert(0, os.path.dirname(sys.path[0]))
+# ------------------------------------
+import tempfile
+from unittest.mock import patch
+import spacy
+import pre_text_normalization
+from parse_cache import DiskParseStore, ParseCache, parse_key
+
+TEXT = "The kettle boils in two minutes. It is made of steel."
+
+def blank_pipeline(name: str = "pipeline", version: str = "0.0.0"):
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    nlp.meta["name"] = name
+    nlp.meta["version"] = version
+    return nlp
+
+class Test_ParseCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cache = ParseCache(max_entries=10, cache_dir=self.directory.name)
+        self.enterContext(patch("pre_text_normalization.get_parse_cache", return_value=self.cache))
+
+    def parse(self, nlp, text: str = TEXT):
+        """The doc, and whether it was parsed rather than taken from the cache."""
+        misses = self.cache.misses
+        with patch("pre_text_normalization.get_nlp", return_value=nlp):
+            doc = pre_text_normalization.parse(text, "full")
+        return doc, self.cache.misses > misses
+
+    def test_hit_and_miss(self):
+        nlp = blank_pipeline()
+        doc, parsed = self.parse(nlp)
+        self.assertTrue(parsed)
+        cached, parsed = self.parse(nlp)
+        self.assertFalse(parsed)
+        self.assertEqual([sent.text for sent in cached.sents], [sent.text for sent in doc.sents])
+        self.assertIs(cached.vocab, nlp.vocab)
+        _, parsed = self.parse(nlp, TEXT + " ")
+        self.assertTrue(parsed)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_disk_round_trip(self):
+        nlp = blank_pipeline()
+        doc, _ = self.parse(nlp)
+        # A new process: empty memory tier, same directory
+        self.cache = ParseCache(max_entries=0, cache_dir=self.directory.name)
+        with patch("pre_text_normalization.get_parse_cache", return_value=self.cache):
+            cached, parsed = self.parse(nlp)
+        self.assertFalse(parsed)
+        self.assertEqual([token.is_sent_start for token in cached], [token.is_sent_start for token in doc])
+
+    def test_new_model_invalidates(self):
+        self.parse(blank_pipeline())
+        for nlp in (blank_pipeline(version="0.0.1"), blank_pipeline(name="other")):
+            with self.subTest(name=nlp.meta["name"], version=nlp.meta["version"]):
+                _, parsed = self.parse(nlp)
+                self.assertTrue(parsed)
+
+class Test_DiskParseStore(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_evicts_least_recently_used(self):
+        store = DiskParseStore(self.directory.name, max_entries=3 * DiskParseStore.SHARDS)
+        # Keys of one shard, written with increasing mtimes
+        keys = [f"00{i:038x}" for i in range(3)]
+        for i, key in enumerate(keys):
+            store.put(key, b"doc")
+            os.utime(store._path(key), ns=(i, i))
+        store.get(keys[0])  # Recently used again
+        store.put("00" + "f" * 38, b"doc")
+        self.assertEqual(len(store), 3)
+        self.assertIsNotNone(store.get(keys[0]))
+        self.assertIsNone(store.get(keys[1]))
+
+    def test_unbounded(self):
+        store = DiskParseStore(self.directory.name, max_entries=0)
+        for i in range(5):
+            store.put(parse_key("pipeline", str(i)), b"doc")
+        self.assertEqual(len(store), 5)
@@ -0,0 +1,164 @@
+from unittest import TestCase, skipUnless
+# ------------------------------------
+import sys
+import os
+sys.path.insert(0, os.path.dirname(sys.path[0]))
+# ------------------------------------
+import json
+import pickle
+import tracemalloc
+import spacy
+from unittest.mock import patch
+import pre_text_normalization
+from spacy.tokens import Doc
+from chunking.test_text import TestText
+from columnar_tags import TagColumns
+from pre_text_normalization import (DocumentAnalysis, iter_normalized_sentences, iter_paragraphs, lemmatize_doc, normalize_doc, parse, tag_doc,
+                                    text_normalization_with_boundaries)
+
+HAS_MODEL = spacy.util.is_package("en_core_web_sm")
+
+class Test_PipelineProfiles(TestCase):
+
+    def test_boundaries_profile(self):
+        normalized = normalize_doc(parse("Stay warm, stay dry! Is it waterproof? Yes (S-XXL).", "boundaries"))
+        self.assertEqual(normalized, "stay warm stay dry !\nis it waterproof ?\nyes s xxl .")
+
+    @skipUnless(HAS_MODEL, "en_core_web_sm is not installed")
+    def test_boundaries_profile_same_tokens(self):
+        # Only the sentence boundaries may move: the sentencizer splits on punctuation, not on the parse
+        full = normalize_doc(parse(TestText, "full"))
+        fast = normalize_doc(parse(TestText, "boundaries"))
+        self.assertEqual(full.split(), fast.split())
+
+    @skipUnless(HAS_MODEL, "en_core_web_sm is not installed")
+    def test_lemmatize_profile_same_output(self):
+        self.assertEqual(lemmatize_doc(parse(TestText, "full")), lemmatize_doc(parse(TestText, "lemmatize")))
+
+    @skipUnless(HAS_MODEL, "en_core_web_sm is not installed")
+    def test_lemmatize_profile_has_no_entities(self):
+        self.assertTrue(tag_doc(parse(TestText, "full")).entities())
+        self.assertEqual(tag_doc(parse(TestText, "lemmatize")).entities(), [])
+
+class Test_StreamingNormalization(TestCase):
+
+    def setUp(self):
+        self.text = (TestText[:3000] + "\n\n  \n" + "Short paragraph. Two!\n\n") * 3
+
+    def test_paragraph_offsets(self):
+        paragraphs = list(iter_paragraphs(self.text, max_chars=500))
+        self.assertTrue(all(len(paragraph) <= 500 for paragraph, _ in paragraphs))
+        for paragraph, offset in paragraphs:
+            self.assertEqual(self.text[offset:offset + len(paragraph)], paragraph)
+
+    def test_pieces_same_as_string(self):
+        pieces = [self.text[i:i + 37] for i in range(0, len(self.text), 37)]
+        self.assertEqual(list(iter_paragraphs(pieces, max_chars=500)), list(iter_paragraphs(self.text, max_chars=500)))
+
+    def test_sentence_offsets(self):
+        for sentence in iter_normalized_sentences(self.text, max_paragraph_chars=500):
+            original = self.text[sentence["start_char"]:sentence["end_char"]]
+            self.assertEqual(normalize_doc(parse(original, "boundaries")), sentence["text"])
+
+    def test_streamed_same_lines_as_direct(self):
+        # Paragraphs without final punctuation, sentences that normalize to nothing,
+        # tab-separated words and trailing whitespace
+        short = "Title:\n\nShort Description:\nStay warm. (S-XXL)\n\n:)\n\nIs\tit\tdry?\tYes.\n\n"
+        for text in (short, self.text, short * 200):
+            with self.subTest(length=len(text)):
+                direct = text_normalization_with_boundaries(text, engine="spacy")
+                with patch.object(pre_text_normalization, "MAX_TEXT_LENGTH", len(text) - 1):
+                    self.assertEqual(text_normalization_with_boundaries(text, engine="spacy"), direct)
+                for max_chars in (40, 500):
+                    streamed = [sentence["text"] for sentence in iter_normalized_sentences(text, max_paragraph_chars=max_chars)]
+                    self.assertEqual('\n'.join(streamed), direct)
+
+class Test_DocumentAnalysisView(TestCase):
+
+    def setUp(self):
+        self.text = "Redwood jackets are red. The Red jacket is warm. The Red jacket is dry."
+        self.analysis = DocumentAnalysis(parse(self.text, "boundaries"))
+
+    def assertView(self, view, text, start_char):
+        self.assertEqual((view.text, view.doc.start_char), (text, start_char))
+
+    def test_token_aligned_occurrence(self):
+        # Not the "Red" inside "Redwood"
+        self.assertView(self.analysis.view("Red"), "Red", self.text.index("The Red") + 4)
+
+    def test_start_char(self):
+        second = self.text.rindex("Red jacket")
+        self.assertView(self.analysis.view("Red jacket", start_char=second), "Red jacket", second)
+
+    def test_partial_tokens_left_out(self):
+        self.assertView(self.analysis.view("ood jackets are"), "jackets are", self.text.index("jackets"))
+        self.assertIsNone(self.analysis.view("edwoo"))
+
+    def test_cleaned_text(self):
+        self.assertEqual(self.analysis.cleaned.split("\n")[1], "red jacket warm .")
+        self.assertView(self.analysis.view("red jacket warm"), "Red jacket is warm", self.text.index("Red jacket is warm"))
+        self.assertView(self.analysis.view("d jacket wa"), "jacket", self.text.index("jacket is warm"))
+
+    def test_not_found(self):
+        self.assertIsNone(self.analysis.view("blue coat"))
+        self.assertIsNone(self.analysis.view("  "))
+
+class Test_TagColumns(TestCase):
+
+    def setUp(self):
+        words = ["Acme", "makes", "warm", "jackets", "in", "Denver", "."]
+        self.doc = Doc(spacy.blank("en").vocab, words=words, spaces=[True, True, True, True, True, False, False],
+                       pos=["PROPN", "VERB", "ADJ", "NOUN", "ADP", "PROPN", "PUNCT"],
+                       tags=["NNP", "VBZ", "JJ", "NNS", "IN", "NNP", "."],
+                       deps=["nsubj", "ROOT", "amod", "dobj", "prep", "pobj", "punct"],
+                       heads=[1, 1, 3, 1, 1, 4, 1], ents=["B-ORG", "O", "O", "O", "O", "B-GPE", "O"])
+        self.expected = {
+            "ner": [
+                {"text": "Acme", "start_char": 0, "end_char": 4, "label": "ORG"},
+                {"text": "Denver", "start_char": 27, "end_char": 33, "label": "GPE"},
+            ],
+            "pos": [{"text": token.text, "pos": token.pos_, "tag": token.tag_, "dep": token.dep_} for token in self.doc],
+        }
+
+    def test_to_dict(self):
+        self.assertEqual(tag_doc(self.doc).to_dict(), self.expected)
+        self.assertEqual(tag_doc(self.doc).entities(), self.expected["ner"])
+
+    def test_span_offsets_relative_to_chunk(self):
+        tags = TagColumns.from_doc(self.doc[3:6]).to_dict()
+        self.assertEqual(tags["ner"], [{"text": "Denver", "start_char": 11, "end_char": 17, "label": "GPE"}])
+        self.assertEqual([token["text"] for token in tags["pos"]], ["jackets", "in", "Denver"])
+
+    def test_serialization_round_trip(self):
+        columns = TagColumns.from_doc(self.doc)
+        self.assertEqual(TagColumns.from_bytes(columns.to_bytes()).to_dict(), self.expected)
+        self.assertEqual(TagColumns.from_json(json.loads(json.dumps(columns.to_json()))).to_dict(), self.expected)
+        self.assertEqual(pickle.loads(pickle.dumps(columns)).to_dict(), self.expected)
+        empty = TagColumns.empty("Unparsed text.")
+        self.assertEqual(pickle.loads(pickle.dumps(empty)).to_dict(), {"ner": [], "pos": []})
+
+    def test_smaller_than_dicts(self):
+        words = TestText.split()
+        labels = [("PROPN", "NNP", "nsubj"), ("VERB", "VBZ", "ROOT"), ("ADJ", "JJ", "amod"), ("NOUN", "NNS", "dobj"),
+                  ("ADP", "IN", "prep"), ("PUNCT", ".", "punct")]
+        doc = Doc(spacy.blank("en").vocab, words=words,
+                  pos=[labels[i % 6][0] for i in range(len(words))], tags=[labels[i % 6][1] for i in range(len(words))],
+                  deps=[labels[i % 6][2] for i in range(len(words))], heads=list(range(len(words))),
+                  ents=["B-ORG" if i % 25 == 0 else "O" for i in range(len(words))])
+
+        def held(build):
+            # Memory still allocated by what build() returns
+            tracemalloc.start()
+            try:
+                value = build()
+                return value, tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+
+        columns, columns_memory = held(lambda: TagColumns.from_doc(doc))
+        tags, tags_memory = held(columns.to_dict)
+        self.assertGreater(tags_memory, 8 * columns_memory)
+        # Chunks carry their text anyway; compare what the tags add to it
+        text_bytes = len(doc.text.encode('utf-8'))
+        self.assertGreater(len(pickle.dumps(tags)), 5 * (len(pickle.dumps(columns)) - text_bytes))
+        self.assertGreater(len(json.dumps(tags)), 3 * (len(json.dumps(columns.to_json())) - text_bytes))
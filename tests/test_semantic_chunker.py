@@ -0,0 +1,300 @@
+from unittest import TestCase
+# ------------------------------------
+import sys
+import os
+sys.path.insert(0, os.path.dirname(sys.path[0]))
+# ------------------------------------
+import zlib
+from unittest.mock import patch
+import numpy as np
+from scipy.spatial.distance import cosine
+import pre_text_normalization
+from chunking.semantic_chunker import SemanticChunker, pooled_windows, unit_rows
+from chunking.test_text import TestText
+
+class FakeModel:
+    """Bag-of-words embeddings: every word gets a fixed random vector."""
+
+    def __init__(self, dim=32):
+        self.dim = dim
+        self.calls = 0
+        self.encoded = 0
+        self.vectors = {}
+
+    def word_vector(self, word):
+        word = word.lower()
+        if word not in self.vectors:
+            self.vectors[word] = np.random.default_rng(zlib.crc32(word.encode())).standard_normal(self.dim)
+        return self.vectors[word]
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        self.calls += 1
+        self.encoded += len(texts)
+        return np.array([sum((self.word_vector(word) for word in text.split()), np.zeros(self.dim))
+                         for text in texts], dtype=np.float32)
+
+def reference_chunks(chunker, sentences):
+    # The loop-based implementation the vectorized core replaced
+    sentences = [{'sentence': sentence} for sentence in sentences]
+    for i in range(len(sentences)):
+        window = sentences[max(0, i - chunker.buffer_size):min(len(sentences), i + 1 + chunker.buffer_size)]
+        sentences[i]['combined_sentence'] = ' '.join(s['sentence'] for s in window)
+    embeddings = chunker.model.encode([s['combined_sentence'] for s in sentences])
+    distances = [cosine(embeddings[i], embeddings[i + 1]) for i in range(len(embeddings) - 1)]
+    threshold = np.percentile(distances, chunker.breakpoint_percentile)
+    chunks, current, length = [], [], 0
+    for i, sentence in enumerate(sentences):
+        current.append(sentence['sentence'])
+        length += len(sentence['sentence'])
+        if (i > 0 and distances[i - 1] > threshold and length >= chunker.min_chunk_length) or length >= chunker.max_chunk_length:
+            chunks.append(' '.join(current))
+            current, length = [], 0
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+def make_chunker(**kwargs):
+    chunker = SemanticChunker(**kwargs)
+    chunker._model = FakeModel()
+    return chunker
+
+class Test_SemanticChunker(TestCase):
+
+    def setUp(self):
+        self.sentences = make_chunker()._split_sentences(' '.join(TestText.split()))
+
+    def test_same_chunks_as_reference(self):
+        for kwargs in [{}, {"breakpoint_percentile": 50, "min_chunk_length": 200, "max_chunk_length": 1000},
+                       {"breakpoint_percentile": 95, "min_chunk_length": 0, "buffer_size": 1}]:
+            with self.subTest(**kwargs):
+                chunker = make_chunker(**kwargs)
+                self.assertEqual(chunker._chunk_sentences(self.sentences), reference_chunks(chunker, self.sentences))
+
+    def test_distances_match_scipy(self):
+        chunker = make_chunker()
+        embeddings = chunker.model.encode(chunker._combine_sentences(self.sentences[:50]))
+        distances = chunker._calculate_cosine_distances(unit_rows(embeddings))
+        expected = [cosine(embeddings[i], embeddings[i + 1]) for i in range(len(embeddings) - 1)]
+        np.testing.assert_allclose(distances, expected, atol=1e-5)
+
+    def test_chunks_cover_all_sentences(self):
+        chunker = make_chunker(breakpoint_percentile=50, min_chunk_length=100, max_chunk_length=400)
+        chunks = chunker._chunk_sentences(self.sentences)
+        self.assertEqual(' '.join(chunks), ' '.join(self.sentences))
+        # A chunk only grows past max_chunk_length by its last sentence
+        self.assertTrue(all(len(chunk) < 400 + max(map(len, self.sentences)) + len(self.sentences) for chunk in chunks))
+
+    def test_short_inputs(self):
+        chunker = make_chunker()
+        self.assertEqual(chunker._chunk_sentences([]), [])
+        self.assertEqual(chunker._chunk_sentences(["Only one sentence."]), ["Only one sentence."])
+
+    def test_unit_rows(self):
+        rows = unit_rows([[3.0, 4.0], [0.0, 0.0]])
+        np.testing.assert_allclose(rows, [[0.6, 0.8], [0.0, 0.0]])
+        self.assertEqual(rows.dtype, np.float32)
+
+class Test_PooledWindows(TestCase):
+
+    def test_pooled_windows(self):
+        embeddings = np.random.default_rng(0).standard_normal((20, 8)).astype(np.float32)
+        expected = [embeddings[max(0, i - 3):i + 4].mean(axis=0) for i in range(20)]
+        np.testing.assert_allclose(pooled_windows(embeddings, 3), unit_rows(expected), atol=1e-6)
+
+    def test_pooled_mode_encodes_each_sentence_once(self):
+        chunker = make_chunker(window_mode="pooled", min_chunk_length=200)
+        sentences = chunker._split_sentences(' '.join(TestText.split()))[:100]
+        chunks = chunker._chunk_sentences(sentences)
+        self.assertEqual((chunker.model.calls, chunker.model.encoded), (1, len(sentences)))
+        self.assertEqual(' '.join(chunks), ' '.join(sentences))
+
+    def test_unknown_window_mode(self):
+        with self.assertRaises(ValueError):
+            SemanticChunker(window_mode="sliding")
+
+class Test_StreamingChunker(TestCase):
+
+    def setUp(self):
+        self.text = ' '.join(TestText.split())
+
+    def make_chunker(self, **kwargs):
+        chunker = make_chunker(**kwargs)
+        chunker._prepare_text = lambda text: text  # no cleaning or LLM coreference pass
+        return chunker
+
+    def test_short_text_matches_chunk_text(self):
+        chunker = self.make_chunker(min_chunk_length=200)
+        text = ' '.join(chunker._split_sentences(self.text)[:40])
+        self.assertEqual(list(chunker.chunk_text_iter(text)), chunker.chunk_text(text))
+
+    def test_calibrated_threshold_matches_chunk_text(self):
+        chunker = self.make_chunker(min_chunk_length=200)
+        sentences = chunker._split_sentences(self.text)
+        distances = chunker._calculate_cosine_distances(chunker._window_embeddings(sentences))
+        threshold = float(np.percentile(distances, chunker.breakpoint_percentile))
+        # Fed in small pieces, as from a file
+        pieces = (self.text[i:i + 1000] for i in range(0, len(self.text), 1000))
+        streamed = list(chunker.chunk_text_iter(pieces, batch_size=16, breakpoint_threshold=threshold))
+        self.assertEqual(streamed, chunker.chunk_text(self.text))
+
+    def test_adaptive_threshold_covers_text(self):
+        for window_mode in ("text", "pooled"):
+            with self.subTest(window_mode=window_mode):
+                chunker = self.make_chunker(window_mode=window_mode, breakpoint_percentile=50, min_chunk_length=200)
+                chunks = list(chunker.chunk_text_iter(self.text, batch_size=16, calibration_size=100))
+                self.assertGreater(len(chunks), 1)
+                self.assertEqual(' '.join(chunks), ' '.join(chunker._split_sentences(self.text)))
+
+    def test_default_chunk_text_iter(self):
+        from chunking.ichunker import IChunker
+
+        class WordChunker(IChunker):
+            def chunk_text(self, text):
+                return text.split()
+
+        self.assertEqual(list(WordChunker().chunk_text_iter(["one tw", "o three"])), ["one", "two", "three"])
+
+class Test_ChunkMany(TestCase):
+
+    def setUp(self):
+        self.chunker = make_chunker(min_chunk_length=150)
+        self.chunker._prepare_text = lambda text: text
+        sentences = self.chunker._split_sentences(' '.join(TestText.split()))
+        self.texts = [' '.join(sentences[i:i + 25]) for i in range(0, 200, 25)] + ["", "One sentence only."]
+
+    def test_same_chunks_as_one_at_a_time(self):
+        expected = [self.chunker.chunk_text(text) for text in self.texts]
+        self.chunker.model.calls = 0
+        self.assertEqual(self.chunker.chunk_many(self.texts), expected)
+        self.assertEqual(self.chunker.model.calls, 1)
+
+    def test_pooled_mode(self):
+        chunker = make_chunker(min_chunk_length=150, window_mode="pooled")
+        chunker._prepare_text = lambda text: text
+        self.assertEqual(chunker.chunk_many(self.texts), [chunker.chunk_text(text) for text in self.texts])
+
+    def test_process_pool(self):
+        self.assertEqual(self.chunker.chunk_many(self.texts, n_process=2), self.chunker.chunk_many(self.texts))
+
+class FakeEncoding:
+    """One token per word."""
+
+    def __init__(self):
+        self.batches = 0
+
+    def encode_ordinary_batch(self, texts):
+        self.batches += 1
+        return [text.split() for text in texts]
+
+class Test_TokenBudget(TestCase):
+
+    def setUp(self):
+        self.encoding = FakeEncoding()
+        patcher = patch("token_count.get_encoding", return_value=self.encoding)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sentences = make_chunker()._split_sentences(' '.join(TestText.split()))[:200]
+
+    def test_semantic_chunker_token_limits(self):
+        chunker = make_chunker(length_unit="tokens", max_chunk_length=60, min_chunk_length=20, breakpoint_percentile=50)
+        chunks = chunker._chunk_sentences(self.sentences)
+        # Sentences are counted in one batch, chunks are never encoded
+        self.assertEqual(self.encoding.batches, 1)
+        longest = max(len(sentence.split()) for sentence in self.sentences)
+        self.assertTrue(all(len(chunk.split()) < 60 + longest for chunk in chunks))
+        self.assertTrue(all(len(chunk.split()) >= 20 for chunk in chunks[:-1]))
+        self.assertEqual(' '.join(chunks), ' '.join(self.sentences))
+
+    def test_paragraph_chunker_token_lengths(self):
+        from chunking.paragraph_chunker import ParagraphChunker
+
+        chunker = ParagraphChunker(length_unit="tokens")
+        paragraphs = [' '.join(self.sentences[i:i + 3]) for i in range(0, 30, 3)]
+        merged = chunker._merge_short_paragraphs(paragraphs)
+        self.assertEqual([length for _, length in merged], [len(text.split()) for text, _ in merged])
+        self.assertEqual(' '.join(text for text, _ in merged), ' '.join(paragraphs))
+
+    def test_unknown_length_unit(self):
+        with self.assertRaises(ValueError):
+            SemanticChunker(length_unit="words")
+
+class Test_NoTokenModel(TestCase):
+    """Token lengths when OPENAI_MODEL_70B is unset or names a model tiktoken does not know."""
+
+    def setUp(self):
+        import token_count
+
+        # tiktoken's encoding files are downloaded; model name resolution is the part under test
+        self.enterContext(patch("tiktoken.model.get_encoding", return_value=FakeEncoding()))
+        self.enterContext(patch("token_count.ai_model", None))
+        self.enterContext(patch("chunking.semantic_chunker.ai_model", None))
+        token_count.get_encoding.cache_clear()
+        self.addCleanup(token_count.get_encoding.cache_clear)
+
+    def test_chunks_without_a_model(self):
+        chunker = make_chunker(length_unit="tokens", max_chunk_length=60, min_chunk_length=20)
+        sentences = chunker._split_sentences(' '.join(TestText.split()))[:50]
+        chunks = chunker._chunk_sentences(sentences)
+        self.assertEqual(' '.join(chunks), ' '.join(sentences))
+
+    def test_unknown_model_warns_once(self):
+        from token_count import token_lengths
+
+        with self.assertLogs("token_count", level="WARNING") as logs:
+            for _ in range(3):
+                self.assertEqual(token_lengths(["hello world"], "no-such-model"), [2])
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(token_lengths(["hello world"], ""), [2])
+
+class Test_PrepareText(TestCase):
+
+    def test_chunkers_skip_ner(self):
+        from chunking.paragraph_chunker import ParagraphChunker
+
+        text = ' '.join(' '.join(TestText.split()).split('. ')[:5])
+        with patch("pre_text_normalization.parse", wraps=pre_text_normalization.parse) as parse, \
+                patch("chunking.semantic_chunker.CoreferenceResolution.run", return_value=("offline", None)), \
+                patch("chunking.paragraph_chunker.CoreferenceResolution.run", return_value=("offline", None)):
+            make_chunker()._prepare_text(text)
+            paragraph_chunker = ParagraphChunker()
+            paragraph_chunker.semantic_chunker._model = FakeModel()
+            paragraph_chunker.chunk_text(text)
+        self.assertTrue(parse.call_args_list)
+        self.assertEqual({call.args[1] for call in parse.call_args_list}, {"lemmatize"})
+
+def failing_nlp(text, **kwargs):
+    raise RuntimeError("spaCy is broken")
+
+def fallback_nlp():
+    # What _load_spacy returns when en_core_web_sm cannot be loaded
+    with patch("spacy.load", side_effect=OSError("no model")):
+        return pre_text_normalization._load_spacy()
+
+class Test_SpacyFailure(TestCase):
+    """Without a working spaCy pipeline the chunkers chunk the input text, as before analyze_text."""
+
+    def setUp(self):
+        self.text = ' '.join(' '.join(TestText.split()).split('. ')[:30])
+        patcher = patch("chunking.semantic_chunker.CoreferenceResolution.run", return_value=("offline", None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_analysis_falls_back_to_input(self):
+        for nlp in (failing_nlp, fallback_nlp()):
+            with self.subTest(nlp=nlp), patch("pre_text_normalization.get_nlp", return_value=nlp):
+                analysis = pre_text_normalization.analyze_text(self.text)
+                self.assertEqual((analysis.normalized, analysis.cleaned, analysis.lemmatized), (self.text,) * 3)
+                self.assertEqual(analysis.ner_and_pos.to_dict(), {"ner": [], "pos": []})
+                self.assertIsNone(analysis.view(self.text[:50]))
+
+    def test_chunkers_chunk_input_text(self):
+        from chunking.paragraph_chunker import ParagraphChunker
+
+        for nlp in (failing_nlp, fallback_nlp()):
+            with self.subTest(nlp=nlp), patch("pre_text_normalization.get_nlp", return_value=nlp), \
+                    patch("chunking.paragraph_chunker.CoreferenceResolution.run", return_value=("offline", None)):
+                chunker = make_chunker(min_chunk_length=200)
+                self.assertEqual(' '.join(chunker.chunk_text(self.text)), ' '.join(chunker._split_sentences(self.text)))
+                paragraph_chunker = ParagraphChunker()
+                paragraph_chunker.semantic_chunker._model = FakeModel()
+                self.assertTrue(paragraph_chunker.chunk_text(self.text))
@@ -0,0 +1,11 @@
+import unicodedata
+
+def normalize_text(text: str) -> str:
+    """
+    The form texts are keyed on for caching and deduplication.
+
+    Only whitespace runs and unicode forms (NFC) are collapsed; casing and
+    punctuation change embeddings and chunks, so they are kept. Used by the
+    embedding cache keys and by chunking_jobs.content_hash.
+    """
+    return ' '.join(unicodedata.normalize('NFC', text).split())
@@ -5,16 +5,39 @@ import os
 from datetime import datetime
 from ai import ChunkComparisonWithOriginalText
 from call_ai import ProductInfo, ProductChunkInfo, Chunking
-from pre_text_normalization import text_normalization_with_boundaries, text_remove_stop_words_lemmatized, ner_and_pos_tagging
+from columnar_tags import TagColumns
+from nlp_batching import ner_and_pos_tagging_async
+from pre_text_normalization import analyze_text
 from util import http_put
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# A chunk's "ner" is the TagColumns of its text until it leaves the process:
+# the admin API gets the legacy entity list, stored results the compact JSON.
+
+def deliver_chunks(wp_action_id, chunks):
+    url = f"{os.getenv('BASE_URL_ADMIN')}/api/wp-actions/{wp_action_id}"
+    chunks = [{**chunk, "ner": chunk["ner"].entities()} if isinstance(chunk.get("ner"), TagColumns) else chunk
+              for chunk in chunks]
+    return http_put(url, chunks)
+
+def serialize_chunks(chunks):
+    """JSON-compatible chunks; see deserialize_chunks."""
+    return [{**chunk, "ner": chunk["ner"].to_json()} if isinstance(chunk.get("ner"), TagColumns) else chunk
+            for chunk in chunks]
+
+def deserialize_chunks(chunks):
+    # Results stored before the columnar format hold the entity list itself
+    return [{**chunk, "ner": TagColumns.from_json(chunk["ner"])} if isinstance(chunk.get("ner"), dict) else chunk
+            for chunk in chunks]
+
 class PreprocessTextForRAG:
 
     def __init__(self):
         self.global_chunks = []
+        # Parsed texts the chunks were cut from; chunk tagging reuses their parse
+        self.analyses = []
 
     def init_chunking(self, final_text, ner_and_pos):
         error, chunking_result = Chunking.run(final_text, ner_and_pos)
@@ -29,11 +52,26 @@ class PreprocessTextForRAG:
         for chunk in qa_chunks:
             self.global_chunks.append(chunk)
 
+    def chunk_ner_and_pos(self, chunk):
+        # None when the chunk is not part of an analysed text (e.g. generated Q&As)
+        for analysis in self.analyses:
+            view = analysis.view(chunk)
+            if view is not None:
+                return view.ner_and_pos
+        return None
+
+    async def tag_and_describe_chunk(self, chunk):
+        ner_and_pos = self.chunk_ner_and_pos(chunk)
+        if ner_and_pos is None:
+            ner_and_pos = await ner_and_pos_tagging_async(chunk)
+        error, chunk_result = await ProductChunkInfo.run(chunk, ner_and_pos)
+        return error, chunk_result, ner_and_pos
+
     async def run_chunking(self):
         all_chunks = []
         tasks = []
         for i, chunk in enumerate(self.global_chunks, 1):
-            tasks.append(ProductChunkInfo.run(chunk))
+            tasks.append(self.tag_and_describe_chunk(chunk))
 
         # Run all tasks concurrently and wait until they are all complete
         results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -42,7 +80,7 @@ class PreprocessTextForRAG:
             if isinstance(result, Exception):
                 print(f"Error processing chunk {i}: {result}")
                 continue
-            error, chunk_result = result
+            error, chunk_result, ner_and_pos = result
             if error:
                 print(f"Error processing chunk {i}: {error}")
                 continue
@@ -51,16 +89,33 @@ class PreprocessTextForRAG:
                 "chunk_text": chunk_result.text_chunk + ' '.join(chunk_result.generated_questions_answers),
                 "tags": chunk_result.tags,
                 "key_features": chunk_result.key_features,
-                "ner": chunk_result.ner,
+                "ner": ner_and_pos,
             }
             all_chunks.append(new_chunk)
         return all_chunks
 
     def run(self, text_block, wp_action_id):
+        result = self.process(text_block)
+        if "error" in result:
+            return result
+        try:
+            deliver_chunks(wp_action_id, result["chunks"])
+        except Exception as e:
+            print(f"Error in rag_pipeline_processing: {e}")
+            return {
+                "error": f"Error in rag_pipeline_processing: {e}",
+                "chunks": []
+            }
+        return result
+
+    def process(self, text_block):
+        """Build the chunks for a product text without delivering them."""
         try:
-            text1 = text_normalization_with_boundaries(text_block)
-            text2 = text_remove_stop_words_lemmatized(text1)
-            ner_and_pos = ner_and_pos_tagging(text2)
+            # One parse gives the cleaned text, the tags and the chunk views
+            analysis = analyze_text(text_block)
+            self.analyses.append(analysis)
+            text2 = analysis.cleaned
+            ner_and_pos = analysis.ner_and_pos
             
             # Process the entire product
             error, product_result = ProductInfo.run(text2)
@@ -76,16 +131,16 @@ class PreprocessTextForRAG:
                 "chunk_text": product_result.summary,
                 "tags": product_result.tags,
                 "key_features": product_result.key_features,
-                "ner": ner_and_pos['ner']
+                "ner": ner_and_pos
             }
 
             # Process original text
             self.init_chunking(text2, ner_and_pos)
 
             # Process additional info
-            text_ai1 = text_normalization_with_boundaries(product_result.additional_info)
-            text_ai2 = text_remove_stop_words_lemmatized(text_ai1)
-            self.init_chunking(text_ai2, ner_and_pos)
+            analysis_ai = analyze_text(product_result.additional_info)
+            self.analyses.append(analysis_ai)
+            self.init_chunking(analysis_ai.cleaned, ner_and_pos)
 
             # Process Q&As as separate chunks
             self.init_qa_chunks(product_result.generated_questions_answers)
@@ -94,9 +149,6 @@ class PreprocessTextForRAG:
 
             # Combine all chunks
             chunks = [summary_chunk] + final_chunks
-
-            url = f"{os.getenv('BASE_URL_ADMIN')}/api/wp-actions/{wp_action_id}"
-            http_put(url, chunks)
             return { "chunks": chunks }
 
         except Exception as e:
@@ -145,7 +197,7 @@ Perfect for All Winter Activities: Whether you’re heading to work, running err
     start_time = time.time()
     # Process the entire product
     process_text = PreprocessTextForRAG()
-    result = process_text.run(product_info)
+    result = process_text.process(product_info)
     if "error" in result:
         print(result["error"])
     else:
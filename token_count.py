@@ -1,9 +1,36 @@
+import functools
+import logging
 import os
 import tiktoken
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
 
 ai_model = os.getenv("OPENAI_MODEL_70B")
 
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: Optional[str] = ai_model, fallback: str = "gpt-3.5-turbo") -> tiktoken.Encoding:
+    """
+    The tiktoken encoding of a model, resolved once per process and model.
+
+    No model (OPENAI_MODEL_70B unset) means the encoding of `fallback`.
+    Unknown models fall back to it too, with a single warning per model
+    instead of one per call.
+    """
+    if not model:
+        return tiktoken.encoding_for_model(fallback)
+    try:
+        return tiktoken.encoding_for_model(model)
+    except (KeyError, TypeError, AttributeError, ValueError):
+        logger.warning(f"Model {model!r} not found, using the {fallback!r} encoding")
+        return tiktoken.encoding_for_model(fallback)
+
+def token_lengths(texts: List[str], model: Optional[str] = ai_model) -> List[int]:
+    """Token count of every text, encoded in one (multi-threaded) batch."""
+    if not texts:
+        return []
+    return [len(tokens) for tokens in get_encoding(model).encode_ordinary_batch(list(texts))]
+
 def count_message_tokens(messages: List[Dict[str, str]], model: str = ai_model) -> int:
     """
     Count the number of tokens in a list of messages for the specified OpenAI model.
@@ -19,11 +46,7 @@ def count_message_tokens(messages: List[Dict[str, str]], model: str = ai_model)
     Raises:
         ValueError: If an unsupported model is specified.
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        print(f"Warning: model '{model}' not found. Using default 'gpt-3.5-turbo-0613' encoding.")
-        encoding = tiktoken.encoding_for_model("gpt-3.5-turbo-0613")
+    encoding = get_encoding(model, "gpt-3.5-turbo-0613")
 
     if model.startswith("gpt-3.5-turbo"):
         return count_messages_tokens(messages, encoding)
@@ -61,13 +84,7 @@ def count_tokens(text: str, model: str = ai_model) -> int:
     Raises:
         ValueError: If an unsupported model is specified.
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        print(f"Warning: model '{model}' not found. Using default 'gpt-3.5-turbo' encoding.")
-        encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    
-    return len(encoding.encode(text))
+    return len(get_encoding(model).encode(text))
 
 # Example usage
 if __name__ == "__main__":
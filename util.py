@@ -1,9 +1,11 @@
 import requests
 import json
 import os
+import time
 from tenacity import retry, stop_after_delay, wait_exponential
 import sentry_sdk
 from dotenv import load_dotenv
+from metrics import HTTP_PUT_RETRIES, HTTP_PUT_SECONDS
 
 # Load environment variables
 load_dotenv()
@@ -27,6 +29,7 @@ def log_retry_to_sentry(retry_state):
         f"for the {retry_state.attempt_number} time. Sleeping for {retry_state.next_action.sleep} seconds."
     )
     sentry_sdk.capture_message(error_message)
+    HTTP_PUT_RETRIES.inc()
 
 # Retry for up to 3 days with exponential backoff
 @retry(
@@ -45,7 +48,13 @@ def http_put(url, chunks, handle_response_func=None):
     headers = {'Content-Type': 'application/json'}
     
     # Make the PUT request
-    response = requests.put(url, headers=headers, data=json.dumps(data))
+    started = time.perf_counter()
+    try:
+        response = requests.put(url, headers=headers, data=json.dumps(data))
+    except Exception:
+        HTTP_PUT_SECONDS.labels("error").observe(time.perf_counter() - started)
+        raise
+    HTTP_PUT_SECONDS.labels(str(response.status_code)).observe(time.perf_counter() - started)
 
     # Use the custom response handler if provided, else default
     if handle_response_func:
@@ -0,0 +1,78 @@
+import gc
+import logging
+import sys
+import time
+
+import psutil
+from redis import Redis
+from rq import Worker
+
+from model_registry import registry
+from metrics import JOB_MEMORY_BYTES, JOB_SECONDS, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+# Everything PreprocessTextForRAG.run needs; MODEL_WARMUP can add more.
+PIPELINE_MODELS = ["spacy:en_core_web_sm", "spacy:blank-en+sentencizer", "openai:instructor"]
+
+class PreloadedWorker(Worker):
+    """
+    RQ worker that imports the chunking pipeline and loads its models once,
+    before it starts forking job processes.
+
+    The default worker forks a fresh work horse per job that then imports
+    spaCy and the OpenAI client and loads the models again. Here the parent
+    does that work up front, so every forked job starts with the models
+    already in memory and shares those pages with the parent copy-on-write.
+
+    Run with `python worker.py [queue ...]` or
+    `rq worker -w worker.PreloadedWorker chunking`.
+    """
+
+    preload_models = PIPELINE_MODELS
+
+    def preload(self):
+        import text_processing  # noqa: F401  Imports the pipeline modules and registers their models
+        from pre_text_normalization import analyze_text
+
+        registry.warmup(self.preload_models)
+        registry.warmup()
+        # First call initializes spaCy's lazily loaded tables in the parent, not in every job
+        analyze_text("Warm up the pipeline.").ner_and_pos
+
+        # Objects that exist now live as long as the worker; keeping them out of
+        # the cyclic GC stops collections in a job from writing to (and so
+        # un-sharing) the pages holding the models.
+        gc.collect()
+        gc.freeze()
+        self.preloaded_rss = psutil.Process().memory_info().rss
+        logger.info(f"Preloaded models, worker RSS {self.preloaded_rss / 2**20:.0f} MiB: {registry.report()['models']}")
+
+    def work(self, *args, **kwargs):
+        self.preload()
+        # Job metrics are written by the forked work horses; export them with
+        # a shared PROMETHEUS_MULTIPROC_DIR (see metrics.py).
+        start_metrics_server()
+        return super().work(*args, **kwargs)
+
+    def perform_job(self, job, queue):
+        # Runs in the forked work horse
+        started = time.perf_counter()
+        result = super().perform_job(job, queue)
+        JOB_SECONDS.labels(job.func_name, "ok" if result else "failed").observe(time.perf_counter() - started)
+        memory = psutil.Process().memory_full_info()
+        JOB_MEMORY_BYTES.labels("rss").observe(memory.rss)
+        JOB_MEMORY_BYTES.labels("uss").observe(memory.uss)
+        # USS is what this job added on top of the pages still shared with the parent
+        job.meta['rss_bytes'] = memory.rss
+        job.meta['uss_bytes'] = memory.uss
+        job.meta['shared_bytes'] = memory.rss - memory.uss
+        job.save_meta()
+        logger.info(f"Job {job.id} RSS {memory.rss / 2**20:.0f} MiB, unique {memory.uss / 2**20:.0f} MiB")
+        return result
+
+if __name__ == '__main__':
+    queues = sys.argv[1:] or ["chunking"]
+    redis_conn = Redis(host='localhost', port=6379, db=0)
+    worker = PreloadedWorker(queues, connection=redis_conn)
+    worker.work()